@@ -0,0 +1,96 @@
+"""Asyncio version of the default agent, so that a single process can drive many agents at once.
+
+Models and environments that implement `aquery`/`aexecute` (see `AsyncModel` and `AsyncEnvironment`)
+are awaited directly, all others are run in the default executor of the event loop.
+"""
+
+import asyncio
+import subprocess
+
+from minisweagent.agents.default import (
+    DefaultAgent,
+    ExecutionTimeoutError,
+    LimitsExceeded,
+    NonTerminatingException,
+    TerminatingException,
+    combine_outputs,
+)
+from minisweagent.models import query_async
+
+
+class AsyncDefaultAgent(DefaultAgent):
+    async def run(self, task: str, **kwargs) -> tuple[str, str]:
+        """Run step() until agent is finished. Return exit status & message"""
+        self.extra_template_vars |= {"task": task, **kwargs}
+        self.messages = []
+        if self.observation_store is not None:
+            self.observation_store.clear()
+        self.add_message("system", self.render_template(self.config.system_template))
+        self.add_message("user", self.render_template(self.config.instance_template))
+        while True:
+            try:
+                await self.step()
+            except NonTerminatingException as e:
+                self.add_message("user", str(e))
+            except TerminatingException as e:
+                self.add_message("user", str(e))
+                return type(e).__name__, str(e)
+
+    async def step(self) -> dict:
+        """Query the LM, execute the action, return the observation."""
+        return await self.get_observation(await self.query())
+
+    async def query(self) -> dict:
+        """Query the model and return the response."""
+        if 0 < self.config.step_limit <= self.model.n_calls:
+            raise LimitsExceeded()
+        response = await query_async(self.model, self.get_query_messages())
+        self.add_message("assistant", content=response["content"])
+        return response
+
+    async def get_observation(self, response: dict) -> dict:
+        """Execute the action and return the observation."""
+        output = await self.execute_actions(self.parse_action(response))
+        observation = self.render_template(
+            self.config.action_observation_template,
+            output=output,
+            observation_handle=self.store_observation(output),
+            page_command=self.config.page_command,
+        )
+        self.add_message("user", observation)
+        return output
+
+    async def execute_actions(self, action: dict) -> dict:
+        """Execute all actions of a response in order (see `max_actions`)."""
+        if "actions" not in action:
+            return await self.execute_action(action)
+        outputs = []
+        for command in action["actions"]:
+            try:
+                outputs.append(await self.execute_action(action | {"action": command}))
+            except ExecutionTimeoutError as e:
+                # Keep the outputs of the actions that completed before
+                raise ExecutionTimeoutError(
+                    combine_outputs(action["actions"], outputs, timeout_message=str(e))["output"]
+                ) from e
+            if outputs[-1]["returncode"] != 0:
+                break
+        return combine_outputs(action["actions"], outputs)
+
+    async def execute_action(self, action: dict) -> dict:
+        if self.observation_store is not None and (output := self.observation_store.execute(action["action"])):
+            return output
+        try:
+            if hasattr(self.env, "aexecute"):
+                output = await self.env.aexecute(action["action"])
+            else:
+                output = await asyncio.to_thread(self.env.execute, action["action"])
+        except subprocess.TimeoutExpired as e:
+            output = e.output.decode("utf-8", errors="replace") if e.output else ""
+            raise ExecutionTimeoutError(
+                self.render_template(self.config.timeout_template, action=action, output=output)
+            )
+        except TimeoutError:
+            raise ExecutionTimeoutError(self.render_template(self.config.timeout_template, action=action, output=""))
+        self.has_finished(output)
+        return output
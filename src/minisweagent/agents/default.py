@@ -1,13 +1,17 @@
 """Basic agent class. See https://mini-swe-agent.com/latest/advanced/control_flow/ for visual explanation."""
 
+import functools
 import re
 import subprocess
 from collections.abc import Callable
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
 
-from jinja2 import StrictUndefined, Template
+import jinja2
+from jinja2 import StrictUndefined, Template, meta
 
 from minisweagent import Environment, Model
+from minisweagent.agents.history import get_history_processor
+from minisweagent.agents.observations import ObservationStore
 
 
 @dataclass
@@ -26,6 +30,16 @@ class AgentConfig:
     format_error_template: str = "Please always provide EXACTLY ONE action in triple backticks."
     action_observation_template: str = "Observation: {{output}}"
     step_limit: int = 0
+    history_processor: dict = field(default_factory=dict)
+    """Shortens the messages sent to the model, see `minisweagent.agents.history` (disabled if empty)"""
+    max_observation_chars: int = 0
+    """Longer outputs are kept in the observation store and can be paged through with `page_command`,
+    see `minisweagent.agents.observations` (0 to disable)"""
+    page_command: str = "show_output"
+    max_actions: int = 1
+    """Maximum number of bash blocks per response. They are executed in order until one of them fails
+    (non-zero return code) or submits, and their outputs are combined into a single observation.
+    Models that stop streaming after the first action (`stream_stop_pattern`) are rejected."""
 
 
 class NonTerminatingException(Exception):
@@ -52,6 +66,32 @@ class LimitsExceeded(TerminatingException):
     """Raised when the agent has reached its step limit."""
 
 
+def combine_outputs(actions: list[str], outputs: list[dict], *, timeout_message: str | None = None) -> dict:
+    """Combine the outputs of the actions of a response (in the format of `Environment.execute`).
+    If the action after the last output timed out, `timeout_message` is included as its output.
+    """
+    parts = [
+        f"[Action {i} of {len(actions)}, returncode {output['returncode']}]\n$ {action}\n{output['output']}"
+        for i, (action, output) in enumerate(zip(actions, outputs), 1)
+    ]
+    n_run = len(outputs)
+    if timeout_message is not None:
+        n_run += 1
+        parts.append(f"[Action {n_run} of {len(actions)}, timed out]\n$ {actions[n_run - 1]}\n{timeout_message}")
+    if n_run < len(actions):
+        parts.append(f"[Action {n_run} failed, the remaining {len(actions) - n_run} action(s) were not run]")
+    return {"output": "\n".join(parts), "returncode": outputs[-1]["returncode"] if outputs else -1}
+
+
+_JINJA_ENV = jinja2.Environment(undefined=StrictUndefined)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(source: str) -> tuple[Template, frozenset[str]]:
+    """Compiled template and the names of the variables it uses (compiled once per source)."""
+    return _JINJA_ENV.from_string(source), frozenset(meta.find_undeclared_variables(_JINJA_ENV.parse(source)))
+
+
 class DefaultAgent:
     def __init__(self, model: Model, env: Environment, *, config_class: Callable = AgentConfig, **kwargs):
         self.config = config_class(**kwargs)
@@ -59,20 +99,42 @@ class DefaultAgent:
         self.model = model
         self.env = env
         self.extra_template_vars = {}
+        self.history_processor = get_history_processor(self.config.history_processor)
+        model_config = getattr(model, "config", None)
+        if self.config.max_actions > 1 and getattr(model_config, "stream", False):
+            if getattr(model_config, "stream_stop_pattern", ""):
+                msg = "max_actions > 1 needs the whole response: set stream_stop_pattern to '' or disable streaming"
+                raise ValueError(msg)
+        self.observation_store = None
+        if self.config.max_observation_chars:
+            self.observation_store = ObservationStore(
+                page_command=self.config.page_command, max_page_chars=self.config.max_observation_chars
+            )
+
+    def get_template_vars(self) -> dict:
+        return asdict(self.config) | self.env.get_template_vars() | self.model.get_template_vars()
 
     def render_template(self, template: str, **kwargs) -> str:
-        template_vars = asdict(self.config) | self.env.get_template_vars() | self.model.get_template_vars()
-        return Template(template, undefined=StrictUndefined).render(
-            **kwargs, **template_vars, **self.extra_template_vars
-        )
+        compiled, variables = compile_template(template)
+        template_vars = kwargs | self.extra_template_vars
+        if not variables <= template_vars.keys():
+            # Only collected if needed: the environment variables can be large and model stats change every step
+            template_vars = self.get_template_vars() | template_vars
+        return compiled.render(**template_vars)
 
     def add_message(self, role: str, content: str, **kwargs):
         self.messages.append({"role": role, "content": content, **kwargs})
 
+    def get_query_messages(self) -> list[dict]:
+        """The messages sent to the model (the full history, unless a history processor is configured)."""
+        return self.history_processor(self.messages) if self.history_processor else self.messages
+
     def run(self, task: str, **kwargs) -> tuple[str, str]:
         """Run step() until agent is finished. Return exit status & message"""
         self.extra_template_vars |= {"task": task, **kwargs}
         self.messages = []
+        if self.observation_store is not None:
+            self.observation_store.clear()
         self.add_message("system", self.render_template(self.config.system_template))
         self.add_message("user", self.render_template(self.config.instance_template))
         while True:
@@ -92,14 +154,19 @@ class DefaultAgent:
         """Query the model and return the response."""
         if 0 < self.config.step_limit <= self.model.n_calls:
             raise LimitsExceeded()
-        response = self.model.query(self.messages)
+        response = self.model.query(self.get_query_messages())
         self.add_message("assistant", content=response["content"])
         return response
 
     def get_observation(self, response: dict) -> dict:
         """Execute the action and return the observation."""
-        output = self.execute_action(self.parse_action(response))
-        observation = self.render_template(self.config.action_observation_template, output=output)
+        output = self.execute_actions(self.parse_action(response))
+        observation = self.render_template(
+            self.config.action_observation_template,
+            output=output,
+            observation_handle=self.store_observation(output),
+            page_command=self.config.page_command,
+        )
         self.add_message("user", observation)
         return output
 
@@ -108,9 +175,36 @@ class DefaultAgent:
         actions = re.findall(r"```bash\s*\n(.*?)\n```", response["content"], re.DOTALL)
         if len(actions) == 1:
             return {"action": actions[0].strip(), **response}
+        if 1 < len(actions) <= self.config.max_actions:
+            return {"action": actions[0].strip(), "actions": [action.strip() for action in actions], **response}
         raise FormatError(self.render_template(self.config.format_error_template, actions=actions))
 
+    def store_observation(self, output: dict) -> str | None:
+        """Keep a large output in the observation store. Returns its handle (None if it was not stored)."""
+        if self.observation_store is None or len(output.get("output", "")) <= self.config.max_observation_chars:
+            return None
+        return self.observation_store.put(output["output"])
+
+    def execute_actions(self, action: dict) -> dict:
+        """Execute all actions of a response in order (see `max_actions`)."""
+        if "actions" not in action:
+            return self.execute_action(action)
+        outputs = []
+        for command in action["actions"]:
+            try:
+                outputs.append(self.execute_action(action | {"action": command}))
+            except ExecutionTimeoutError as e:
+                # Keep the outputs of the actions that completed before
+                raise ExecutionTimeoutError(
+                    combine_outputs(action["actions"], outputs, timeout_message=str(e))["output"]
+                ) from e
+            if outputs[-1]["returncode"] != 0:
+                break
+        return combine_outputs(action["actions"], outputs)
+
     def execute_action(self, action: dict) -> dict:
+        if self.observation_store is not None and (output := self.observation_store.execute(action["action"])):
+            return output
         try:
             output = self.env.execute(action["action"])
         except subprocess.TimeoutExpired as e:
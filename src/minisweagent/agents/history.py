@@ -0,0 +1,100 @@
+"""History processors shorten the messages that are sent to the model in each step.
+
+The agent always keeps the full history in `agent.messages` (and in the trajectory), only the
+query sees the processed version. Select a processor with the `history_processor` setting of the
+agent config, e.g.:
+
+```yaml
+agent:
+  history_processor:
+    history_class: compact
+    keep_last_turns: 5
+    max_tokens: 60000
+```
+"""
+
+import importlib
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from minisweagent.models.utils.rate_limit import estimate_tokens
+
+
+@dataclass
+class CompactingHistoryConfig:
+    keep_last_turns: int = 5
+    """Number of most recent turns (model response and the following observations) that are kept verbatim"""
+    max_observation_chars: int = 2000
+    """Older observations that are longer than this are shortened to their head and tail"""
+    head_chars: int = 500
+    tail_chars: int = 500
+    max_tokens: int = 0
+    """Token budget of the whole prompt (0 for no budget). Older messages are elided (oldest first) to stay within it."""
+    elided_template: str = "[... {n_chars} characters elided ...]"
+    dropped_template: str = "[Earlier message elided to save context ({n_chars} characters)]"
+
+
+class CompactingHistory:
+    def __init__(self, *, config_class: Callable = CompactingHistoryConfig, **kwargs):
+        """Keeps the leading messages (system and instance prompt) and the last turns verbatim,
+        shortens long observations in between and elides whole messages if the prompt exceeds the
+        token budget. Compaction only depends on a message and its age, so the prompt changes at the
+        boundary of the verbatim window only, and stays stable (and cacheable) otherwise.
+        """
+        self.config = config_class(**kwargs)
+
+    def get_stale_range(self, messages: list[dict]) -> range:
+        """Indices of the messages that may be compacted."""
+        assistant_indices = [i for i, message in enumerate(messages) if message["role"] == "assistant"]
+        if len(assistant_indices) <= self.config.keep_last_turns:
+            return range(0)
+        end = assistant_indices[-self.config.keep_last_turns] if self.config.keep_last_turns else len(messages)
+        return range(assistant_indices[0], end)
+
+    def shorten(self, content: str) -> str:
+        if len(content) <= self.config.max_observation_chars:
+            return content
+        head, tail = content[: self.config.head_chars], content[len(content) - self.config.tail_chars :]
+        n_chars = len(content) - len(head) - len(tail)
+        return f"{head}\n{self.config.elided_template.format(n_chars=n_chars)}\n{tail}"
+
+    def __call__(self, messages: list[dict]) -> list[dict]:
+        stale = self.get_stale_range(messages)
+        if not stale:
+            return messages
+        result = list(messages)
+        for i in stale:
+            if result[i]["role"] == "user" and isinstance(result[i]["content"], str):
+                if (shortened := self.shorten(result[i]["content"])) != result[i]["content"]:
+                    result[i] = result[i] | {"content": shortened}
+        if self.config.max_tokens:
+            n_tokens = sum(estimate_tokens([message]) for message in result)
+            for i in stale:
+                if n_tokens <= self.config.max_tokens:
+                    break
+                n_chars = len(str(messages[i]["content"]))
+                dropped = result[i] | {"content": self.config.dropped_template.format(n_chars=n_chars)}
+                n_tokens += estimate_tokens([dropped]) - estimate_tokens([result[i]])
+                result[i] = dropped
+        return result
+
+
+_HISTORY_CLASS_MAPPING = {
+    "compact": "minisweagent.agents.history.CompactingHistory",
+}
+
+
+def get_history_processor(config: dict) -> Callable[[list[dict]], list[dict]] | None:
+    """Create the history processor from the `history_processor` agent setting (None if empty)."""
+    if not config:
+        return None
+    config = dict(config)
+    history_class = config.pop("history_class", "compact")
+    full_path = _HISTORY_CLASS_MAPPING.get(history_class, history_class)
+    try:
+        module_name, class_name = full_path.rsplit(".", 1)
+        processor_class = getattr(importlib.import_module(module_name), class_name)
+    except (ValueError, ImportError, AttributeError):
+        msg = f"Unknown history class: {history_class} (resolved to {full_path}, available: {_HISTORY_CLASS_MAPPING})"
+        raise ValueError(msg)
+    return processor_class(**config)
@@ -0,0 +1,50 @@
+"""Out-of-band storage of large command outputs.
+
+Instead of sending a large output to the model, the agent stores it and only shows its head and tail
+together with a handle (see `action_observation_template`). The model can then page through the
+stored output with a built-in command, e.g. `show_output out1 100 200` for lines 100 to 200.
+"""
+
+import re
+
+_TRUNCATED_NOTE = "\n[Page truncated, please request fewer lines]\n"
+
+
+class ObservationStore:
+    def __init__(self, *, page_command: str = "show_output", max_page_chars: int = 10_000):
+        self.page_command = page_command
+        self.max_page_chars = max_page_chars
+        self._outputs: dict[str, str] = {}
+        self._pattern = re.compile(rf"^{re.escape(page_command)}\s+(\S+)(?:\s+(\d+))?(?:\s+(\d+))?\s*$")
+
+    def put(self, output: str) -> str:
+        """Store an output and return its handle."""
+        handle = f"out{len(self._outputs) + 1}"
+        self._outputs[handle] = output
+        return handle
+
+    def get_page(self, handle: str, start: int = 1, end: int | None = None) -> dict:
+        """Lines `start` to `end` (1-based, inclusive) of a stored output, in the format of `Environment.execute`."""
+        if handle not in self._outputs:
+            return {
+                "output": f"Unknown output handle: {handle} (available: {', '.join(self._outputs)})\n",
+                "returncode": 1,
+            }
+        lines = self._outputs[handle].splitlines(keepends=True)
+        end = len(lines) if end is None else min(end, len(lines))
+        page = "".join(lines[max(start, 1) - 1 : end])
+        header = f"Lines {max(start, 1)}-{end} of {len(lines)} of {handle}:\n"
+        if len(header) + len(page) > self.max_page_chars:
+            # Pages never exceed the limit, so that they are not stored again
+            page = page[: max(self.max_page_chars - len(header) - len(_TRUNCATED_NOTE), 0)] + _TRUNCATED_NOTE
+        return {"output": header + page, "returncode": 0}
+
+    def execute(self, command: str) -> dict | None:
+        """Run `command` if it is the page command, else return None."""
+        if not (match := self._pattern.match(command.strip())):
+            return None
+        handle, start, end = match.groups()
+        return self.get_page(handle, int(start or 1), int(end) if end else None)
+
+    def clear(self) -> None:
+        self._outputs = {}
@@ -1,10 +1,18 @@
+import asyncio
+import functools
 import os
 import platform
+import signal
 import subprocess
 from dataclasses import asdict, dataclass, field
 from typing import Any
 
 
+@functools.cache
+def _get_uname() -> dict[str, str]:
+    return platform.uname()._asdict()
+
+
 @dataclass
 class LocalEnvironmentConfig:
     cwd: str = ""
@@ -34,5 +42,29 @@ class LocalEnvironment:
         )
         return {"output": result.stdout, "returncode": result.returncode}
 
+    async def aexecute(self, command: str, cwd: str = "", *, timeout: int | None = None):
+        """Like `execute`, but without blocking the event loop."""
+        cwd = cwd or self.config.cwd or os.getcwd()
+        timeout = timeout or self.config.timeout
+        process = await asyncio.create_subprocess_shell(
+            command,
+            cwd=cwd,
+            env=os.environ | self.config.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            # Kill the whole process group, otherwise we wait for children that keep the output pipe open
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError):
+                process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(command, timeout)
+        return {"output": stdout.decode("utf-8", errors="replace"), "returncode": process.returncode}
+
     def get_template_vars(self) -> dict[str, Any]:
-        return asdict(self.config) | platform.uname()._asdict() | os.environ
+        return asdict(self.config) | _get_uname() | os.environ
@@ -2,30 +2,13 @@
 You can ignore this file completely if you explicitly set your model in your run script.
 """
 
+import asyncio
 import copy
 import importlib
 import os
 from minisweagent import Model
 from minisweagent.models.model_config_loader import load_model_config
-
-
-class GlobalModelStats:
-    """Minimal tracker for call counts (cost tracking removed)."""
-
-    def __init__(self):
-        self._n_calls = 0
-
-    def add(self, count: float = 0.0) -> None:
-        self._n_calls += 1
-
-    @property
-    def n_calls(self) -> int:
-        return self._n_calls
-
-    @property
-    def cost(self) -> float:
-        return 0.0
-
+from minisweagent.models.utils.stats import GlobalModelStats
 
 GLOBAL_MODEL_STATS = GlobalModelStats()
 
@@ -51,6 +34,8 @@ def get_model(input_model_name: str | None = None, config: dict | None = None) -
                 "api_base": loaded["api_base"],
                 "api_key": loaded.get("api_key"),
                 "model_kwargs": merged_kwargs,
+                "api_key_env": loaded["api_key_env"],
+                "rate_limit": loaded["rate_limit"],
             }
         )
 
@@ -66,6 +51,13 @@ def get_model(input_model_name: str | None = None, config: dict | None = None) -
     return model_class(**config)
 
 
+async def query_async(model: Model, messages: list[dict], **kwargs) -> dict:
+    """Await `model.aquery` if the model supports it, else run `model.query` in a worker thread."""
+    if hasattr(model, "aquery"):
+        return await model.aquery(messages, **kwargs)
+    return await asyncio.to_thread(model.query, messages, **kwargs)
+
+
 def get_model_name(input_model_name: str | None = None, config: dict | None = None) -> str:
     """Get a model name from any kind of user input or settings."""
     if config is None:
@@ -22,6 +22,14 @@ class AnthropicModel(LitellmModel):
         super().__init__(config_class=config_class, **kwargs)
 
     def query(self, messages: list[dict], **kwargs) -> dict:
+        return super().query(set_cache_control(messages, mode="default_end"), api_key=self._get_api_key(), **kwargs)
+
+    async def aquery(self, messages: list[dict], **kwargs) -> dict:
+        return await super().aquery(
+            set_cache_control(messages, mode="default_end"), api_key=self._get_api_key(), **kwargs
+        )
+
+    def _get_api_key(self) -> str | None:
         api_key = None
         # Legacy only
         if rotating_keys := os.getenv("ANTHROPIC_API_KEYS"):
@@ -31,5 +39,4 @@ class AnthropicModel(LitellmModel):
                 "Key rotation is no longer required."
             )
             api_key = get_key_per_thread(rotating_keys.split("::"))
-        messages = set_cache_control(messages, mode="default_end")
-        return super().query(messages, api_key=api_key, **kwargs)
+        return api_key
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from minisweagent import global_config_dir
+from minisweagent.models import get_model, query_async
+from minisweagent.utils.log import logger
+
+
+_EVICTION_INTERVAL = 100
+"""Evict after this many writes to a cache directory (by all cached models of the process)"""
+_N_WRITES: dict[Path, int] = {}
+_LOCK = threading.Lock()
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a query is not in the cache."""
+
+
+@dataclass
+class CachedModelConfig:
+    model_kwargs: dict
+    """Config of the wrapped model (as passed to `get_model`)"""
+    mode: str = "read_through"
+    """'read_through' (use cached responses, query and store on a miss), 'record' (always query and store)
+    or 'replay' (only use cached responses, raise `CacheMiss` on a miss)"""
+    cache_dir: str = str(global_config_dir / "response_cache")
+    max_size_mb: float = 1024.0
+    """Least recently used responses are evicted once the cache grows beyond this size"""
+    max_age_days: float | None = 30.0
+    """Responses that were not used for longer than this are evicted"""
+    model_name: str = "cached"
+
+
+class CachedModel:
+    def __init__(self, *, config_class: Callable = CachedModelConfig, **kwargs):
+        """This "meta"-model caches the responses of another model on disk, keyed by a hash of the
+        model name, its `model_kwargs`, the messages and the query arguments.
+        """
+        self.config = config_class(**kwargs)
+        if self.config.mode not in ("read_through", "record", "replay"):
+            raise ValueError(f"Unknown cache mode: {self.config.mode}. Supported: read_through, record, replay")
+        self.model = get_model(config=self.config.model_kwargs)
+        self.cache_dir = Path(self.config.cache_dir)
+        self.n_calls = 0
+        self.n_hits = 0
+        with _LOCK:
+            # Every instance of a batch run creates its own model, but scanning the cache once is enough
+            evict = self.cache_dir not in _N_WRITES
+            _N_WRITES.setdefault(self.cache_dir, 0)
+        if evict:
+            self.evict()
+
+    @property
+    def cost(self) -> float:
+        return getattr(self.model, "cost", 0.0)
+
+    def get_key(self, messages: list[dict], **kwargs) -> str:
+        key_data = {
+            "model_name": self.model.config.model_name,
+            "model_kwargs": getattr(self.model.config, "model_kwargs", {}),
+            "messages": messages,
+            "kwargs": kwargs,
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _get_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def query(self, messages: list[dict], **kwargs) -> dict:
+        key = self.get_key(messages, **kwargs)
+        if (response := self._lookup(key, messages)) is not None:
+            return response
+        return self._store(key, self.model.query(messages, **kwargs))
+
+    async def aquery(self, messages: list[dict], **kwargs) -> dict:
+        key = self.get_key(messages, **kwargs)
+        if (response := self._lookup(key, messages)) is not None:
+            return response
+        return self._store(key, await query_async(self.model, messages, **kwargs))
+
+    def _lookup(self, key: str, messages: list[dict]) -> dict | None:
+        path = self._get_path(key)
+        self.n_calls += 1
+        if self.config.mode != "record":
+            try:
+                response = json.loads(path.read_text())
+                os.utime(path)  # mark as recently used
+                self.n_hits += 1
+                return response | {"cache_key": key}
+            except (OSError, json.JSONDecodeError):
+                if self.config.mode == "replay":
+                    raise CacheMiss(f"No cached response for {key} ({len(messages)} messages)")
+        return None
+
+    def _store(self, key: str, response: dict) -> dict:
+        path = self._get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(response, ensure_ascii=False, default=str))
+        tmp_path.replace(path)
+        with _LOCK:
+            _N_WRITES[self.cache_dir] += 1
+            evict = _N_WRITES[self.cache_dir] % _EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+        return response | {"cache_key": key}
+
+    def evict(self) -> None:
+        """Remove responses that are too old, then the least recently used ones until the cache fits its size."""
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total_size = sum(size for _, size, _ in entries)
+        min_mtime = time.time() - self.config.max_age_days * 86400 if self.config.max_age_days is not None else 0
+        n_evicted = 0
+        for mtime, size, path in entries:
+            if mtime >= min_mtime and total_size <= self.config.max_size_mb * 1024 * 1024:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            n_evicted += 1
+        if n_evicted:
+            logger.debug(f"Evicted {n_evicted} cached response(s) from {self.cache_dir}")
+
+    def get_template_vars(self) -> dict:
+        return asdict(self.config) | self.model.get_template_vars() | {"n_model_calls": self.n_calls}
@@ -0,0 +1,208 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+
+from minisweagent.models import get_model, query_async
+from minisweagent.models.utils.cancel import cancellable
+
+
+@dataclass
+class HedgedModelConfig:
+    model_kwargs: dict
+    """Config of the wrapped model (as passed to `get_model`)"""
+    hedge_model_kwargs: dict | None = None
+    """Config of the model that receives the hedge request, e.g., an alternate endpoint from `models.yaml`.
+    Defaults to a second instance of the wrapped model."""
+    percentile: float = 95.0
+    """Hedge once a call takes longer than this percentile of recent latencies"""
+    initial_delay: float = 30.0
+    """Hedge delay (seconds) until `min_samples` latencies have been observed"""
+    min_delay: float = 1.0
+    min_samples: int = 20
+    window: int = 200
+    """Number of recent latencies the percentile is computed from"""
+    model_name: str = "hedged"
+
+
+class LatencyTracker:
+    def __init__(self, window: int):
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percentile: float, *, min_samples: int = 1) -> float | None:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+
+_LATENCY_TRACKERS: dict[str, LatencyTracker] = {}
+_LATENCY_TRACKERS_LOCK = threading.Lock()
+
+
+def get_latency_tracker(model_name: str, window: int = 200) -> LatencyTracker:
+    """Latencies are shared by all hedged models of a process that wrap the same model."""
+    with _LATENCY_TRACKERS_LOCK:
+        if model_name not in _LATENCY_TRACKERS:
+            _LATENCY_TRACKERS[model_name] = LatencyTracker(window)
+        return _LATENCY_TRACKERS[model_name]
+
+
+class HedgedModel:
+    def __init__(self, *, config_class: Callable = HedgedModelConfig, **kwargs):
+        """This "meta"-model sends a second (hedge) request if the first one is slower than a percentile
+        of recent latencies and returns whichever response arrives first.
+        The losing request is cancelled: With `aquery`, its task is cancelled. With `query`, it runs in a
+        background thread that stops at the next cancellation point (see `minisweagent.models.utils.cancel`),
+        e.g., streamed responses are closed. Until then, the wrapped model instance of the losing request
+        is not reused, so that its counters are never updated by two threads at once.
+        """
+        self.config = config_class(**kwargs)
+        self.model = get_model(config=self.config.model_kwargs)
+        self.hedge_model = get_model(config=self.config.hedge_model_kwargs or self.config.model_kwargs)
+        self.latencies = get_latency_tracker(self.model.config.model_name, self.config.window)
+        self._models = {"primary": [self.model], "hedge": [self.hedge_model]}
+        """All instances of the wrapped models (for the cost)"""
+        self._idle = {"primary": [self.model], "hedge": [self.hedge_model]}
+        self._lock = threading.Lock()
+        self.n_calls = 0
+        self.n_hedged = 0
+        self.n_hedge_wins = 0
+        self.n_abandoned = 0
+        """Requests whose response was not awaited (they are cancelled, but may have been billed already)"""
+
+    @property
+    def cost(self) -> float:
+        with self._lock:
+            models = self._models["primary"] + self._models["hedge"]
+        return sum(getattr(model, "cost", 0.0) for model in models)
+
+    def _acquire(self, name: str):
+        """Model instance for a request that no other request is using."""
+        with self._lock:
+            if self._idle[name]:
+                return self._idle[name].pop()
+        kwargs = self.config.model_kwargs if name == "primary" else self.config.hedge_model_kwargs
+        model = get_model(config=kwargs or self.config.model_kwargs)
+        with self._lock:
+            self._models[name].append(model)
+        return model
+
+    def _release(self, name: str, model) -> None:
+        with self._lock:
+            self._idle[name].append(model)
+
+    def get_delay(self) -> float:
+        delay = self.latencies.percentile(self.config.percentile, min_samples=self.config.min_samples)
+        return max(self.config.min_delay, self.config.initial_delay if delay is None else delay)
+
+    def query(self, messages: list[dict], **kwargs) -> dict:
+        start = time.monotonic()
+        results = queue.Queue()
+        cancel = threading.Event()
+
+        def run(name: str) -> None:
+            model = self._acquire(name)
+            try:
+                with cancellable(cancel):
+                    response = model.query(messages, **kwargs)
+            except Exception as e:
+                results.put((name, None, e))
+                return
+            finally:
+                self._release(name, model)
+            if name == "primary":
+                # Also if the hedge won: the tracker needs the latency of the endpoint, not of the hedged call
+                self.latencies.add(time.monotonic() - start)
+            results.put((name, response, None))
+
+        threading.Thread(target=run, args=("primary",), daemon=True).start()
+        n_started, n_received = 1, 1
+        try:
+            result = results.get(timeout=self.get_delay())
+        except queue.Empty:
+            threading.Thread(target=run, args=("hedge",), daemon=True).start()
+            n_started = 2
+            result = results.get()
+        if result[2] is not None and n_started == 2:
+            result = results.get()  # the other request might still succeed
+            n_received = 2
+        cancel.set()
+        self.n_abandoned += n_started - n_received
+        return self._finish(*result, hedged=n_started == 2)
+
+    async def aquery(self, messages: list[dict], **kwargs) -> dict:
+        start = time.monotonic()
+        cancel = threading.Event()
+
+        async def run(name: str) -> dict:
+            model = self._acquire(name)
+            try:
+                with cancellable(cancel):
+                    response = await query_async(model, messages, **kwargs)
+            except asyncio.CancelledError:
+                # Not released: a model that runs in a worker thread keeps running until it sees the cancellation
+                raise
+            except Exception:
+                self._release(name, model)
+                raise
+            self._release(name, model)
+            if name == "primary":
+                self.latencies.add(time.monotonic() - start)
+            return response
+
+        tasks = {asyncio.create_task(run("primary")): "primary"}
+        done, _ = await asyncio.wait(tasks, timeout=self.get_delay())
+        if not done:
+            tasks[asyncio.create_task(run("hedge"))] = "hedge"
+        pending = set(tasks)
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded or not pending:
+                    task = (succeeded or list(done))[0]
+                    break
+        finally:
+            cancel.set()
+            self.n_abandoned += len(pending)
+            for loser in pending:
+                loser.cancel()
+                if tasks[loser] == "primary":
+                    # Lower bound of its latency, which is above the hedge delay and hence counts as slow
+                    self.latencies.add(time.monotonic() - start)
+        response = task.result() if task.exception() is None else None
+        return self._finish(tasks[task], response, task.exception(), hedged=len(tasks) == 2)
+
+    def _finish(self, name: str, response: dict | None, exception: Exception | None, *, hedged: bool):
+        self.n_calls += 1
+        self.n_hedged += hedged
+        if exception is not None:
+            raise exception
+        self.n_hedge_wins += name == "hedge"
+        return response | {"hedged": hedged, "hedge_winner": name}
+
+    def get_stats(self) -> dict:
+        """Hedging statistics, saved in the `model_stats` of trajectories."""
+        return {
+            "hedge": {
+                "n_queries": self.n_calls,
+                "n_hedged": self.n_hedged,
+                "n_hedge_wins": self.n_hedge_wins,
+                "hedge_rate": self.n_hedged / self.n_calls if self.n_calls else 0.0,
+                "n_abandoned": self.n_abandoned,
+                "delay": self.get_delay(),
+            }
+        }
+
+    def get_template_vars(self) -> dict:
+        return asdict(self.config) | self.model.get_template_vars() | {"n_model_calls": self.n_calls}
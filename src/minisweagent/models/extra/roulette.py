@@ -3,7 +3,7 @@ from collections.abc import Callable
 from dataclasses import asdict, dataclass
 
 from minisweagent import Model
-from minisweagent.models import get_model
+from minisweagent.models import get_model, query_async
 
 
 @dataclass
@@ -39,6 +39,12 @@ class RouletteModel:
         response["model_name"] = model.config.model_name
         return response
 
+    async def aquery(self, *args, **kwargs) -> dict:
+        model = self.select_model()
+        response = await query_async(model, *args, **kwargs)
+        response["model_name"] = model.config.model_name
+        return response
+
 
 @dataclass
 class InterleavingModelConfig:
@@ -0,0 +1,173 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from minisweagent import Model
+from minisweagent.models import query_async
+from minisweagent.models.extra.roulette import RouletteModel
+from minisweagent.models.utils.retry import RetryPolicy, get_circuit_breaker, is_retryable
+from minisweagent.utils.log import logger
+
+
+@dataclass
+class RouterModelConfig:
+    model_kwargs: list[dict]
+    """The models (endpoints) to route between, e.g., the same model from several `models.yaml` entries"""
+    ewma_alpha: float = 0.2
+    """Weight of the latest call in the latency and error rate averages"""
+    endpoint_max_attempts: int = 1
+    """Attempts of the wrapped model before failing over to the next endpoint. While the circuit breaker
+    of an endpoint is open, its calls fail immediately."""
+    max_rounds: int = 3
+    """Rounds over all endpoints before a call fails (only if the errors are retryable)"""
+    round_wait: float = 2.0
+    """Wait before the second round (doubles with every round)"""
+    model_name: str = "router"
+
+
+class EndpointStats:
+    def __init__(self, ewma_alpha: float = 0.2):
+        self.ewma_alpha = ewma_alpha
+        self.latency_ewma: float | None = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.n_calls = 0
+        self.n_errors = 0
+        self._lock = threading.Lock()
+
+    def get_score(self) -> float:
+        """Expected time until a new call is answered (lower is better). Endpoints without
+        latency measurements score 0, so that every endpoint is tried.
+        """
+        if self.latency_ewma is None:
+            return 0.0
+        return self.latency_ewma * (1 + self.in_flight) / max(1 - self.error_rate, 0.05)
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        with self._lock:
+            self.in_flight += 1
+        start, failed = time.monotonic(), True
+        try:
+            yield
+            failed = False
+        finally:
+            latency = time.monotonic() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.n_calls += 1
+                self.n_errors += failed
+                self.error_rate = self.ewma_alpha * failed + (1 - self.ewma_alpha) * self.error_rate
+                if not failed:
+                    self.latency_ewma = (
+                        latency
+                        if self.latency_ewma is None
+                        else self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.latency_ewma
+                    )
+
+    def as_dict(self) -> dict:
+        return {
+            "latency_ewma": self.latency_ewma,
+            "error_rate": self.error_rate,
+            "in_flight": self.in_flight,
+            "n_calls": self.n_calls,
+            "n_errors": self.n_errors,
+        }
+
+
+_ENDPOINT_STATS: dict[str, EndpointStats] = {}
+_ENDPOINT_STATS_LOCK = threading.Lock()
+
+
+def get_endpoint_key(model: Model) -> str:
+    return f"{getattr(model.config, 'api_base', '')}#{model.config.model_name}"
+
+
+def get_endpoint_stats(key: str, ewma_alpha: float = 0.2) -> EndpointStats:
+    """Stats are shared by all router models of a process, so that every agent benefits from what
+    the others observed.
+    """
+    with _ENDPOINT_STATS_LOCK:
+        if key not in _ENDPOINT_STATS:
+            _ENDPOINT_STATS[key] = EndpointStats(ewma_alpha)
+        return _ENDPOINT_STATS[key]
+
+
+def _is_circuit_open(model: Model) -> bool:
+    api_base = getattr(model.config, "api_base", None)
+    return api_base is not None and get_circuit_breaker(api_base).is_open
+
+
+class RouterModel(RouletteModel):
+    def __init__(self, *, config_class: Callable = RouterModelConfig, **kwargs):
+        """This "meta"-model sends every call to the endpoint with the lowest expected latency, based on
+        the latency average, the number of calls in flight and the error rate of each endpoint.
+        If a call fails, it fails over to the next best endpoint right away: the wrapped models only get a
+        small retry budget and do not wait for open circuit breakers.
+        """
+        super().__init__(config_class=config_class, **kwargs)
+        for model in self.models:
+            model.retry_policy = RetryPolicy(max_attempts=self.config.endpoint_max_attempts, fail_fast=True)
+        self.endpoint_stats = [
+            get_endpoint_stats(get_endpoint_key(model), self.config.ewma_alpha) for model in self.models
+        ]
+
+    def rank_models(self) -> list[tuple[Model, EndpointStats]]:
+        """Models ordered by score. Endpoints whose circuit breaker is open come last."""
+        candidates = list(zip(self.models, self.endpoint_stats))
+        random.shuffle(candidates)  # break ties randomly
+        return sorted(candidates, key=lambda candidate: (_is_circuit_open(candidate[0]), candidate[1].get_score()))
+
+    def select_model(self) -> Model:
+        return self.rank_models()[0][0]
+
+    def get_round_wait(self, i_round: int) -> float:
+        return self.config.round_wait * 2 ** (i_round - 1) if i_round else 0.0
+
+    def _on_failure(self, model: Model, error: Exception, *, i_round: int, is_last: bool) -> None:
+        """Re-raise `error` if the call has failed for good."""
+        if is_last and (i_round == self.config.max_rounds - 1 or not is_retryable(error)):
+            raise error
+        logger.warning(f"Model {model.config.model_name} failed ({error}), failing over to the next endpoint")
+
+    def query(self, *args, **kwargs) -> dict:
+        for i_round in range(self.config.max_rounds):
+            time.sleep(self.get_round_wait(i_round))
+            ranked = self.rank_models()
+            for i_model, (model, stats) in enumerate(ranked):
+                try:
+                    with stats.track():
+                        response = model.query(*args, **kwargs)
+                except Exception as e:
+                    self._on_failure(model, e, i_round=i_round, is_last=i_model == len(ranked) - 1)
+                    continue
+                response["model_name"] = model.config.model_name
+                return response
+        raise RuntimeError("No models to route to")
+
+    async def aquery(self, *args, **kwargs) -> dict:
+        for i_round in range(self.config.max_rounds):
+            await asyncio.sleep(self.get_round_wait(i_round))
+            ranked = self.rank_models()
+            for i_model, (model, stats) in enumerate(ranked):
+                try:
+                    with stats.track():
+                        response = await query_async(model, *args, **kwargs)
+                except Exception as e:
+                    self._on_failure(model, e, i_round=i_round, is_last=i_model == len(ranked) - 1)
+                    continue
+                response["model_name"] = model.config.model_name
+                return response
+        raise RuntimeError("No models to route to")
+
+    def get_stats(self) -> dict:
+        """Endpoint stats, saved in the `model_stats` of trajectories."""
+        return {
+            "router": {
+                get_endpoint_key(model): stats.as_dict() for model, stats in zip(self.models, self.endpoint_stats)
+            }
+        }
@@ -1,24 +1,32 @@
 import json
 import logging
 import os
+import time
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Any, Literal
 
 import litellm
-from tenacity import (
-    before_sleep_log,
-    retry,
-    retry_if_not_exception_type,
-    stop_after_attempt,
-    wait_exponential,
-)
 
 from minisweagent.models import GLOBAL_MODEL_STATS
 from minisweagent.models.utils.cache_control import set_cache_control
+from minisweagent.models.utils.retry import retry_model_call
 
 logger = logging.getLogger("litellm_model")
 
+_retry = retry_model_call(
+    lambda self: self.config.model_kwargs.get("api_base") or self.config.model_name,
+    non_retryable=(
+        litellm.exceptions.UnsupportedParamsError,
+        litellm.exceptions.NotFoundError,
+        litellm.exceptions.PermissionDeniedError,
+        litellm.exceptions.ContextWindowExceededError,
+        litellm.exceptions.AuthenticationError,
+    ),
+    min_wait=4,
+    log=logger,
+)
+
 
 @dataclass
 class LitellmModelConfig:
@@ -47,22 +55,7 @@ class LitellmModel:
         else:
             logger.debug(f"No model registry specified for model: {self.config.model_name}")
 
-    @retry(
-        stop=stop_after_attempt(10),
-        wait=wait_exponential(multiplier=1, min=4, max=60),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
-        retry=retry_if_not_exception_type(
-            (
-                litellm.exceptions.UnsupportedParamsError,
-                litellm.exceptions.NotFoundError,
-                litellm.exceptions.PermissionDeniedError,
-                litellm.exceptions.ContextWindowExceededError,
-                litellm.exceptions.APIError,
-                litellm.exceptions.AuthenticationError,
-                KeyboardInterrupt,
-            )
-        ),
-    )
+    @_retry
     def _query(self, messages: list[dict[str, str]], **kwargs):
         try:
             return litellm.completion(
@@ -72,10 +65,31 @@ class LitellmModel:
             e.message += " You can permanently set your API key with `mini-extra config set KEY VALUE`."
             raise e
 
+    @_retry
+    async def _aquery(self, messages: list[dict[str, str]], **kwargs):
+        try:
+            return await litellm.acompletion(
+                model=self.config.model_name, messages=messages, **(self.config.model_kwargs | kwargs)
+            )
+        except litellm.exceptions.AuthenticationError as e:
+            e.message += " You can permanently set your API key with `mini-extra config set KEY VALUE`."
+            raise e
+
     def query(self, messages: list[dict[str, str]], **kwargs) -> dict:
         if self.config.set_cache_control:
             messages = set_cache_control(messages, mode=self.config.set_cache_control)
+        start = time.perf_counter()
         response = self._query(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    async def aquery(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        if self.config.set_cache_control:
+            messages = set_cache_control(messages, mode=self.config.set_cache_control)
+        start = time.perf_counter()
+        response = await self._aquery(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    def _parse_response(self, response, latency: float | None = None) -> dict:
         try:
             cost = litellm.cost_calculator.completion_cost(response)
             assert cost >= 0.0, f"Cost is negative: {cost}"
@@ -89,7 +103,9 @@ class LitellmModel:
             cost = 0.0
         self.n_calls += 1
         self.cost += cost
-        GLOBAL_MODEL_STATS.add(cost)
+        GLOBAL_MODEL_STATS.add(
+            cost, model_name=self.config.model_name, usage=getattr(response, "usage", None), latency=latency
+        )
         return {
             "content": response.choices[0].message.content or "",  # type: ignore
             "extra": {
@@ -1,36 +1,95 @@
+import copy
 import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass, field
 from pathlib import Path
+from types import MappingProxyType
 from typing import Any
 
 import yaml
 
 from minisweagent.utils.log import logger
 
+DEFAULT_MODELS_FILE = Path(__file__).resolve().parents[3] / "config" / "models.yaml"
+
+
+@dataclass(frozen=True)
+class ModelEntry:
+    """A model of `models.yaml`. Shared by all callers, so it must not be modified."""
+
+    model_name: str
+    api_base: str
+    api_key_env: str = "HUAWEI_API_KEY"
+    model_kwargs: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    rate_limit: Mapping[str, float] | None = None
+
+
+class ModelRegistry:
+    def __init__(self, path: Path | None = None):
+        """Parses `models.yaml` once and again only when the file changes.
+
+        Args:
+            path: The models file. Defaults to `$MSWEA_MODELS_FILE` or `config/models.yaml` of the repository.
+        """
+        self.path = path
+        self._entries: dict[str, ModelEntry] = {}
+        self._loaded_from: tuple[Path, int] | None = None
+        self._lock = threading.Lock()
+
+    def get_path(self) -> Path:
+        return Path(self.path or os.getenv("MSWEA_MODELS_FILE") or DEFAULT_MODELS_FILE)
+
+    def _load(self) -> tuple[Path, dict[str, ModelEntry]]:
+        path = self.get_path()
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Model config file not found: {path}") from None
+        with self._lock:
+            if self._loaded_from != (path, mtime):
+                models = (yaml.safe_load(path.read_text()) or {}).get("models", {})
+                self._entries = {
+                    name: ModelEntry(
+                        model_name=cfg.get("model_name", name),
+                        api_base=cfg["api_base"],
+                        api_key_env=cfg.get("api_key_env", "HUAWEI_API_KEY"),
+                        model_kwargs=MappingProxyType(cfg.get("model_kwargs") or {}),
+                        rate_limit=MappingProxyType(cfg["rate_limit"]) if cfg.get("rate_limit") else None,
+                    )
+                    for name, cfg in models.items()
+                }
+                self._loaded_from = (path, mtime)
+                logger.info(f"Loaded {len(self._entries)} model config(s) from {path}")
+            return path, self._entries
+
+    def get(self, model_name: str) -> ModelEntry:
+        path, entries = self._load()
+        if model_name not in entries:
+            raise ValueError(f"Model '{model_name}' not found in {path}")
+        return entries[model_name]
+
+    def list_models(self) -> list[str]:
+        return list(self._load()[1])
+
+
+GLOBAL_MODEL_REGISTRY = ModelRegistry()
+"""Shared by all models of a process."""
+
 
 def load_model_config(model_name: str) -> dict[str, Any]:
     """Load model configuration from config/models.yaml and environment variables."""
-    root = Path(__file__).resolve().parents[3]
-    config_path = root / "config" / "models.yaml"
-    if not config_path.exists():
-        raise FileNotFoundError(f"Model config file not found: {config_path}")
-
-    config_data = yaml.safe_load(config_path.read_text()) or {}
-    models = config_data.get("models", {})
-    if model_name not in models:
-        raise ValueError(f"Model '{model_name}' not found in {config_path}")
-
-    model_cfg = models[model_name]
-    api_key_env = model_cfg.get("api_key_env", "HUAWEI_API_KEY")
-    api_key = os.getenv(api_key_env)
+    entry = GLOBAL_MODEL_REGISTRY.get(model_name)
+    api_key = os.getenv(entry.api_key_env)
     if not api_key:
-        raise ValueError(f"API key not found in environment variable '{api_key_env}'. Set it in ~/.config/mini-swe-agent/.env")
-
-    result = {
-        "model_name": model_cfg.get("model_name", model_name),
-        "api_base": model_cfg["api_base"],
+        raise ValueError(
+            f"API key not found in environment variable '{entry.api_key_env}'. Set it in ~/.config/mini-swe-agent/.env"
+        )
+    return {
+        "model_name": entry.model_name,
+        "api_base": entry.api_base,
         "api_key": api_key,
-        "model_kwargs": model_cfg.get("model_kwargs", {}),
+        "model_kwargs": copy.deepcopy(dict(entry.model_kwargs)),
+        "api_key_env": entry.api_key_env,
+        "rate_limit": dict(entry.rate_limit) if entry.rate_limit is not None else None,
     }
-    logger.info(f"Loaded model config for {model_name} from {config_path}")
-    return result
-
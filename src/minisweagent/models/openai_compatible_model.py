@@ -1,18 +1,22 @@
+import asyncio
 import json
 import os
+import re
+import time
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Any
 
 import requests
-from tenacity import (
-    before_sleep_log,
-    retry,
-    retry_if_not_exception_type,
-    stop_after_attempt,
-    wait_exponential,
-)
 
+from minisweagent.models import GLOBAL_MODEL_STATS
+from minisweagent.models.utils.cache_control import get_prefix_stable_messages
+from minisweagent.models.utils.cancel import raise_if_cancelled
+from minisweagent.models.utils.concurrency import GLOBAL_CONCURRENCY_LIMITER
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
+from minisweagent.models.utils.rate_limit import RateLimiter, estimate_tokens, get_rate_limiter
+from minisweagent.models.utils.retry import retry_model_call
+from minisweagent.models.utils.stats import ModelCounters
 from minisweagent.utils.log import logger
 
 
@@ -21,24 +25,33 @@ class OpenAICompatibleModelConfig:
     model_name: str
     api_base: str
     api_key: str | None = None
+    api_key_env: str = "HUAWEI_API_KEY"
     model_kwargs: dict[str, Any] = field(default_factory=dict)
+    http2: bool = False
+    """Multiplex all requests to the API base over HTTP/2 (requires `pip install 'mini-swe-agent[http2]'`)"""
+    stream: bool = False
+    """Stream the completion and stop reading as soon as `stream_stop_pattern` matches.
+    Streamed requests always use HTTP/1.1."""
+    stream_stop_pattern: str = r"```bash\s*\n.*?\n```"
+    """Once the streamed content matches, the request is cancelled and the content is cut after the match.
+    Empty to always read the whole completion."""
+    rate_limit: dict[str, float] | None = None
+    """Requests (`rpm`) and tokens (`tpm`) per minute, shared by all models with the same API base and key"""
+    prefix_stable_messages: bool = True
+    """Send the messages in a canonical form, so that the provider's prefix cache can be reused across calls"""
 
 
 class OpenAICompatibleModel:
     def __init__(self, *, config_class: type = OpenAICompatibleModelConfig, **kwargs):
         self.config = config_class(**kwargs)
         self.n_calls = 0
+        self.counters = ModelCounters()
 
-    @retry(
-        stop=stop_after_attempt(10),
-        wait=wait_exponential(multiplier=1, min=2, max=30),
-        before_sleep=before_sleep_log(logger, logger.level),
-        retry=retry_if_not_exception_type((requests.HTTPError, requests.Timeout, requests.ConnectionError, KeyboardInterrupt)),
-    )
-    def _query(self, messages: list[dict[str, str]], **kwargs) -> dict:
-        api_key = self.config.api_key or os.getenv("HUAWEI_API_KEY")
+    def _prepare_request(self, messages: list[dict[str, str]], **kwargs) -> tuple[str, dict, dict]:
+        """URL, headers and payload of a completion request."""
+        api_key = self.config.api_key or os.getenv(self.config.api_key_env)
         if not api_key:
-            raise ValueError("API key not found. Set HUAWEI_API_KEY in ~/.config/mini-swe-agent/.env")
+            raise ValueError(f"API key not found. Set {self.config.api_key_env} in ~/.config/mini-swe-agent/.env")
 
         base = self.config.api_base.rstrip("/")
         url = f"{base}/chat/completions"
@@ -46,18 +59,139 @@ class OpenAICompatibleModel:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
+        if self.config.prefix_stable_messages:
+            messages = get_prefix_stable_messages(messages)
         payload = {
             "model": self.config.model_name,
             "messages": messages,
             **(self.config.model_kwargs | kwargs),
         }
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=120)
+        if self.config.stream:
+            payload["stream"] = True
+            payload.setdefault("stream_options", {"include_usage": True})
+        return url, headers, payload
+
+    def _get_rate_limiter(self) -> RateLimiter | None:
+        if not self.config.rate_limit:
+            return None
+        return get_rate_limiter(self.config.api_base, self.config.api_key_env, **self.config.rate_limit)
+
+    @retry_model_call(lambda self: self.config.api_base, max_wait=30)
+    def _query(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        url, headers, payload = self._prepare_request(messages, **kwargs)
+        estimated_tokens = estimate_tokens(messages)
+        if rate_limiter := self._get_rate_limiter():
+            rate_limiter.acquire(estimated_tokens)
+        with GLOBAL_CONCURRENCY_LIMITER.slot() as call:
+            response = GLOBAL_SESSION_POOL.post(
+                self.config.api_base,
+                url,
+                http2=self.config.http2 and not self.config.stream,
+                headers=headers,
+                data=json.dumps(payload),
+                timeout=120,
+                **({"stream": True} if self.config.stream else {}),
+            )
+            call.status_code = response.status_code
+            if self.config.stream and response.ok:
+                data = self._read_stream(response, prompt_tokens=estimated_tokens)
+        if not (self.config.stream and response.ok):
+            response.raise_for_status()
+            data = response.json()
+        if rate_limiter is not None:
+            rate_limiter.record_usage(estimated_tokens, (data.get("usage") or {}).get("total_tokens"))
+        return data
+
+    @retry_model_call(lambda self: self.config.api_base, max_wait=30)
+    async def _aquery(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        url, headers, payload = self._prepare_request(messages, **kwargs)
+        estimated_tokens = estimate_tokens(messages)
+        if rate_limiter := self._get_rate_limiter():
+            await rate_limiter.aacquire(estimated_tokens)
+        async with GLOBAL_CONCURRENCY_LIMITER.aslot() as call:
+            response = await GLOBAL_SESSION_POOL.apost(
+                self.config.api_base,
+                url,
+                http2=self.config.http2,
+                headers=headers,
+                data=json.dumps(payload),
+                timeout=120,
+            )
+            call.status_code = response.status_code
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        if rate_limiter is not None:
+            rate_limiter.record_usage(estimated_tokens, (data.get("usage") or {}).get("total_tokens"))
+        return data
+
+    def _read_stream(self, response: requests.Response, *, prompt_tokens: int = 0) -> dict:
+        """Assemble the server-sent events of a streamed completion into a regular (non-streamed) response.
+
+        The usage is sent in the last chunk. If the stream was cancelled before (or the endpoint does not
+        send usage), it is estimated from `prompt_tokens` and the length of the received content.
+        """
+        content, reasoning_content, last_chunk, finish_reason, usage = "", "", {}, None, None
+        stop_pattern = re.compile(self.config.stream_stop_pattern, re.DOTALL)
+        with response:
+            # chunk_size=None: hand out every chunk as soon as it arrives instead of waiting for a full buffer
+            for line in response.iter_lines(chunk_size=None):
+                # Closing the response aborts the completion, e.g., if the hedge request won
+                raise_if_cancelled()
+                line = line.decode("utf-8", errors="replace")
+                if not line.startswith("data:"):
+                    continue  # comments and keep-alive lines
+                data = line.removeprefix("data:").strip()
+                if data == "[DONE]":
+                    break
+                last_chunk = json.loads(data)
+                usage = last_chunk.get("usage") or usage
+                if not last_chunk.get("choices"):
+                    continue  # e.g., final chunk with usage only
+                choice = last_chunk["choices"][0]
+                delta = choice.get("delta") or {}
+                content += delta.get("content") or ""
+                reasoning_content += delta.get("reasoning_content") or ""
+                finish_reason = choice.get("finish_reason") or finish_reason
+                if self.config.stream_stop_pattern and (match := stop_pattern.search(content)):
+                    content, finish_reason = content[: match.end()], "action_complete"
+                    break
+        message = {"role": "assistant", "content": content}
+        if reasoning_content:
+            message["reasoning_content"] = reasoning_content
+        return {
+            "id": last_chunk.get("id"),
+            "model": last_chunk.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage or self._estimate_usage(prompt_tokens, content + reasoning_content),
+        }
+
+    @staticmethod
+    def _estimate_usage(prompt_tokens: int, completion: str) -> dict:
+        completion_tokens = len(completion.encode()) // 4 + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "estimated": True,
+        }
 
     def query(self, messages: list[dict[str, str]], **kwargs) -> dict:
-        data = self._query(messages, **kwargs)
+        start = time.perf_counter()
+        response = self._query(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    async def aquery(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        if self.config.stream:
+            # Streamed responses are read line by line with the sync session, in a worker thread
+            return await asyncio.to_thread(self.query, messages, **kwargs)
+        start = time.perf_counter()
+        response = await self._aquery(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    def _parse_response(self, data: dict, latency: float | None = None) -> dict:
         self.n_calls += 1
+        self.counters.add(usage=data.get("usage"), latency=latency)
+        GLOBAL_MODEL_STATS.add(model_name=self.config.model_name, usage=data.get("usage"), latency=latency)
         content = ""
         try:
             content = data["choices"][0]["message"]["content"] or ""
@@ -68,6 +202,10 @@ class OpenAICompatibleModel:
             "extra": {"response": data},
         }
 
+    def get_stats(self) -> dict:
+        """Token usage and prefix cache hit rate, saved in the `model_stats` of trajectories."""
+        counters = self.counters.as_dict()
+        return {key: counters[key] for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "cache_hit_rate")}
+
     def get_template_vars(self) -> dict[str, Any]:
         return asdict(self.config) | {"n_model_calls": self.n_calls}
-
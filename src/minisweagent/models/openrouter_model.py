@@ -1,20 +1,16 @@
 import json
 import logging
 import os
+import time
 from dataclasses import asdict, dataclass, field
 from typing import Any, Literal
 
 import requests
-from tenacity import (
-    before_sleep_log,
-    retry,
-    retry_if_not_exception_type,
-    stop_after_attempt,
-    wait_exponential,
-)
 
 from minisweagent.models import GLOBAL_MODEL_STATS
 from minisweagent.models.utils.cache_control import set_cache_control
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
+from minisweagent.models.utils.retry import retry_model_call
 
 logger = logging.getLogger("openrouter_model")
 
@@ -53,18 +49,7 @@ class OpenRouterModel:
         self._api_url = "https://openrouter.ai/api/v1/chat/completions"
         self._api_key = os.getenv("OPENROUTER_API_KEY", "")
 
-    @retry(
-        stop=stop_after_attempt(10),
-        wait=wait_exponential(multiplier=1, min=4, max=60),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
-        retry=retry_if_not_exception_type(
-            (
-                OpenRouterAuthenticationError,
-                KeyboardInterrupt,
-            )
-        ),
-    )
-    def _query(self, messages: list[dict[str, str]], **kwargs):
+    def _prepare_request(self, messages: list[dict[str, str]], **kwargs) -> tuple[dict, dict]:
         headers = {
             "Authorization": f"Bearer {self._api_key}",
             "Content-Type": "application/json",
@@ -76,11 +61,11 @@ class OpenRouterModel:
             "usage": {"include": True},
             **(self.config.model_kwargs | kwargs),
         }
+        return headers, payload
 
+    def _check_response(self, response: requests.Response) -> dict:
         try:
-            response = requests.post(self._api_url, headers=headers, data=json.dumps(payload), timeout=60)
             response.raise_for_status()
-            return response.json()
         except requests.exceptions.HTTPError as e:
             if response.status_code == 401:
                 error_msg = "Authentication failed. You can permanently set your API key with `mini-extra config set OPENROUTER_API_KEY YOUR_KEY`."
@@ -89,14 +74,47 @@ class OpenRouterModel:
                 raise OpenRouterRateLimitError("Rate limit exceeded") from e
             else:
                 raise OpenRouterAPIError(f"HTTP {response.status_code}: {response.text}") from e
+        return response.json()
+
+    @retry_model_call(
+        lambda self: self._api_url, non_retryable=(OpenRouterAuthenticationError,), min_wait=4, log=logger
+    )
+    def _query(self, messages: list[dict[str, str]], **kwargs):
+        headers, payload = self._prepare_request(messages, **kwargs)
+        try:
+            response = requests.post(self._api_url, headers=headers, data=json.dumps(payload), timeout=60)
+            return self._check_response(response)
+        except requests.exceptions.RequestException as e:
+            raise OpenRouterAPIError(f"Request failed: {e}") from e
+
+    @retry_model_call(
+        lambda self: self._api_url, non_retryable=(OpenRouterAuthenticationError,), min_wait=4, log=logger
+    )
+    async def _aquery(self, messages: list[dict[str, str]], **kwargs):
+        headers, payload = self._prepare_request(messages, **kwargs)
+        try:
+            response = await GLOBAL_SESSION_POOL.apost(
+                self._api_url, self._api_url, headers=headers, data=json.dumps(payload), timeout=60
+            )
+            return self._check_response(response)
         except requests.exceptions.RequestException as e:
             raise OpenRouterAPIError(f"Request failed: {e}") from e
 
     def query(self, messages: list[dict[str, str]], **kwargs) -> dict:
         if self.config.set_cache_control:
             messages = set_cache_control(messages, mode=self.config.set_cache_control)
+        start = time.perf_counter()
         response = self._query(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    async def aquery(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        if self.config.set_cache_control:
+            messages = set_cache_control(messages, mode=self.config.set_cache_control)
+        start = time.perf_counter()
+        response = await self._aquery(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
 
+    def _parse_response(self, response: dict, latency: float | None = None) -> dict:
         # Extract cost from usage information
         usage = response.get("usage", {})
         cost = usage.get("cost", 0.0)
@@ -111,7 +129,7 @@ class OpenRouterModel:
 
         self.n_calls += 1
         self.cost += cost
-        GLOBAL_MODEL_STATS.add(cost)
+        GLOBAL_MODEL_STATS.add(cost, model_name=self.config.model_name, usage=response.get("usage"), latency=latency)
 
         return {
             "content": response["choices"][0]["message"]["content"] or "",
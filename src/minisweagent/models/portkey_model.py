@@ -1,28 +1,23 @@
 import json
 import logging
 import os
+import time
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Any, Literal
 
 import litellm
-from tenacity import (
-    before_sleep_log,
-    retry,
-    retry_if_not_exception_type,
-    stop_after_attempt,
-    wait_exponential,
-)
 
 from minisweagent.models import GLOBAL_MODEL_STATS
 from minisweagent.models.utils.cache_control import set_cache_control
+from minisweagent.models.utils.retry import retry_model_call
 
 logger = logging.getLogger("portkey_model")
 
 try:
-    from portkey_ai import Portkey
+    from portkey_ai import AsyncPortkey, Portkey
 except ImportError:
-    Portkey = None
+    AsyncPortkey = Portkey = None
 
 
 @dataclass
@@ -72,13 +67,9 @@ class PortkeyModel:
             client_kwargs["virtual_key"] = virtual_key
 
         self.client = Portkey(**client_kwargs)
+        self.async_client = AsyncPortkey(**client_kwargs)
 
-    @retry(
-        stop=stop_after_attempt(10),
-        wait=wait_exponential(multiplier=1, min=4, max=60),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
-        retry=retry_if_not_exception_type((KeyboardInterrupt, TypeError, ValueError)),
-    )
+    @retry_model_call(lambda self: f"portkey:{self.config.model_name}", min_wait=4, log=logger)
     def _query(self, messages: list[dict[str, str]], **kwargs):
         # return self.client.with_options(metadata={"request_id": request_id}).chat.completions.create(
         return self.client.chat.completions.create(
@@ -87,10 +78,29 @@ class PortkeyModel:
             **(self.config.model_kwargs | kwargs),
         )
 
+    @retry_model_call(lambda self: f"portkey:{self.config.model_name}", min_wait=4, log=logger)
+    async def _aquery(self, messages: list[dict[str, str]], **kwargs):
+        return await self.async_client.chat.completions.create(
+            model=self.config.model_name,
+            messages=messages,
+            **(self.config.model_kwargs | kwargs),
+        )
+
     def query(self, messages: list[dict[str, str]], **kwargs) -> dict:
         if self.config.set_cache_control:
             messages = set_cache_control(messages, mode=self.config.set_cache_control)
+        start = time.perf_counter()
         response = self._query(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    async def aquery(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        if self.config.set_cache_control:
+            messages = set_cache_control(messages, mode=self.config.set_cache_control)
+        start = time.perf_counter()
+        response = await self._aquery(messages, **kwargs)
+        return self._parse_response(response, latency=time.perf_counter() - start)
+
+    def _parse_response(self, response, latency: float | None = None) -> dict:
         response_for_cost_calc = response.model_copy()
         if self.config.litellm_model_name_override:
             if response_for_cost_calc.model:
@@ -121,7 +131,7 @@ class PortkeyModel:
 
         self.n_calls += 1
         self.cost += cost
-        GLOBAL_MODEL_STATS.add(cost)
+        GLOBAL_MODEL_STATS.add(cost, model_name=self.config.model_name, usage=response.usage, latency=latency)
 
         return {
             "content": response.choices[0].message.content or "",
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 from dataclasses import asdict, dataclass
@@ -35,8 +36,11 @@ class DeterministicModel:
             return self.query(messages, **kwargs)
         self.n_calls += 1
         self.cost += self.config.cost_per_call
-        GLOBAL_MODEL_STATS.add(self.config.cost_per_call)
+        GLOBAL_MODEL_STATS.add(self.config.cost_per_call, model_name=self.config.model_name)
         return {"content": output}
 
+    async def aquery(self, messages: list[dict[str, str]], **kwargs) -> dict:
+        return await asyncio.to_thread(self.query, messages, **kwargs)
+
     def get_template_vars(self) -> dict[str, Any]:
         return asdict(self.config) | {"n_model_calls": self.n_calls, "model_cost": self.cost}
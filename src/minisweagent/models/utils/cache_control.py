@@ -1,4 +1,3 @@
-import copy
 import warnings
 from typing import Literal
 
@@ -17,6 +16,12 @@ def _clear_cache_control(entry: dict) -> None:
     entry.pop("cache_control", None)
 
 
+def _has_cache_control(entry: dict) -> bool:
+    if "cache_control" in entry:
+        return True
+    return isinstance(entry["content"], list) and any("cache_control" in part for part in entry["content"])
+
+
 def _set_cache_control(entry: dict) -> None:
     if not isinstance(entry["content"], list):
         entry["content"] = [  # type: ignore
@@ -44,11 +49,33 @@ def set_cache_control(
     if last_n_messages_offset:
         warnings.warn("last_n_messages_offset is deprecated and will be removed in the future. It has no effect.")
 
-    messages = copy.deepcopy(messages)
+    # Only the entries that are modified are copied, all others are shared with `messages`
     new_messages = []
-    for i_entry, entry in enumerate(reversed(messages)):
-        _clear_cache_control(entry)
-        if i_entry == 0:
-            _set_cache_control(entry)
+    for i_entry, entry in enumerate(messages):
+        is_last = i_entry == len(messages) - 1
+        if is_last or _has_cache_control(entry):
+            entry = dict(entry)
+            if isinstance(entry["content"], list):
+                entry["content"] = [dict(part) for part in entry["content"]]
+            _clear_cache_control(entry)
+            if is_last:
+                _set_cache_control(entry)
         new_messages.append(entry)
-    return list(reversed(new_messages))
+    return new_messages
+
+
+PREFIX_STABLE_KEYS = ("role", "content", "name", "tool_calls", "tool_call_id")
+
+
+def get_prefix_stable_messages(messages: list[dict], *, keys: tuple[str, ...] = PREFIX_STABLE_KEYS) -> list[dict]:
+    """This messages processor serializes every message the same way in every call, so that providers with
+    automatic prefix caching (e.g., DeepSeek) can reuse the cached prompt: Only `keys` are sent (in this
+    order), cache control marks are removed and single text parts are sent as plain strings.
+    """
+    new_messages = []
+    for entry in messages:
+        content = entry["content"]
+        if isinstance(content, list) and len(content) == 1 and content[0].get("type") == "text":
+            content = content[0]["text"]
+        new_messages.append({key: content if key == "content" else entry[key] for key in keys if key in entry})
+    return new_messages
@@ -0,0 +1,32 @@
+"""Cooperative cancellation of model calls whose response is no longer needed (e.g., the losing request of
+the hedged model). Calls that run in worker threads cannot be interrupted, so models check for cancellation
+wherever they can stop early: before every attempt and between the chunks of a streamed response.
+"""
+
+import contextvars
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+_cancel_event: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar("cancel_event", default=None)
+
+
+class CallCancelled(Exception):
+    """Raised within a model call that was cancelled. Never retried."""
+
+
+@contextmanager
+def cancellable(event: threading.Event) -> Iterator[None]:
+    """Model calls in this context (and in worker threads started with `asyncio.to_thread`) stop once
+    `event` is set.
+    """
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def raise_if_cancelled() -> None:
+    if (event := _cancel_event.get()) is not None and event.is_set():
+        raise CallCancelled("The response of this model call is no longer needed")
@@ -0,0 +1,152 @@
+"""Adaptive limit on the number of model calls that are in flight at the same time.
+
+The limit follows an AIMD (additive increase, multiplicative decrease) scheme: every successful call
+raises it by `1 / limit` (i.e., by one per round of calls), while rate limit responses, server errors
+and latency spikes halve it. This keeps the number of concurrent calls close to what the endpoint can
+actually serve without hammering it in lockstep once it starts throttling.
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+
+from minisweagent.models.utils.cancel import CallCancelled
+from minisweagent.utils.log import logger
+
+THROTTLING_STATUS_CODES = (429, 502, 503, 504)
+
+
+@dataclass
+class ModelCall:
+    start: float
+    status_code: int | None = None
+    """Set by the caller once the response arrived"""
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(
+        self,
+        max_limit: int = 0,
+        *,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        ewma_alpha: float = 0.2,
+    ):
+        """Limits concurrent model calls. A `max_limit` of 0 disables the limiter.
+
+        Args:
+            max_limit: Upper bound of the limit (usually the number of workers)
+            min_limit: Lower bound of the limit
+            decrease_factor: Factor by which the limit shrinks on congestion
+            latency_tolerance: Calls that take longer than this multiple of the average latency
+                are treated as a congestion signal
+            ewma_alpha: Weight of the latest call in the latency average
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.ewma_alpha = ewma_alpha
+        self.limit = float(max(min_limit, max_limit // 2))
+        self.in_flight = 0
+        self.latency_ewma: float | None = None
+        self.n_throttled = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def configure(self, max_limit: int) -> None:
+        """(Re-)enable the limiter with a new upper bound."""
+        with self._condition:
+            self.max_limit = max_limit
+            self.limit = float(max(self.min_limit, max_limit // 2))
+            self._condition.notify_all()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_limit > 0
+
+    @contextmanager
+    def slot(self) -> Iterator[ModelCall]:
+        """Wait until a call may be made. Set `status_code` of the yielded object after the call."""
+        if not self.enabled:
+            yield ModelCall(start=time.monotonic())
+            return
+        with self._condition:
+            self._condition.wait_for(self._try_enter)
+        call, failed = ModelCall(start=time.monotonic()), None
+        try:
+            yield call
+            failed = call.status_code in THROTTLING_STATUS_CODES
+        except CallCancelled:
+            raise  # says nothing about the load of the endpoint
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._on_call_end(call, failed=failed)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[ModelCall]:
+        """Like `slot`, but waits without blocking the event loop."""
+        if not self.enabled:
+            yield ModelCall(start=time.monotonic())
+            return
+        while True:
+            with self._condition:
+                if self._try_enter():
+                    break
+            await asyncio.sleep(0.05)
+        call, failed = ModelCall(start=time.monotonic()), None
+        try:
+            yield call
+            failed = call.status_code in THROTTLING_STATUS_CODES
+        except CallCancelled:
+            raise  # says nothing about the load of the endpoint
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._on_call_end(call, failed=failed)
+
+    def _try_enter(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def _on_call_end(self, call: ModelCall, *, failed: bool | None) -> None:
+        """Release the slot of a call. `failed` is None if the call was cancelled or interrupted, which
+        says nothing about the endpoint, so the limit is left as is.
+        """
+        now = time.monotonic()
+        latency = now - call.start
+        with self._condition:
+            self.in_flight -= 1
+            if failed is None:
+                self._condition.notify_all()
+                return
+            slow = self.latency_ewma is not None and latency > self.latency_tolerance * self.latency_ewma
+            if failed or slow:
+                # Only shrink once per round trip, all calls of that round saw the same congestion
+                if now - self._last_decrease > (self.latency_ewma or latency):
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.debug(f"Congestion (status {call.status_code}, {latency:.1f}s): limit {self.limit:.1f}")
+                self.n_throttled += call.status_code in THROTTLING_STATUS_CODES
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if not failed:
+                self.latency_ewma = (
+                    latency
+                    if self.latency_ewma is None
+                    else self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.latency_ewma
+                )
+            self._condition.notify_all()
+
+
+GLOBAL_CONCURRENCY_LIMITER = AdaptiveConcurrencyLimiter()
+"""Shared by all models of a process. Disabled until a run script calls `configure`."""
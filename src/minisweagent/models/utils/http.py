@@ -0,0 +1,168 @@
+"""Keep-alive HTTP sessions that are shared by all models (and threads) that talk to the same API base.
+
+Without a session, every request pays for a DNS lookup, a TCP connect and a TLS handshake.
+"""
+
+import asyncio
+import threading
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from minisweagent.utils.log import logger
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def _to_requests_response(httpx_response, url: str) -> requests.Response:
+    """Convert, so that callers see the same response types as with requests"""
+    response = requests.Response()
+    response.status_code = httpx_response.status_code
+    response.reason = httpx_response.reason_phrase
+    response.headers = CaseInsensitiveDict(httpx_response.headers)
+    response.url = url
+    response._content = httpx_response.content
+    return response
+
+
+class _HTTP2Session:
+    """Minimal `requests.Session` look-alike on top of an HTTP/2 capable httpx client, so that
+    all requests to an API base are multiplexed over a single connection.
+    """
+
+    def __init__(self, pool_size: int):
+        if httpx is None:
+            raise ImportError(
+                "HTTP/2 requires httpx with HTTP/2 support. Please install it with: pip install 'mini-swe-agent[http2]'"
+            )
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._client = httpx.Client(http2=True, limits=limits)
+
+    def post(self, url: str, *, headers: dict, data: str, timeout: float) -> requests.Response:
+        try:
+            httpx_response = self._client.post(url, headers=headers, content=data, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+        return _to_requests_response(httpx_response, url)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class SessionPool:
+    def __init__(self, pool_size: int = 10):
+        """One keep-alive session per API base.
+
+        Args:
+            pool_size: Maximum number of idle connections that are kept open per API base.
+                Should be at least the number of workers that query the same endpoint.
+        """
+        self.pool_size = pool_size
+        self._sessions: dict[tuple[str, bool], Any] = {}
+        self._n_requests: dict[tuple[str, bool], int] = {}
+        """Sync and async requests per API base and protocol"""
+        self._async_clients: dict[tuple[str, bool, asyncio.AbstractEventLoop], Any] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size: int) -> None:
+        """Set the pool size for sessions that are created from now on."""
+        self.pool_size = max(pool_size, 1)
+
+    def _get_session(self, api_base: str, http2: bool):
+        key = (api_base, http2)
+        with self._lock:
+            if key not in self._sessions:
+                if http2:
+                    self._sessions[key] = _HTTP2Session(self.pool_size)
+                else:
+                    session = requests.Session()
+                    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                    self._sessions[key] = session
+            self._n_requests[key] = self._n_requests.get(key, 0) + 1
+            return self._sessions[key]
+
+    def post(self, api_base: str, url: str, *, http2: bool = False, **kwargs) -> requests.Response:
+        """POST `url` using the session of `api_base`."""
+        return self._get_session(api_base, http2).post(url, **kwargs)
+
+    async def apost(
+        self, api_base: str, url: str, *, http2: bool = False, headers: dict, data: str, timeout: float
+    ) -> requests.Response:
+        """Like `post`, but with an async httpx client per API base and event loop.
+        Without httpx, the request is sent with the sync session in a worker thread.
+        Clients can only be used in the loop that created them, see `aclose`.
+        """
+        if httpx is None:
+            return await asyncio.to_thread(
+                self.post, api_base, url, http2=http2, headers=headers, data=data, timeout=timeout
+            )
+        key = (api_base, http2, asyncio.get_running_loop())
+        with self._lock:
+            if key not in self._async_clients:
+                # Clients of loops that were closed without `aclose` cannot be used (or closed) anymore
+                for stale_key in [k for k in self._async_clients if k[2].is_closed()]:
+                    del self._async_clients[stale_key]
+                limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                self._async_clients[key] = httpx.AsyncClient(http2=http2, limits=limits)
+            client = self._async_clients[key]
+            self._n_requests[(api_base, http2)] = self._n_requests.get((api_base, http2), 0) + 1
+        try:
+            httpx_response = await client.post(url, headers=headers, content=data, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+        return _to_requests_response(httpx_response, url)
+
+    async def aclose(self) -> None:
+        """Close the async clients of the running event loop. Call this before the loop is closed."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = [self._async_clients.pop(key) for key in list(self._async_clients) if key[2] is loop]
+        for client in clients:
+            await client.aclose()
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        """Number of (sync and async) requests and of opened connections per API base.
+        Connections are only counted for HTTP/1.1 sessions of sync requests (None if there are none).
+        """
+        stats = {}
+        with self._lock:
+            for (api_base, http2), n_requests in self._n_requests.items():
+                entry = stats.setdefault(api_base, {"requests": 0, "connections": None})
+                entry["requests"] += n_requests
+                if not http2 and (session := self._sessions.get((api_base, http2))) is not None:
+                    entry["connections"] = sum(
+                        adapter.poolmanager.pools[pool_key].num_connections
+                        for adapter in session.adapters.values()
+                        for pool_key in adapter.poolmanager.pools.keys()
+                    )
+        return stats
+
+    def log_stats(self) -> None:
+        """Log the stats at the end of a run, e.g., to check that connections are reused.
+        With the process executor, every worker process has its own pool whose stats are not included.
+        """
+        for api_base, stats in self.get_stats().items():
+            connections = "" if stats["connections"] is None else f" over {stats['connections']} connection(s)"
+            logger.info(f"HTTP session {api_base}: {stats['requests']} request(s){connections}")
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._n_requests.clear()
+            self._async_clients.clear()
+
+
+GLOBAL_SESSION_POOL = SessionPool()
+"""Shared by all models of a process."""
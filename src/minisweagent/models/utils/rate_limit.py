@@ -0,0 +1,93 @@
+"""Process-wide request (RPM) and token (TPM) limits per endpoint and API key.
+
+Callers are blocked just long enough to stay under the limits, instead of running into rate limit
+errors and exponential backoff. Token counts are estimated before a request and corrected with the
+usage reported in the response.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """Bucket that holds up to `per_minute` tokens and refills at `per_minute / 60` tokens per second."""
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens (the balance may become negative) and return how long the caller has to
+        wait until they are covered. Later callers queue up behind the debt.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Give back tokens (or take more if `amount` is negative), e.g., after the actual usage is known."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    def __init__(self, *, rpm: float | None = None, tpm: float | None = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """Reserve a request with `estimated_tokens` tokens and return how long to wait before sending it."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        return wait
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """Block until a request with `estimated_tokens` tokens may be sent. Returns the time waited."""
+        wait = self.reserve(estimated_tokens)
+        time.sleep(wait)
+        return wait
+
+    async def aacquire(self, estimated_tokens: int) -> float:
+        wait = self.reserve(estimated_tokens)
+        await asyncio.sleep(wait)
+        return wait
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Rough token count of a prompt (about four bytes of UTF-8 per token)."""
+    return len(json.dumps(messages, ensure_ascii=False).encode()) // 4 + 1
+
+
+_RATE_LIMITERS: dict[tuple[str, str], RateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(
+    api_base: str, api_key_env: str, *, rpm: float | None = None, tpm: float | None = None
+) -> RateLimiter:
+    """Limiter shared by all models that use the same endpoint and API key.
+    The limits of the first model that asks for a limiter are used.
+    """
+    key = (api_base.rstrip("/"), api_key_env)
+    with _RATE_LIMITERS_LOCK:
+        if key not in _RATE_LIMITERS:
+            _RATE_LIMITERS[key] = RateLimiter(rpm=rpm, tpm=tpm)
+        return _RATE_LIMITERS[key]
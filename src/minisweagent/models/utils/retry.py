@@ -0,0 +1,251 @@
+"""Retry policy shared by all model classes.
+
+Errors are classified by their HTTP status code (or, if there is none, their type): rate limits, server
+errors, timeouts and connection errors are retried, client errors are not. Waits grow exponentially with
+jitter, but never undercut the `Retry-After` header of the response. If an endpoint keeps failing, its
+circuit breaker opens and all callers pause until the endpoint has recovered, instead of burning through
+their retries and failing whole instances. Callers that have alternatives (e.g., the router model) can
+set a `RetryPolicy` on a model to fail fast instead.
+"""
+
+import asyncio
+import email.utils
+import functools
+import inspect
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import requests
+from tenacity import before_sleep_log, retry, retry_if_exception
+
+from minisweagent.models.utils.cancel import CallCancelled, raise_if_cancelled
+from minisweagent.utils.log import logger
+
+RETRYABLE_STATUS_CODES = (408, 409, 425, 429, 500, 502, 503, 504, 529)
+TRANSIENT_EXCEPTIONS = (requests.RequestException, TimeoutError, ConnectionError)
+
+
+def _iter_causes(exc: BaseException | None):
+    while exc is not None:
+        yield exc
+        exc = exc.__cause__
+
+
+def get_status_code(exc: BaseException) -> int | None:
+    """HTTP status code of the failed request, looking through the chain of `raise ... from` causes."""
+    for cause in _iter_causes(exc):
+        status_code = getattr(cause, "status_code", None)
+        if status_code is None and (response := getattr(cause, "response", None)) is not None:
+            status_code = getattr(response, "status_code", None)
+        if isinstance(status_code, int):
+            return status_code
+    return None
+
+
+def get_retry_after(exc: BaseException) -> float | None:
+    """Seconds to wait according to the `Retry-After` header (delay in seconds or HTTP date)."""
+    for cause in _iter_causes(exc):
+        headers = getattr(getattr(cause, "response", None), "headers", None) or getattr(cause, "headers", None)
+        if not headers or not (value := headers.get("retry-after") or headers.get("Retry-After")):
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of waiting for an open circuit breaker (see `RetryPolicy.fail_fast`)."""
+
+
+@dataclass
+class RetryPolicy:
+    """Overrides the retry policy of `retry_model_call` for a single model instance,
+    if set as its `retry_policy` attribute.
+    """
+
+    max_attempts: int | None = None
+    fail_fast: bool = False
+    """Raise `CircuitOpenError` instead of waiting while the circuit breaker of the endpoint is open"""
+
+
+def is_retryable(exc: BaseException, non_retryable: tuple[type[BaseException], ...] = ()) -> bool:
+    if not isinstance(exc, Exception) or isinstance(exc, (CircuitOpenError, CallCancelled, *non_retryable)):
+        return False
+    if (status_code := get_status_code(exc)) is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    if any(isinstance(cause, TRANSIENT_EXCEPTIONS) for cause in _iter_causes(exc)):
+        return True
+    return not isinstance(exc, (TypeError, ValueError))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, max_reset_timeout: float = 300.0):
+        """Opens after `failure_threshold` consecutive retryable failures. While open, callers wait.
+        Afterwards, a single call probes the endpoint: success closes the circuit, failure opens it again
+        for twice as long (up to `max_reset_timeout`).
+        """
+        self.failure_threshold = failure_threshold
+        self.initial_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.n_failures = 0
+        self.n_opened = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._condition = threading.Condition()
+
+    @property
+    def is_open(self) -> bool:
+        return self.open_until > time.monotonic()
+
+    def _try_enter(self) -> float | None:
+        """Returns None if a call may be made, else how long to wait (0 while a probe is in flight)."""
+        remaining = self.open_until - time.monotonic()
+        if remaining <= 0 and not self._probing:
+            # The first call after the circuit was opened probes the endpoint
+            self._probing = self.n_failures >= self.failure_threshold
+            return None
+        return max(remaining, 0.0)
+
+    def try_enter(self) -> bool:
+        """Like `wait`, but returns False instead of waiting."""
+        with self._condition:
+            return self._try_enter() is None
+
+    def wait(self) -> float:
+        """Block until a call may be made. Returns the time waited."""
+        start = time.monotonic()
+        with self._condition:
+            while (remaining := self._try_enter()) is not None:
+                self._condition.wait(remaining or None)
+        return time.monotonic() - start
+
+    async def await_closed(self) -> float:
+        """Like `wait`, but without blocking the event loop."""
+        start = time.monotonic()
+        while True:
+            with self._condition:
+                remaining = self._try_enter()
+            if remaining is None:
+                return time.monotonic() - start
+            await asyncio.sleep(min(remaining, 1.0) or 0.05)
+
+    def record(self, *, failed: bool, name: str = "") -> None:
+        with self._condition:
+            if not failed:
+                self.n_failures = 0
+                self.reset_timeout = self.initial_reset_timeout
+            else:
+                self.n_failures += 1
+                if self._probing or self.n_failures == self.failure_threshold:
+                    self.open_until = time.monotonic() + self.reset_timeout
+                    self.n_opened += 1
+                    logger.warning(
+                        f"Circuit breaker {name} opened for {self.reset_timeout:.0f}s after {self.n_failures} failures"
+                    )
+                    self.reset_timeout = min(self.max_reset_timeout, 2 * self.reset_timeout)
+            self._probing = False
+            self._condition.notify_all()
+
+
+_CIRCUIT_BREAKERS: dict[str, CircuitBreaker] = {}
+_CIRCUIT_BREAKERS_LOCK = threading.Lock()
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """Circuit breaker shared by all models (and threads) that talk to `endpoint`."""
+    with _CIRCUIT_BREAKERS_LOCK:
+        if endpoint not in _CIRCUIT_BREAKERS:
+            _CIRCUIT_BREAKERS[endpoint] = CircuitBreaker()
+        return _CIRCUIT_BREAKERS[endpoint]
+
+
+def retry_model_call(
+    get_endpoint: Callable[[Any], str],
+    *,
+    non_retryable: tuple[type[BaseException], ...] = (),
+    max_attempts: int = 10,
+    min_wait: float = 2.0,
+    max_wait: float = 60.0,
+    max_retry_after: float = 300.0,
+    log: logging.Logger = logger,
+):
+    """Decorator for the `_query` (or async `_aquery`) method of a model.
+
+    Args:
+        get_endpoint: Returns the endpoint (e.g., API base) of the model instance for the circuit breaker
+        non_retryable: Exception types that are never retried (in addition to client errors)
+        max_attempts: Maximum number of attempts (unless overridden by the `RetryPolicy` of the instance)
+        min_wait: Wait after the first failure. Doubles with every attempt (with jitter) up to `max_wait`.
+        max_retry_after: Upper bound for waits requested by the `Retry-After` header
+    """
+
+    def wait(retry_state) -> float:
+        backoff = min(max_wait, min_wait * 2 ** (retry_state.attempt_number - 1))
+        backoff = random.uniform(backoff / 2, backoff)
+        retry_after = get_retry_after(retry_state.outcome.exception())
+        return backoff if retry_after is None else max(backoff, min(retry_after, max_retry_after))
+
+    def stop(retry_state) -> bool:
+        policy = getattr(retry_state.args[0], "retry_policy", None)
+        return retry_state.attempt_number >= (policy and policy.max_attempts or max_attempts)
+
+    def enter(instance, breaker: CircuitBreaker, endpoint: str) -> bool:
+        """Returns False if the caller has to wait for the circuit breaker."""
+        if breaker.try_enter():
+            return True
+        if (policy := getattr(instance, "retry_policy", None)) is not None and policy.fail_fast:
+            raise CircuitOpenError(f"Circuit breaker {endpoint} is open")
+        return False
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def async_attempt(self, *args, **kwargs):
+            raise_if_cancelled()
+            endpoint = get_endpoint(self)
+            breaker = get_circuit_breaker(endpoint)
+            if not enter(self, breaker, endpoint):
+                await breaker.await_closed()
+            try:
+                result = await func(self, *args, **kwargs)
+            except BaseException as e:
+                breaker.record(failed=is_retryable(e, non_retryable), name=endpoint)
+                raise
+            breaker.record(failed=False, name=endpoint)
+            return result
+
+        @functools.wraps(func)
+        def attempt(self, *args, **kwargs):
+            raise_if_cancelled()
+            endpoint = get_endpoint(self)
+            breaker = get_circuit_breaker(endpoint)
+            if not enter(self, breaker, endpoint):
+                breaker.wait()
+            try:
+                result = func(self, *args, **kwargs)
+            except BaseException as e:
+                breaker.record(failed=is_retryable(e, non_retryable), name=endpoint)
+                raise
+            breaker.record(failed=False, name=endpoint)
+            return result
+
+        return retry(
+            stop=stop,
+            wait=wait,
+            retry=retry_if_exception(lambda e: is_retryable(e, non_retryable)),
+            before_sleep=before_sleep_log(log, logging.WARNING),
+            reraise=True,
+        )(async_attempt if inspect.iscoroutinefunction(func) else attempt)
+
+    return decorator
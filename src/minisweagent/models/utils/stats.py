@@ -0,0 +1,172 @@
+"""Process-wide accounting of model calls: counts, cost, tokens and latency, in total and per model.
+
+Every thread writes to its own shard, so recording a call never contends for a lock.
+Reads sum up all shards.
+"""
+
+import bisect
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+
+LATENCY_BUCKETS = [0.05 * 1.2**i for i in range(60)]
+"""Upper bounds (seconds) of the latency histogram buckets, from 50 ms to about 40 min"""
+
+
+def parse_usage(usage: Any) -> tuple[int, int, int]:
+    """Prompt, completion and cached prompt tokens of an OpenAI-compatible `usage` field (dict or object)."""
+    if usage is None:
+        return 0, 0, 0
+
+    def get(obj: Any, key: str) -> Any:
+        return obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+
+    cached = get(get(usage, "prompt_tokens_details") or {}, "cached_tokens") or get(usage, "prompt_cache_hit_tokens")
+    return get(usage, "prompt_tokens") or 0, get(usage, "completion_tokens") or 0, cached or 0
+
+
+@dataclass
+class ModelCounters:
+    n_calls: int = 0
+    cost: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency_counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def add(self, cost: float = 0.0, usage: Any = None, latency: float | None = None) -> None:
+        prompt_tokens, completion_tokens, cached_tokens = parse_usage(usage)
+        self.n_calls += 1
+        self.cost += cost
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        if latency is not None:
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def merge(self, other: "ModelCounters", sign: int = 1) -> None:
+        self.n_calls += sign * other.n_calls
+        self.cost += sign * other.cost
+        self.prompt_tokens += sign * other.prompt_tokens
+        self.completion_tokens += sign * other.completion_tokens
+        self.cached_tokens += sign * other.cached_tokens
+        for i, count in enumerate(other.latency_counts):
+            self.latency_counts[i] += sign * count
+
+    @property
+    def cache_hit_rate(self) -> float | None:
+        """Share of prompt tokens that were served from the provider's prefix cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else None
+
+    def get_latency_percentile(self, percentile: float) -> float | None:
+        """Upper bound of the histogram bucket that contains the percentile."""
+        total = sum(self.latency_counts)
+        if not total:
+            return None
+        rank, cumulative = total * percentile / 100, 0
+        for i, count in enumerate(self.latency_counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return LATENCY_BUCKETS[min(i, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+    def as_dict(self) -> dict:
+        return {
+            "n_calls": self.n_calls,
+            "cost": self.cost,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hit_rate": self.cache_hit_rate,
+            "latency_p50": self.get_latency_percentile(50),
+            "latency_p95": self.get_latency_percentile(95),
+        }
+
+
+def subtract_counters(
+    current: dict[str, ModelCounters], previous: dict[str, ModelCounters]
+) -> dict[str, ModelCounters]:
+    """Counters of the calls that were made since `previous` was taken (models without new calls are left out)."""
+    delta = {}
+    for model_name, counters in current.items():
+        model_delta = ModelCounters()
+        model_delta.merge(counters)
+        if model_name in previous:
+            model_delta.merge(previous[model_name], sign=-1)
+        if model_delta.n_calls:
+            delta[model_name] = model_delta
+    return delta
+
+
+class GlobalModelStats:
+    """Tracks all model calls of a process."""
+
+    def __init__(self):
+        self._shards: dict[int, dict[str, ModelCounters]] = {}
+        self._lock = threading.Lock()
+
+    def _get_shard(self) -> dict[str, ModelCounters]:
+        ident = threading.get_ident()
+        if (shard := self._shards.get(ident)) is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, {})
+        return shard
+
+    def add(
+        self,
+        cost: float = 0.0,
+        *,
+        model_name: str = "unknown",
+        usage: Any = None,
+        latency: float | None = None,
+    ) -> None:
+        """Record one model call.
+
+        Args:
+            cost: Cost of the call
+            model_name: Calls are also broken down by model
+            usage: `usage` field of an OpenAI-compatible response (dict or object)
+            latency: Duration of the call in seconds
+        """
+        self._get_shard().setdefault(model_name, ModelCounters()).add(cost, usage, latency)
+
+    def merge(self, counters_by_model: dict[str, ModelCounters]) -> None:
+        """Add the counters of calls that were made elsewhere (e.g., in a worker process)."""
+        shard = self._get_shard()
+        for model_name, counters in counters_by_model.items():
+            shard.setdefault(model_name, ModelCounters()).merge(counters)
+
+    def get_counters(self) -> dict[str, ModelCounters]:
+        """Counters per model, summed over all threads."""
+        with self._lock:
+            shards = list(self._shards.values())
+        result: dict[str, ModelCounters] = {}
+        for shard in shards:
+            for model_name, counters in list(shard.items()):
+                result.setdefault(model_name, ModelCounters()).merge(counters)
+        return result
+
+    def get_total(self) -> ModelCounters:
+        total = ModelCounters()
+        for counters in self.get_counters().values():
+            total.merge(counters)
+        return total
+
+    def get_summary(self) -> dict:
+        counters = self.get_counters()
+        total = ModelCounters()
+        for model_counters in counters.values():
+            total.merge(model_counters)
+        return total.as_dict() | {"models": {name: c.as_dict() for name, c in counters.items()}}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shards = {}
+
+    @property
+    def n_calls(self) -> int:
+        return self.get_total().n_calls
+
+    @property
+    def cost(self) -> float:
+        return self.get_total().cost
@@ -1,12 +1,15 @@
 """HarmoCheck - Fix code quality issues in any directory."""
 
+import collections
 import concurrent.futures
 import json
 import logging
+import math
 import shutil
 import stat
 import time
 import traceback
+from collections.abc import Callable
 from pathlib import Path
 
 import typer
@@ -17,11 +20,20 @@ from minisweagent.agents.default import DefaultAgent
 from minisweagent.config import builtin_config_dir, get_config_path
 from minisweagent.environments.local import LocalEnvironment
 from minisweagent.models import get_model
+from minisweagent.models.utils.concurrency import GLOBAL_CONCURRENCY_LIMITER
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
 from minisweagent.run.extra.openharmony_single import (
     convert_xlsx_to_json,
     format_openharmony_issue,
+    get_issue_files,
+    group_openharmony_instances,
 )
 from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.executor import EXECUTORS, get_executor
+from minisweagent.run.extra.utils.incremental import get_file_hashes, select_changed_defects
+from minisweagent.run.extra.utils.journal import RunJournal, get_issue_key
+from minisweagent.run.extra.utils.scheduler import cancel_after, get_file_key, get_scheduler, shard_by_file
+from minisweagent.run.extra.utils.workspace import MAX_MERGE_ATTEMPTS, MergeConflict, WorkspacePool
 from minisweagent.run.utils.save import save_traj
 from minisweagent.utils.log import logger
 
@@ -164,21 +176,32 @@ def process_issue(
     progress_manager: RunBatchProgressManager,
     working_path: Path,
     traj_subdir: Path,
+    workspaces: WorkspacePool | None = None,
+    journal: RunJournal | None = None,
+    requeue: Callable[[dict], bool] | None = None,
 ) -> None:
-    """Process a single issue."""
+    """Process a single issue.
+    
+    If `workspaces` is given, the agent works in an isolated workspace and its edits are merged
+    back into `working_path` afterwards (the applied patch is saved next to the trajectory).
+    If the edits conflict with those of another worker, the issue is handed to `requeue`, which
+    returns False if it cannot be run again (the conflict is then recorded as the exit status).
+    Start and end of the issue are recorded in the `journal` so that the run can be resumed.
+    """
     instance_id = instance["instance_id"]
     
     progress_manager.on_instance_start(instance_id)
     progress_manager.update_instance_status(instance_id, "Starting...")
+    if journal is not None:
+        journal.on_instance_start(instance)
     
     agent = None
     extra_info = None
+    requeued = False
+    env_config = config.get("environment", {})
     
-    try:
-        # Use local environment with working directory as cwd
-        env_config = config.get("environment", {}).copy()
-        env_config["cwd"] = str(working_path)
-        env = LocalEnvironment(**env_config)
+    def run_agent(env: LocalEnvironment) -> tuple[str, str]:
+        nonlocal agent
         
         # Use model from config (which may have been overridden by env var)
         model_config = config.get("model", {}).copy()
@@ -192,26 +215,84 @@ def process_issue(
         )
         
         task = format_openharmony_issue(instance)
-        exit_status, result = agent.run(task)  # type: ignore[arg-type]
+        return agent.run(task)  # type: ignore[arg-type]
+    
+    try:
+        if workspaces is None:
+            # Use local environment with working directory as cwd
+            exit_status, result = run_agent(LocalEnvironment(**env_config | {"cwd": str(working_path)}))
+        else:
+            (exit_status, result), patch = workspaces.run(
+                lambda workspace: run_agent(workspace.get_environment(**env_config)),
+                private_files=get_issue_files(instance),
+            )
+            traj_subdir.mkdir(parents=True, exist_ok=True)
+            (traj_subdir / f"{instance_id}.patch").write_text(patch)
+    except MergeConflict as e:
+        if requeue is not None and requeue(instance):
+            logger.warning(f"{e}. Requeued issue {instance_id} behind the others")
+            requeued = True
+        else:
+            logger.error(f"Error processing issue {instance_id}: {e}")
+            exit_status, result = type(e).__name__, str(e)
     except Exception as e:
         logger.error(f"Error processing issue {instance_id}: {e}", exc_info=True)
         exit_status, result = type(e).__name__, str(e)
         extra_info = {"traceback": traceback.format_exc()}
     finally:
-        # Save trajectory to ~/.local/share/harmocheck/trajectories/{subdir}/
-        traj_dir = traj_subdir
-        traj_dir.mkdir(parents=True, exist_ok=True)
-        traj_path = traj_dir / f"{instance_id}.traj.json"
-        save_traj(
-            agent,
-            traj_path,
-            exit_status=exit_status,
-            result=result,
-            extra_info=extra_info,
-            instance_id=instance_id,
-            print_path=False,
-        )
-        progress_manager.on_instance_end(instance_id, exit_status)
+        if requeued:
+            # Recorded when the issue is run again
+            progress_manager.on_instance_requeued(instance_id)
+        else:
+            # Save trajectory to ~/.local/share/harmocheck/trajectories/{subdir}/
+            traj_dir = traj_subdir
+            traj_dir.mkdir(parents=True, exist_ok=True)
+            traj_path = traj_dir / f"{instance_id}.traj.json"
+            save_traj(
+                agent,
+                traj_path,
+                exit_status=exit_status,
+                result=result,
+                extra_info=extra_info,
+                instance_id=instance_id,
+                issue_rules=[issue["rule_id"] for issue in instance.get("issues", [instance])],
+                print_path=False,
+            )
+            if journal is not None:
+                journal.on_instance_end(instance, exit_status, file_hashes=get_file_hashes(working_path, instance))
+            progress_manager.on_instance_end(instance_id, exit_status)
+
+
+def process_shard(
+    shard: list[dict],
+    config: dict,
+    progress_manager: RunBatchProgressManager,
+    working_path: Path,
+    traj_subdir: Path,
+    workspaces: WorkspacePool | None = None,
+    journal: RunJournal | None = None,
+    deadline: float = math.inf,
+    requeue: Callable[[dict], bool] | None = None,
+) -> None:
+    """Process all issues of one file sequentially, so that no two workers edit the same file.
+    No new issue is started after the `deadline` (a `time.time()` timestamp).
+    Issues whose edits conflict with those of other workers are handed to `requeue` (see `process_issue`).
+    Afterwards, the final content hashes of the file are recorded in the `journal` (see `--since`).
+    """
+    for i_instance, instance in enumerate(shard):
+        if time.time() >= deadline:
+            logger.warning(f"Time limit reached, skipping {len(shard) - i_instance} issue(s) of {get_file_key(instance)}")
+            break
+        try:
+            process_issue(instance, config, progress_manager, working_path, traj_subdir, workspaces, journal, requeue)
+        except Exception as e:
+            logger.error(f"Error in worker for instance {instance['instance_id']}: {e}", exc_info=True)
+            progress_manager.on_uncaught_exception(instance["instance_id"], e)
+    if journal is not None:
+        file_hashes = {}
+        for instance in shard:
+            file_hashes |= get_file_hashes(working_path, instance)
+        journal.write_snapshot(file_hashes)
 
 
 # fmt: off
@@ -225,6 +306,15 @@ def main(
     exit_immediately: bool = typer.Option(False, "--exit-immediately", help="Exit immediately when the agent wants to finish", rich_help_panel="Basic"),
     issue_index: int | None = typer.Option(None, "--issue", help="Fix only a specific issue by index (0-based). If not specified, fixes all issues.", rich_help_panel="Data selection"),
     workers: int = typer.Option(1, "-w", "--workers", help="Number of worker threads for parallel processing", rich_help_panel="Basic"),
+    group_by: str = typer.Option("none", "--group-by", help="Fix several issues in one agent run: 'none', 'file' (all issues of a file) or 'rule' (all issues of a rule in a file)", rich_help_panel="Advanced"),
+    workspace: str = typer.Option("shared", "--workspace", help="'shared' (all workers edit the input directory) or 'isolated' (every worker edits its own copy, edits are merged back)", rich_help_panel="Advanced"),
+    scheduler: str = typer.Option("fifo", "--scheduler", help="Order in which issues are processed: 'fifo' (defects file order), 'priority' (most severe and cheapest first) or an import path", rich_help_panel="Advanced"),
+    history: list[Path] = typer.Option([], "--history", help="Trajectory directories of previous runs used to estimate the cost of each rule (for --scheduler priority)", rich_help_panel="Advanced"),
+    time_limit: float | None = typer.Option(None, "--time-limit", help="Do not start new issues after this many seconds", rich_help_panel="Advanced"),
+    resume: Path | None = typer.Option(None, "--resume", help="Resume an interrupted run from its trajectory directory. Completed issues are skipped, interrupted and failed ones are re-run.", rich_help_panel="Data selection"),
+    since: Path | None = typer.Option(None, "--since", help="Trajectory directory of a previous run on an older defects file. Only new defects, defects that were not fixed and defects whose file changed since the fix are processed.", rich_help_panel="Data selection"),
+    adaptive_concurrency: bool = typer.Option(False, "--adaptive-concurrency", help="Adapt the number of concurrent model calls (up to the number of workers) to rate limits and latency of the endpoint (openai_compatible models). Thread executor only", rich_help_panel="Advanced"),
+    executor_type: str = typer.Option("thread", "--executor", help="Run workers as 'thread's or as 'process'es (scales beyond the GIL with many workers)", rich_help_panel="Advanced"),
 ) -> None:
     # fmt: on
     """Fix code quality issues in a directory.
@@ -245,6 +335,26 @@ def main(
         logger.error(f"Input path is not a directory: {input_dir}")
         return
     
+    if workspace not in ("shared", "isolated"):
+        logger.error(f"Unknown workspace mode: {workspace}. Supported: shared, isolated")
+        return
+    
+    if executor_type not in EXECUTORS:
+        logger.error(f"Unknown executor: {executor_type}. Supported: {', '.join(EXECUTORS)}")
+        return
+    
+    if executor_type == "process" and workspace == "isolated":
+        logger.error("Isolated workspaces can only be used with the thread executor")
+        return
+    
+    if group_by not in ("none", "file", "rule"):
+        logger.error(f"Unknown grouping: {group_by}. Supported: none, file, rule")
+        return
+    
+    if executor_type == "process" and adaptive_concurrency:
+        logger.error("Adaptive concurrency only works with the thread executor (processes do not share the limit)")
+        return
+    
     logger.info(f"Loading issues from {defects_file}...")
     try:
         issues = load_issues_from_file(defects_file)
@@ -273,17 +383,31 @@ def main(
         issues = [issues[issue_index]]
         logger.info(f"Processing only issue at index {issue_index}")
     
-    # Backup source directory
-    backup_path = backup_source_directory(input_dir, project_name)
-    logger.info(f"Source directory backed up to: {backup_path}")
+    if resume is not None:
+        # Continue in the trajectory directory of the interrupted run, its backup is still valid
+        traj_subdir = resume.resolve()
+        journal = RunJournal(traj_subdir / "journal.jsonl")
+        if not (header := journal.get_header()):
+            logger.error(f"No run journal found in {traj_subdir}")
+            return
+        if header["input_dir"] != str(input_dir):
+            logger.warning(f"Resumed run was started on {header['input_dir']}, not on {input_dir}")
+        backup_path = Path(header["backup_path"])
+        logger.info(f"Resuming run from: {traj_subdir}")
+    else:
+        # Backup source directory
+        backup_path = backup_source_directory(input_dir, project_name)
+        logger.info(f"Source directory backed up to: {backup_path}")
+        
+        # Create trajectory subdirectory with timestamp
+        from platformdirs import user_data_dir
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        traj_subdir_name = f"harmocheck__{project_name}_{timestamp}"
+        traj_base = Path(user_data_dir("harmocheck", appauthor=False))
+        traj_subdir = traj_base / "trajectories" / traj_subdir_name
+        journal = RunJournal(traj_subdir / "journal.jsonl")
+        journal.write_header(input_dir=str(input_dir), defects_file=str(defects_file), backup_path=str(backup_path))
     logger.info(f"Working directory (will be modified in place): {input_dir}")
-    
-    # Create trajectory subdirectory with timestamp
-    from platformdirs import user_data_dir
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    traj_subdir_name = f"harmocheck__{project_name}_{timestamp}"
-    traj_base = Path(user_data_dir("harmocheck", appauthor=False))
-    traj_subdir = traj_base / "trajectories" / traj_subdir_name
     logger.info(f"Trajectories will be saved to: {traj_subdir}")
     
     # Load config
@@ -324,9 +448,6 @@ def main(
     agent_config.pop("mode", None)
     config["agent"] = agent_config
     
-    # Reduce logging verbosity - only show errors and warnings
-    logging.getLogger("minisweagent").setLevel(logging.WARNING)
-    
     # Create instances from issues
     instances = []
     for list_index, issue in enumerate(issues):
@@ -341,31 +462,100 @@ def main(
             str(input_dir),
         )
         instances.append(instance)
+    if resume is None:
+        (traj_subdir / "defects.json").write_text(json.dumps(instances, ensure_ascii=False, indent=2))
+    
+    completed, pending = journal.get_status()
+    if completed:
+        instances = [instance for instance in instances if get_issue_key(instance) not in completed]
+        logger.info(f"Skipping {len(completed)} completed issue(s), re-running {len(pending)} interrupted or failed issue(s)")
+    if since is not None:
+        since = since.resolve()
+        if not (since / "defects.json").exists():
+            logger.error(f"No defects snapshot found in {since}")
+            return
+        previous_instances = json.loads((since / "defects.json").read_text())
+        instances, report = select_changed_defects(
+            instances, previous_instances, RunJournal(since / "journal.jsonl"), input_dir
+        )
+        (traj_subdir / "incremental.json").write_text(json.dumps(report, indent=2))
+        logger.info(
+            f"Compared with {since}: "
+            + ", ".join(f"{len(instance_ids)} {category}" for category, instance_ids in report.items())
+        )
+    if not instances:
+        logger.info("All issues have been completed already")
+        return
+    
+    if group_by != "none":
+        n_issues = len(instances)
+        instances = group_openharmony_instances(instances, group_by)
+        logger.info(f"Grouped {n_issues} issue(s) into {len(instances)} agent run(s) by {group_by}")
+    
+    # Reduce logging verbosity - only show errors and warnings
+    logging.getLogger("minisweagent").setLevel(logging.WARNING)
     
     # Setup progress manager
     progress_manager = RunBatchProgressManager(len(instances), None)
     
     def process_futures(futures: dict[concurrent.futures.Future, str]):
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                future.result()
-            except concurrent.futures.CancelledError:
-                pass
-            except Exception as e:
-                instance_id = futures[future]
-                logger.error(f"Error in future for instance {instance_id}: {e}", exc_info=True)
-                progress_manager.on_uncaught_exception(instance_id, e)
-    
-    # Process instances
-    logger.info(f"Starting processing with {workers} worker(s)...")
+        # Requeued issues add futures while we wait, so we cannot use as_completed
+        processed = set()
+        while pending := [future for future in list(futures) if future not in processed]:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            processed |= done
+            for future in done:
+                try:
+                    future.result()
+                except concurrent.futures.CancelledError:
+                    pass
+                except Exception as e:
+                    instance_id = futures[future]
+                    logger.error(f"Error in future for instance {instance_id}: {e}", exc_info=True)
+                    progress_manager.on_uncaught_exception(instance_id, e)
+    
+    workspaces = WorkspacePool(input_dir) if workspace == "isolated" else None
+    
+    # Process instances: every file is owned by a single worker, files are spread across workers
+    instances = get_scheduler(scheduler, history=history).order(instances)
+    shards = shard_by_file(instances, largest_first=scheduler == "fifo")
+    logger.info(f"Starting processing of {len(shards)} file(s) with {workers} worker(s)...")
     with Live(progress_manager.render_group, refresh_per_second=4):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {
-                executor.submit(process_issue, instance, config, progress_manager, input_dir, traj_subdir): instance[
-                    "instance_id"
-                ]
-                for instance in instances
-            }
+        GLOBAL_SESSION_POOL.configure(pool_size=workers)
+        if adaptive_concurrency:
+            GLOBAL_CONCURRENCY_LIMITER.configure(max_limit=workers)
+        deadline = time.time() + time_limit if time_limit is not None else math.inf
+        with get_executor(executor_type, workers, progress_manager) as (executor, worker_progress_manager):
+            futures: dict[concurrent.futures.Future, str] = {}
+            merge_attempts = collections.Counter()
+            
+            def submit(shard: list[dict]) -> None:
+                future = executor.submit(
+                    process_shard,
+                    shard,
+                    config,
+                    worker_progress_manager,
+                    input_dir,
+                    traj_subdir,
+                    workspaces,
+                    journal,
+                    deadline,
+                    requeue if workspaces is not None else None,
+                )
+                futures[future] = shard[0]["instance_id"]
+            
+            def requeue(instance: dict) -> bool:
+                """Run an issue whose edits conflicted again after all issues that are queued so far."""
+                merge_attempts[instance["instance_id"]] += 1
+                if merge_attempts[instance["instance_id"]] >= MAX_MERGE_ATTEMPTS or time.time() >= deadline:
+                    return False
+                submit([instance])
+                return True
+            
+            for shard in shards:
+                submit(shard)
+            if time_limit is not None:
+                cancel_after(list(futures), time_limit)
             try:
                 process_futures(futures)
             except KeyboardInterrupt:
@@ -374,10 +564,13 @@ def main(
                     if not future.running() and not future.done():
                         future.cancel()
                 process_futures(futures)
+    if workspaces is not None:
+        workspaces.cleanup()
     
     logger.info("=" * 60)
     logger.info(f"Processing complete! Code has been modified in: {input_dir}")
     logger.info(f"Original code backed up to: {backup_path}")
+    GLOBAL_SESSION_POOL.log_stats()
     logger.info("=" * 60)
 
 
@@ -3,6 +3,11 @@
 """Run mini-SWE-agent on all OpenHarmony projects and issues."""
 
 import concurrent.futures
+import math
+import os
+import shutil
+import socket
+import threading
 import time
 import traceback
 from pathlib import Path
@@ -15,12 +20,17 @@ from minisweagent.agents.default import DefaultAgent
 from minisweagent.config import builtin_config_dir, get_config_path
 from minisweagent.environments.local import LocalEnvironment
 from minisweagent.models import get_model
+from minisweagent.models.utils.concurrency import GLOBAL_CONCURRENCY_LIMITER
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
 from minisweagent.run.extra.openharmony_single import (
     format_openharmony_issue,
     load_openharmony_dataset,
     prepare_working_directory,
 )
 from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.executor import get_executor
+from minisweagent.run.extra.utils.scheduler import cancel_after, get_scheduler
+from minisweagent.run.extra.utils.work_queue import WorkQueue
 from minisweagent.run.utils.save import save_traj
 from minisweagent.utils.log import logger
 
@@ -56,8 +66,8 @@ def process_instance(
     config: dict,
     progress_manager: RunBatchProgressManager,
     working_paths: dict[str, str],
-) -> None:
-    """Process a single OpenHarmony instance."""
+) -> tuple[str, str]:
+    """Process a single OpenHarmony instance. Returns exit status and result."""
     instance_id = instance["instance_id"]
     
     model = get_model(config=config.get("model", {}))
@@ -73,8 +83,7 @@ def process_instance(
         # Use local environment with project-specific working directory as cwd
         project_name = instance["project_name"]
         working_path = working_paths[project_name]
-        env_config = config.get("environment", {})
-        env_config["cwd"] = working_path
+        env_config = config.get("environment", {}) | {"cwd": working_path}
         env = LocalEnvironment(**env_config)
         
         agent = ProgressTrackingAgent(
@@ -103,9 +112,100 @@ def process_instance(
             result=result,
             extra_info=extra_info,
             instance_id=instance_id,
+            issue_rules=[issue["rule_id"] for issue in instance.get("issues", [instance])],
             print_path=False,
         )
         progress_manager.on_instance_end(instance_id, exit_status)
+    return exit_status, result
+
+
+def prepare_queue_working_directory(
+    instance: dict, work_queue: WorkQueue, base_output_dir: str = "dataset1/openharmony/test_result"
+) -> str:
+    """Working directory of a project that is shared by all queue workers of this host.
+
+    The directory is named after the queue and the host, so restarted workers continue on the same copy.
+    A file lock makes sure that worker processes starting at the same time copy the project only once.
+    """
+    import fcntl
+
+    path = Path(base_output_dir) / instance["project_name"] / f"queue_{work_queue.path.stem}_{socket.gethostname()}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f"{path.name}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not path.exists():
+            logger.info(f"Copying project from {instance['project_path']} to {path}...")
+            # Copy to a temporary directory first, so that an interrupted copy is never used
+            partial_path = path.with_name(f"{path.name}.partial")
+            shutil.rmtree(partial_path, ignore_errors=True)
+            shutil.copytree(instance["project_path"], partial_path)
+            partial_path.rename(path)
+    return str(path.absolute())
+
+
+def run_queue_worker(
+    work_queue: WorkQueue,
+    config: dict,
+    workers: int,
+    *,
+    time_limit: float | None = None,
+    adaptive_concurrency: bool = False,
+) -> None:
+    """Lease instances from `work_queue` with `workers` threads until it is drained.
+
+    Working directories are prepared on this host the first time an instance of a project is leased.
+    All workers of a host lease as one owner, so that the instances of a project are processed on a
+    single host (and all its fixes end up in one working directory), see `WorkQueue.lease`.
+    """
+    counts = work_queue.get_counts()
+    logger.info(f"Queue {work_queue.path}: {counts}")
+    progress_manager = RunBatchProgressManager(counts.get("pending", 0) + counts.get("leased", 0), None)
+    working_paths: dict[str, str] = {}
+    working_paths_lock = threading.Lock()
+    deadline = time.time() + time_limit if time_limit is not None else math.inf
+    host = socket.gethostname()
+    worker_prefix = f"{host}:{os.getpid()}"
+
+    def work(worker: str) -> None:
+        while time.time() < deadline and (instance := work_queue.lease(worker, owner=host)) is not None:
+            instance_id = instance["instance_id"]
+            try:
+                with working_paths_lock:
+                    if instance["project_name"] not in working_paths:
+                        working_paths[instance["project_name"]] = prepare_queue_working_directory(instance, work_queue)
+            except Exception as e:
+                logger.error(f"Error preparing the working directory of {instance_id}: {e}", exc_info=True)
+                work_queue.release(instance_id, worker)
+                continue
+            try:
+                with work_queue.keep_alive(instance_id, worker):
+                    exit_status, result = process_instance(instance, config, progress_manager, working_paths)
+            except Exception as e:
+                logger.error(f"Error processing instance {instance_id}: {e}", exc_info=True)
+                progress_manager.on_uncaught_exception(instance_id, e)
+                exit_status, result = type(e).__name__, str(e)
+            work_queue.complete(instance_id, worker, exit_status, result)
+
+    GLOBAL_SESSION_POOL.configure(pool_size=workers)
+    if adaptive_concurrency:
+        GLOBAL_CONCURRENCY_LIMITER.configure(max_limit=workers)
+    with Live(progress_manager.render_group, refresh_per_second=4):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(work, f"{worker_prefix}:{i}") for i in range(workers)]:
+                future.result()
+    logger.info(f"Queue {work_queue.path}: {work_queue.get_counts()}")
+    GLOBAL_SESSION_POOL.log_stats()
+
+
+def _load_config(config_spec: Path, model: str | None, model_class: str | None) -> dict:
+    config_path = get_config_path(config_spec)
+    logger.info(f"Loading agent config from '{config_path}'")
+    config = yaml.safe_load(config_path.read_text())
+    if model is not None:
+        config.setdefault("model", {})["model_name"] = model
+    if model_class is not None:
+        config.setdefault("model", {})["model_class"] = model_class
+    return config
 
 
 def discover_all_instances(subset: str, split: str) -> dict[str, list[dict]]:
@@ -140,7 +240,15 @@ def main(
     model: str | None = typer.Option(None, "-m", "--model", help="Model to use", rich_help_panel="Basic"),
     model_class: str | None = typer.Option(None, "--model-class", help="Model class to use", rich_help_panel="Advanced"),
     config_spec: Path = typer.Option(builtin_config_dir / "extra" / "openharmony.yaml", "-c", "--config", help="Path to a config file", rich_help_panel="Basic"),
+    scheduler: str = typer.Option("fifo", "--scheduler", help="Order in which instances are processed: 'fifo' (dataset order), 'priority' (most severe and cheapest first) or an import path", rich_help_panel="Advanced"),
+    history: list[Path] = typer.Option([], "--history", help="Trajectory directories of previous runs used to estimate the cost of each rule (for --scheduler priority)", rich_help_panel="Advanced"),
+    time_limit: float | None = typer.Option(None, "--time-limit", help="Do not start new instances after this many seconds", rich_help_panel="Advanced"),
     project_filter: str = typer.Option("", "--project", help="Filter by project name (e.g., 'vendor_telink')", rich_help_panel="Data selection"),
+    adaptive_concurrency: bool = typer.Option(False, "--adaptive-concurrency", help="Adapt the number of concurrent model calls (up to the number of workers) to rate limits and latency of the endpoint (openai_compatible models). Thread executor only", rich_help_panel="Advanced"),
+    executor_type: str = typer.Option("thread", "--executor", help="Run workers as 'thread's or as 'process'es (scales beyond the GIL with many workers). Queue mode only supports threads", rich_help_panel="Advanced"),
+    queue_path: Path | None = typer.Option(None, "--queue", help="SQLite work queue shared by several worker processes or hosts (enables queue mode)", rich_help_panel="Work queue"),
+    queue_role: str = typer.Option("both", "--queue-role", help="'producer' (enqueue instances and exit), 'worker' (process queued instances) or 'both'", rich_help_panel="Work queue"),
+    lease_seconds: float = typer.Option(600.0, "--lease", help="Seconds after which the instance of a worker without heartbeat is handed to another worker", rich_help_panel="Work queue"),
 ) -> None:
     # fmt: on
     """Run mini-SWE-agent on all OpenHarmony projects and issues.
@@ -148,6 +256,20 @@ def main(
     This command automatically discovers all projects in the dataset directory
     and processes all issues from each project.
     """
+    if queue_role not in ("producer", "worker", "both"):
+        logger.error(f"Unknown queue role: {queue_role}. Supported: producer, worker, both")
+        return
+    if queue_path is not None and executor_type != "thread":
+        logger.error("Queue mode runs the workers of a process as threads, start several workers to use more processes")
+        return
+    if executor_type == "process" and adaptive_concurrency:
+        logger.error("Adaptive concurrency only works with the thread executor (processes do not share the limit)")
+        return
+    work_queue = WorkQueue(queue_path, lease_seconds=lease_seconds) if queue_path is not None else None
+    queue_options = {"time_limit": time_limit, "adaptive_concurrency": adaptive_concurrency}
+    if work_queue is not None and queue_role == "worker":
+        run_queue_worker(work_queue, _load_config(config_spec, model, model_class), workers, **queue_options)
+        return
 
     # Discover all projects and instances
     logger.info(f"Discovering projects in {subset}/{split}...")
@@ -183,14 +305,14 @@ def main(
         return
 
     # Load config
-    config_path = get_config_path(config_spec)
-    logger.info(f"Loading agent config from '{config_path}'")
-    config = yaml.safe_load(config_path.read_text())
+    config = _load_config(config_spec, model, model_class)
     
-    if model is not None:
-        config.setdefault("model", {})["model_name"] = model
-    if model_class is not None:
-        config.setdefault("model", {})["model_class"] = model_class
+    all_instances = get_scheduler(scheduler, history=history).order(all_instances)
+    if work_queue is not None:
+        logger.info(f"Enqueued {work_queue.put(all_instances)} new instance(s) to {work_queue.path}")
+        if queue_role == "both":
+            run_queue_worker(work_queue, config, workers, **queue_options)
+        return
 
     # Prepare working directories for all projects
     # Each project gets its own working directory
@@ -222,13 +344,18 @@ def main(
     # Process instances
     logger.info(f"Starting processing with {workers} worker(s)...")
     with Live(progress_manager.render_group, refresh_per_second=4):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        GLOBAL_SESSION_POOL.configure(pool_size=workers)
+        if adaptive_concurrency:
+            GLOBAL_CONCURRENCY_LIMITER.configure(max_limit=workers)
+        with get_executor(executor_type, workers, progress_manager) as (executor, worker_progress_manager):
             futures = {
-                executor.submit(process_instance, instance, config, progress_manager, working_paths): instance[
+                executor.submit(process_instance, instance, config, worker_progress_manager, working_paths): instance[
                     "instance_id"
                 ]
                 for instance in all_instances
             }
+            if time_limit is not None:
+                cancel_after(list(futures), time_limit)
             try:
                 process_futures(futures)
             except KeyboardInterrupt:
@@ -241,6 +368,7 @@ def main(
     # Summary
     logger.info("=" * 60)
     logger.info("Processing complete!")
+    GLOBAL_SESSION_POOL.log_stats()
     logger.info("=" * 60)
 
 
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""Run mini-SWE-agent on OpenHarmony instances in batch mode, with all agents in a single event loop."""
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import time
+import traceback
+from pathlib import Path
+
+import typer
+import yaml
+from rich.live import Live
+
+from minisweagent.agents.async_default import AsyncDefaultAgent
+from minisweagent.config import builtin_config_dir, get_config_path
+from minisweagent.environments.local import LocalEnvironment
+from minisweagent.models import get_model
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
+from minisweagent.run.extra.openharmony_batch import filter_instances, remove_from_results_file, update_results_file
+from minisweagent.run.extra.openharmony_single import (
+    format_openharmony_issue,
+    group_openharmony_instances,
+    load_openharmony_dataset,
+    prepare_working_directory,
+)
+from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.scheduler import get_file_key, get_scheduler
+from minisweagent.run.utils.save import save_traj
+from minisweagent.utils.log import add_file_handler, logger
+
+_HELP_TEXT = """Run mini-SWE-agent on OpenHarmony instances in batch mode (asyncio).
+
+[not dim]
+All agents run as tasks of a single event loop instead of one thread per worker,
+so that hundreds of instances can be in flight at the same time.
+[/not dim]
+"""
+
+app = typer.Typer(rich_markup_mode="rich", add_completion=False)
+
+
+class AsyncProgressTrackingAgent(AsyncDefaultAgent):
+    """Simple wrapper around AsyncDefaultAgent that provides progress updates."""
+
+    def __init__(self, *args, progress_manager: RunBatchProgressManager, instance_id: str = "", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.progress_manager: RunBatchProgressManager = progress_manager
+        self.instance_id = instance_id
+
+    async def step(self) -> dict:
+        """Override step to provide progress updates."""
+        self.progress_manager.update_instance_status(self.instance_id, f"Step {self.model.n_calls + 1:3d}")
+        return await super().step()
+
+
+async def process_instance(
+    instance: dict,
+    output_dir: Path,
+    config: dict,
+    progress_manager: RunBatchProgressManager,
+    working_path: str,
+    semaphore: asyncio.Semaphore,
+    file_lock: asyncio.Lock,
+) -> None:
+    """Process a single OpenHarmony instance once a slot of the semaphore is free.
+    All agents edit the same working directory, so instances of the same file hold its `file_lock`.
+    """
+    async with file_lock, semaphore:
+        instance_id = instance["instance_id"]
+        remove_from_results_file(output_dir / "results.json", instance_id)
+        model = get_model(config=config.get("model", {}))
+        task = format_openharmony_issue(instance)
+
+        progress_manager.on_instance_start(instance_id)
+        progress_manager.update_instance_status(instance_id, "Starting...")
+
+        agent = None
+        extra_info = None
+
+        try:
+            env = LocalEnvironment(**(config.get("environment", {}) | {"cwd": working_path}))
+            agent = AsyncProgressTrackingAgent(
+                model,
+                env,
+                progress_manager=progress_manager,
+                instance_id=instance_id,
+                **config.get("agent", {}),
+            )
+            exit_status, result = await agent.run(task)
+        except Exception as e:
+            logger.error(f"Error processing instance {instance_id}: {e}", exc_info=True)
+            exit_status, result = type(e).__name__, str(e)
+            extra_info = {"traceback": traceback.format_exc()}
+        finally:
+            project_prefix = instance_id.rsplit("-", 1)[0]
+            traj_dir = Path(working_path) / f"{project_prefix}_traj"
+            traj_dir.mkdir(parents=True, exist_ok=True)
+            save_traj(
+                agent,
+                traj_dir / f"{instance_id}.traj.json",
+                exit_status=exit_status,
+                result=result,
+                extra_info=extra_info,
+                instance_id=instance_id,
+                issue_rules=[issue["rule_id"] for issue in instance.get("issues", [instance])],
+                print_path=False,
+            )
+            update_results_file(output_dir / "results.json", instance_id, model.config.model_name, result)
+            progress_manager.on_instance_end(instance_id, exit_status)
+
+
+async def process_instances(
+    instances: list[dict],
+    output_dir: Path,
+    config: dict,
+    progress_manager: RunBatchProgressManager,
+    working_path: str,
+    concurrency: int,
+) -> None:
+    # Models and environments without async support are run in the default executor, which needs
+    # to be large enough to not become the bottleneck.
+    asyncio.get_running_loop().set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=concurrency))
+    GLOBAL_SESSION_POOL.configure(pool_size=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    file_locks = collections.defaultdict(asyncio.Lock)
+    tasks = {
+        asyncio.create_task(
+            process_instance(
+                instance,
+                output_dir,
+                config,
+                progress_manager,
+                working_path,
+                semaphore,
+                file_locks[get_file_key(instance)],
+            )
+        ): instance["instance_id"]
+        for instance in instances
+    }
+    for task, instance_id in tasks.items():
+        try:
+            await task
+        except Exception as e:
+            logger.error(f"Error in task for instance {instance_id}: {e}", exc_info=True)
+            progress_manager.on_uncaught_exception(instance_id, e)
+    await GLOBAL_SESSION_POOL.aclose()
+
+
+# fmt: off
+@app.command(help=_HELP_TEXT)
+def main(
+    subset: str = typer.Option("dataset1", "--subset", help="Dataset path", rich_help_panel="Data selection"),
+    split: str = typer.Option("test", "--split", help="Dataset split (test/train)", rich_help_panel="Data selection"),
+    instance_range: str = typer.Option("", "-i", "--instance", help="Instance range (e.g., 'openharmony__vendor_telink-0:10' or '0:10')", rich_help_panel="Data selection"),
+    slice_spec: str = typer.Option("", "--slice", help="Slice specification (e.g., '0:5' for first 5 instances)", rich_help_panel="Data selection"),
+    filter_spec: str = typer.Option("", "--filter", help="Filter instance IDs by regex", rich_help_panel="Data selection"),
+    output: str = typer.Option("", "-o", "--output", help="Output directory", rich_help_panel="Basic"),
+    concurrency: int = typer.Option(100, "-j", "--concurrency", help="Maximum number of instances in flight", rich_help_panel="Basic"),
+    model: str | None = typer.Option(None, "-m", "--model", help="Model to use", rich_help_panel="Basic"),
+    model_class: str | None = typer.Option(None, "--model-class", help="Model class to use", rich_help_panel="Advanced"),
+    redo_existing: bool = typer.Option(False, "--redo-existing", help="Redo existing instances", rich_help_panel="Data selection"),
+    config_spec: Path = typer.Option(builtin_config_dir / "extra" / "openharmony.yaml", "-c", "--config", help="Path to a config file", rich_help_panel="Basic"),
+    scheduler: str = typer.Option("fifo", "--scheduler", help="Order in which instances are started: 'fifo' (dataset order), 'priority' (most severe and cheapest first) or an import path", rich_help_panel="Advanced"),
+    history: list[Path] = typer.Option([], "--history", help="Trajectory directories of previous runs used to estimate the cost of each rule (for --scheduler priority)", rich_help_panel="Advanced"),
+    group_by: str = typer.Option("none", "--group-by", help="Fix several issues in one agent run: 'none', 'file' (all issues of a file) or 'rule' (all issues of a rule in a file)", rich_help_panel="Advanced"),
+) -> None:
+    # fmt: on
+    if not output:
+        output = f"openharmony_async_results_{time.strftime('%Y%m%d_%H%M%S')}"
+    output_path = Path(output)
+    output_path.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Results will be saved to {output_path}")
+    add_file_handler(output_path / "minisweagent.log")
+
+    logger.info(f"Loading OpenHarmony dataset from {subset}, split {split}...")
+    instances = list(load_openharmony_dataset(subset, split).values())
+    instances = filter_instances(
+        instances, filter_spec=filter_spec, slice_spec=slice_spec, instance_range=instance_range
+    )
+    if group_by != "none":
+        n_issues = len(instances)
+        instances = group_openharmony_instances(instances, group_by)
+        logger.info(f"Grouped {n_issues} issue(s) into {len(instances)} agent run(s) by {group_by}")
+    if not redo_existing and (output_path / "results.json").exists():
+        existing_instances = list(json.loads((output_path / "results.json").read_text()).keys())
+        logger.info(f"Skipping {len(existing_instances)} existing instances")
+        instances = [instance for instance in instances if instance["instance_id"] not in existing_instances]
+    logger.info(f"Running on {len(instances)} instances...")
+    if not instances:
+        logger.warning("No instances to process!")
+        return
+
+    config_path = get_config_path(config_spec)
+    logger.info(f"Loading agent config from '{config_path}'")
+    config = yaml.safe_load(config_path.read_text())
+    if model is not None:
+        config.setdefault("model", {})["model_name"] = model
+    if model_class is not None:
+        config.setdefault("model", {})["model_class"] = model_class
+
+    logger.info("Preparing working directory...")
+    working_path = prepare_working_directory(instances[0], mode="batch", instance_range=instance_range or slice_spec or "batch")
+    logger.info(f"Working directory: {working_path}")
+
+    progress_manager = RunBatchProgressManager(len(instances), output_path / f"exit_statuses_{time.time()}.yaml")
+    instances = get_scheduler(scheduler, history=history).order(instances)
+    with Live(progress_manager.render_group, refresh_per_second=4):
+        asyncio.run(process_instances(instances, output_path, config, progress_manager, working_path, concurrency))
+    GLOBAL_SESSION_POOL.log_stats()
+
+
+if __name__ == "__main__":
+    app()
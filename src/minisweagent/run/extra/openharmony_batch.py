@@ -2,12 +2,13 @@
 
 """Run mini-SWE-agent on OpenHarmony instances in batch mode."""
 
+import collections
 import concurrent.futures
 import json
 import re
-import threading
 import time
 import traceback
+from collections.abc import Callable
 from pathlib import Path
 
 import typer
@@ -18,12 +19,19 @@ from minisweagent.agents.default import DefaultAgent
 from minisweagent.config import builtin_config_dir, get_config_path
 from minisweagent.environments.local import LocalEnvironment
 from minisweagent.models import get_model
+from minisweagent.models.utils.concurrency import GLOBAL_CONCURRENCY_LIMITER
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
 from minisweagent.run.extra.openharmony_single import (
     format_openharmony_issue,
+    get_issue_files,
+    group_openharmony_instances,
     load_openharmony_dataset,
     prepare_working_directory,
 )
 from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.executor import EXECUTORS, get_executor, get_output_file_lock
+from minisweagent.run.extra.utils.scheduler import cancel_after, get_scheduler
+from minisweagent.run.extra.utils.workspace import MAX_MERGE_ATTEMPTS, MergeConflict, WorkspacePool
 from minisweagent.run.utils.save import save_traj
 from minisweagent.utils.log import add_file_handler, logger
 
@@ -37,9 +45,6 @@ Supports parallel processing and progress tracking.
 
 app = typer.Typer(rich_markup_mode="rich", add_completion=False)
 
-_OUTPUT_FILE_LOCK = threading.Lock()
-
-
 class ProgressTrackingAgent(DefaultAgent):
     """Simple wrapper around DefaultAgent that provides progress updates."""
 
@@ -58,7 +63,7 @@ class ProgressTrackingAgent(DefaultAgent):
 
 def update_results_file(output_path: Path, instance_id: str, model_name: str, result: str):
     """Update the output JSON file with results from a single instance."""
-    with _OUTPUT_FILE_LOCK:
+    with get_output_file_lock():
         output_data = {}
         if output_path.exists():
             output_data = json.loads(output_path.read_text())
@@ -74,7 +79,7 @@ def remove_from_results_file(output_path: Path, instance_id: str):
     """Remove an instance from the results file."""
     if not output_path.exists():
         return
-    with _OUTPUT_FILE_LOCK:
+    with get_output_file_lock():
         output_data = json.loads(output_path.read_text())
         if instance_id in output_data:
             del output_data[instance_id]
@@ -87,8 +92,16 @@ def process_instance(
     config: dict,
     progress_manager: RunBatchProgressManager,
     working_path: str,
+    workspaces: WorkspacePool | None = None,
+    requeue: Callable[[dict], bool] | None = None,
 ) -> None:
-    """Process a single OpenHarmony instance."""
+    """Process a single OpenHarmony instance.
+
+    If `workspaces` is given, the agent works in an isolated workspace and its edits are merged
+    back into `working_path` afterwards (the applied patch is saved next to the trajectory).
+    If the edits conflict with those of another worker, the instance is handed to `requeue`, which
+    returns False if it cannot be run again (the conflict is then recorded as the exit status).
+    """
     instance_id = instance["instance_id"]
     
     # Avoid inconsistent state if something fails
@@ -103,11 +116,12 @@ def process_instance(
     agent = None
     extra_info = None
 
-    try:
-        # Use local environment with shared working directory as cwd
-        env_config = config.get("environment", {})
-        env_config["cwd"] = working_path
-        env = LocalEnvironment(**env_config)
+    patch = None
+    requeued = False
+    env_config = config.get("environment", {})
+
+    def run_agent(env: LocalEnvironment) -> tuple[str, str]:
+        nonlocal agent
         
         agent = ProgressTrackingAgent(
             model,
@@ -116,29 +130,53 @@ def process_instance(
             instance_id=instance_id,
             **config.get("agent", {}),
         )
-        exit_status, result = agent.run(task)
+        return agent.run(task)
+
+    try:
+        if workspaces is None:
+            # Use local environment with the shared working directory as cwd
+            exit_status, result = run_agent(LocalEnvironment(**env_config | {"cwd": str(working_path)}))
+        else:
+            (exit_status, result), patch = workspaces.run(
+                lambda workspace: run_agent(workspace.get_environment(**env_config)),
+                private_files=get_issue_files(instance),
+            )
+    except MergeConflict as e:
+        if requeue is not None and requeue(instance):
+            logger.warning(f"{e}. Requeued instance {instance_id} behind the others")
+            requeued = True
+        else:
+            logger.error(f"Error processing instance {instance_id}: {e}")
+            exit_status, result = type(e).__name__, str(e)
     except Exception as e:
         logger.error(f"Error processing instance {instance_id}: {e}", exc_info=True)
         exit_status, result = type(e).__name__, str(e)
         extra_info = {"traceback": traceback.format_exc()}
     finally:
-        # Save trajectory to working directory (with fixed project)
-        # Create a dedicated trajectory folder
-        project_prefix = instance_id.rsplit("-", 1)[0]  # Extract project prefix (e.g., "openharmony__distributedschedule_samgr")
-        traj_dir = Path(working_path) / f"{project_prefix}_traj"
-        traj_dir.mkdir(parents=True, exist_ok=True)
-        working_traj_path = traj_dir / f"{instance_id}.traj.json"
-        save_traj(
-            agent,
-            working_traj_path,
-            exit_status=exit_status,
-            result=result,
-            extra_info=extra_info,
-            instance_id=instance_id,
-            print_path=False,
-        )
-        update_results_file(output_dir / "results.json", instance_id, model.config.model_name, result)
-        progress_manager.on_instance_end(instance_id, exit_status)
+        if requeued:
+            # Recorded when the instance is run again
+            progress_manager.on_instance_requeued(instance_id)
+        else:
+            # Save trajectory to working directory (with fixed project)
+            # Create a dedicated trajectory folder
+            project_prefix = instance_id.rsplit("-", 1)[0]  # Extract project prefix (e.g., "openharmony__distributedschedule_samgr")
+            traj_dir = Path(working_path) / f"{project_prefix}_traj"
+            traj_dir.mkdir(parents=True, exist_ok=True)
+            working_traj_path = traj_dir / f"{instance_id}.traj.json"
+            if patch is not None:
+                (traj_dir / f"{instance_id}.patch").write_text(patch)
+            save_traj(
+                agent,
+                working_traj_path,
+                exit_status=exit_status,
+                result=result,
+                extra_info=extra_info,
+                instance_id=instance_id,
+                issue_rules=[issue["rule_id"] for issue in instance.get("issues", [instance])],
+                print_path=False,
+            )
+            update_results_file(output_dir / "results.json", instance_id, model.config.model_name, result)
+            progress_manager.on_instance_end(instance_id, exit_status)
 
 
 def parse_instance_range(range_spec: str, all_instance_ids: list[str]) -> list[str]:
@@ -230,9 +268,24 @@ def main(
     model_class: str | None = typer.Option(None, "--model-class", help="Model class to use", rich_help_panel="Advanced"),
     redo_existing: bool = typer.Option(False, "--redo-existing", help="Redo existing instances", rich_help_panel="Data selection"),
     config_spec: Path = typer.Option(builtin_config_dir / "extra" / "openharmony.yaml", "-c", "--config", help="Path to a config file", rich_help_panel="Basic"),
+    scheduler: str = typer.Option("fifo", "--scheduler", help="Order in which instances are processed: 'fifo' (dataset order), 'priority' (most severe and cheapest first) or an import path", rich_help_panel="Advanced"),
+    history: list[Path] = typer.Option([], "--history", help="Trajectory directories of previous runs used to estimate the cost of each rule (for --scheduler priority)", rich_help_panel="Advanced"),
+    time_limit: float | None = typer.Option(None, "--time-limit", help="Do not start new instances after this many seconds", rich_help_panel="Advanced"),
+    group_by: str = typer.Option("none", "--group-by", help="Fix several issues in one agent run: 'none', 'file' (all issues of a file) or 'rule' (all issues of a rule in a file)", rich_help_panel="Advanced"),
+    workspace: str = typer.Option("shared", "--workspace", help="'shared' (all workers edit the working directory) or 'isolated' (every worker edits its own copy, edits are merged back)", rich_help_panel="Advanced"),
+    adaptive_concurrency: bool = typer.Option(False, "--adaptive-concurrency", help="Adapt the number of concurrent model calls (up to the number of workers) to rate limits and latency of the endpoint (openai_compatible models). Thread executor only", rich_help_panel="Advanced"),
+    executor_type: str = typer.Option("thread", "--executor", help="Run workers as 'thread's or as 'process'es (scales beyond the GIL with many workers)", rich_help_panel="Advanced"),
 ) -> None:
     # fmt: on
     """Run mini-SWE-agent on OpenHarmony instances in batch mode."""
+    if workspace not in ("shared", "isolated"):
+        raise ValueError(f"Unknown workspace mode: {workspace}. Supported: shared, isolated")
+    if executor_type not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor_type}. Supported: {', '.join(EXECUTORS)}")
+    if executor_type == "process" and workspace == "isolated":
+        raise ValueError("Isolated workspaces can only be used with the thread executor")
+    if executor_type == "process" and adaptive_concurrency:
+        raise ValueError("Adaptive concurrency only works with the thread executor (processes do not share the limit)")
     
     # Setup output directory
     if not output:
@@ -256,6 +309,11 @@ def main(
         instance_range=instance_range,
     )
     
+    if group_by != "none":
+        n_issues = len(instances)
+        instances = group_openharmony_instances(instances, group_by)
+        logger.info(f"Grouped {n_issues} issue(s) into {len(instances)} agent run(s) by {group_by}")
+    
     # Skip existing instances if requested
     if not redo_existing and (output_path / "results.json").exists():
         existing_instances = list(json.loads((output_path / "results.json").read_text()).keys())
@@ -283,6 +341,7 @@ def main(
     logger.info("Preparing working directory...")
     working_path = prepare_working_directory(instances[0], mode="batch", instance_range=instance_range or slice_spec or "batch")
     logger.info(f"Working directory: {working_path}")
+    workspaces = WorkspacePool(working_path) if workspace == "isolated" else None
 
     # Setup progress manager
     progress_manager = RunBatchProgressManager(
@@ -290,25 +349,57 @@ def main(
     )
 
     def process_futures(futures: dict[concurrent.futures.Future, str]):
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                future.result()
-            except concurrent.futures.CancelledError:
-                pass
-            except Exception as e:
-                instance_id = futures[future]
-                logger.error(f"Error in future for instance {instance_id}: {e}", exc_info=True)
-                progress_manager.on_uncaught_exception(instance_id, e)
+        # Requeued instances add futures while we wait, so we cannot use as_completed
+        processed = set()
+        while pending := [future for future in list(futures) if future not in processed]:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            processed |= done
+            for future in done:
+                try:
+                    future.result()
+                except concurrent.futures.CancelledError:
+                    pass
+                except Exception as e:
+                    instance_id = futures[future]
+                    logger.error(f"Error in future for instance {instance_id}: {e}", exc_info=True)
+                    progress_manager.on_uncaught_exception(instance_id, e)
 
     # Process instances
+    instances = get_scheduler(scheduler, history=history).order(instances)
     with Live(progress_manager.render_group, refresh_per_second=4):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {
-                executor.submit(process_instance, instance, output_path, config, progress_manager, working_path): instance[
-                    "instance_id"
-                ]
-                for instance in instances
-            }
+        GLOBAL_SESSION_POOL.configure(pool_size=workers)
+        if adaptive_concurrency:
+            GLOBAL_CONCURRENCY_LIMITER.configure(max_limit=workers)
+        with get_executor(executor_type, workers, progress_manager) as (executor, worker_progress_manager):
+            futures: dict[concurrent.futures.Future, str] = {}
+            merge_attempts = collections.Counter()
+            deadline = time.time() + time_limit if time_limit is not None else float("inf")
+
+            def submit(instance: dict) -> None:
+                future = executor.submit(
+                    process_instance,
+                    instance,
+                    output_path,
+                    config,
+                    worker_progress_manager,
+                    working_path,
+                    workspaces,
+                    requeue if workspaces is not None else None,
+                )
+                futures[future] = instance["instance_id"]
+
+            def requeue(instance: dict) -> bool:
+                """Run an instance whose edits conflicted again after all instances that are queued so far."""
+                merge_attempts[instance["instance_id"]] += 1
+                if merge_attempts[instance["instance_id"]] >= MAX_MERGE_ATTEMPTS or time.time() >= deadline:
+                    return False
+                submit(instance)
+                return True
+
+            for instance in instances:
+                submit(instance)
+            if time_limit is not None:
+                cancel_after(list(futures), time_limit)
             try:
                 process_futures(futures)
             except KeyboardInterrupt:
@@ -317,6 +408,9 @@ def main(
                     if not future.running() and not future.done():
                         future.cancel()
                 process_futures(futures)
+    if workspaces is not None:
+        workspaces.cleanup()
+    GLOBAL_SESSION_POOL.log_stats()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@
 
 import json
 import os
+import re
 import shutil
 import traceback
 from pathlib import Path
@@ -15,6 +16,7 @@ from minisweagent.agents.interactive import InteractiveAgent
 from minisweagent.config import builtin_config_dir, get_config_path
 from minisweagent.environments.local import LocalEnvironment
 from minisweagent.models import get_model
+from minisweagent.run.extra.utils.scheduler import get_file_key
 from minisweagent.run.utils.save import save_traj
 from minisweagent.utils.log import logger
 
@@ -181,18 +183,99 @@ def prepare_working_directory(
     return str(output_project_path.absolute())
 
 
+def group_openharmony_instances(instances: list[dict], group_by: str = "none") -> list[dict]:
+    """Merge instances so that a single agent run fixes several issues at once.
+
+    Args:
+        instances: Instance dictionaries
+        group_by: 'none' (one run per issue), 'file' (one run per file) or
+            'rule' (one run per rule and file)
+
+    Returns:
+        List of instances. Merged instances keep the fields of their first issue and list
+        all merged issues under the 'issues' key.
+    """
+    if group_by == "none":
+        return instances
+    if group_by not in ("file", "rule"):
+        raise ValueError(f"Unknown grouping: {group_by}. Supported: none, file, rule")
+    groups: dict[tuple, list[dict]] = {}
+    for instance in instances:
+        key = (instance["project_name"], get_file_key(instance))
+        if group_by == "rule":
+            key += (instance["rule_id"],)
+        groups.setdefault(key, []).append(instance)
+    return [group[0] if len(group) == 1 else _merge_instances(group) for group in groups.values()]
+
+
+def _merge_instances(instances: list[dict]) -> dict:
+    return instances[0] | {"instance_id": f"{instances[0]['instance_id']}+{len(instances) - 1}", "issues": instances}
+
+
+def get_issue_files(instance: dict) -> list[str]:
+    """Relative paths of the files that an (optionally merged) instance is expected to edit."""
+    return sorted({get_file_key(issue) for issue in instance.get("issues", [instance]) if issue["issue_file"]})
+
+
+def _get_line_sort_key(issue: dict) -> int:
+    """First line of an issue. Ranges such as "12-14" sort by their start, missing values (or NaN from xlsx) first."""
+    match = re.match(r"\s*(\d+)", str(issue.get("line_number", "")))
+    return int(match.group(1)) if match else 0
+
+
+def format_openharmony_issue_group(instance: dict) -> str:
+    """Format a merged instance (see `group_openharmony_instances`) as a single problem statement."""
+    issues = sorted(instance["issues"], key=_get_line_sort_key)
+    rules = list(dict.fromkeys(issue["rule_id"] for issue in issues))
+    issue_lines = []
+    for i, issue in enumerate(issues, 1):
+        rule = f" [{issue['rule_id']}]" if len(rules) > 1 else ""
+        issue_lines.append(
+            f"{i}. Line {issue['line_number']}{rule} (Severity: {issue['error_level']}, List Index: {issue['list_index']})\n"
+            f"   Description: {issue['description']}\n"
+            f"   Code: {issue['code_content']}"
+        )
+    issue_list = "\n".join(issue_lines)
+    rule_list = "\n".join(rules)
+    return f"""OpenHarmony Code Quality Issues ({len(issues)} issues in one file)
+
+Project: {instance['project_name']}
+File: {instance['issue_file']}
+
+Coding Standard Rule(s):
+{rule_list}
+
+Problem Locations (line numbers refer to the file before any of your edits):
+{issue_list}
+
+Task:
+Please fix ALL of the code quality issues listed above by modifying the file:
+{instance['issue_file']}
+
+Note: The file path is relative to the current working directory. Do not use absolute paths.
+Edits can shift line numbers. Fix the issues from the bottom of the file to the top,
+or re-read the file before each edit.
+
+Make sure your fixes comply with the coding standard rules mentioned above.
+Focus on STATIC ANALYSIS - read and understand the code, then make the necessary changes.
+"""
+
+
 def format_openharmony_issue(instance: dict) -> str:
     """Format OpenHarmony issue as a problem statement."""
+    if "issues" in instance:
+        return format_openharmony_issue_group(instance)
+    # The rule comes first, so that instances of the same rule share the longest possible prompt prefix
     return f"""OpenHarmony Code Quality Issue
 
+Coding Standard Rule:
+{instance['rule_id']}
+
 Project: {instance['project_name']}
 File: {instance['issue_file']}
 Issue Index: {instance['issue_index']} (List Index: {instance['list_index']})
 Severity: {instance['error_level']}
 
-Coding Standard Rule:
-{instance['rule_id']}
-
 Issue Description:
 {instance['description']}
 
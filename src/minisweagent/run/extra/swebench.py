@@ -7,7 +7,6 @@ import concurrent.futures
 import json
 import random
 import re
-import threading
 import time
 import traceback
 from pathlib import Path
@@ -23,7 +22,10 @@ from minisweagent.agents.default import DefaultAgent
 from minisweagent.config import builtin_config_dir, get_config_path
 from minisweagent.environments import get_environment
 from minisweagent.models import get_model
+from minisweagent.models.utils.concurrency import GLOBAL_CONCURRENCY_LIMITER
+from minisweagent.models.utils.http import GLOBAL_SESSION_POOL
 from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.executor import get_executor, get_output_file_lock
 from minisweagent.run.utils.save import save_traj
 from minisweagent.utils.log import add_file_handler, logger
 
@@ -47,9 +49,6 @@ DATASET_MAPPING = {
 }
 
 
-_OUTPUT_FILE_LOCK = threading.Lock()
-
-
 class ProgressTrackingAgent(DefaultAgent):
     """Simple wrapper around DefaultAgent that provides progress updates."""
 
@@ -96,7 +95,7 @@ def get_sb_environment(config: dict, instance: dict) -> Environment:
 
 def update_preds_file(output_path: Path, instance_id: str, model_name: str, result: str):
     """Update the output JSON file with results from a single instance."""
-    with _OUTPUT_FILE_LOCK:
+    with get_output_file_lock():
         output_data = {}
         if output_path.exists():
             output_data = json.loads(output_path.read_text())
@@ -112,7 +111,7 @@ def remove_from_preds_file(output_path: Path, instance_id: str):
     """Remove an instance from the predictions file."""
     if not output_path.exists():
         return
-    with _OUTPUT_FILE_LOCK:
+    with get_output_file_lock():
         output_data = json.loads(output_path.read_text())
         if instance_id in output_data:
             del output_data[instance_id]
@@ -203,6 +202,8 @@ def main(
     redo_existing: bool = typer.Option(False, "--redo-existing", help="Redo existing instances", rich_help_panel="Data selection"),
     config_spec: Path = typer.Option( builtin_config_dir / "extra" / "swebench.yaml", "-c", "--config", help="Path to a config file", rich_help_panel="Basic"),
     environment_class: str | None = typer.Option( None, "--environment-class", help="Environment type to use. Recommended are docker or singularity", rich_help_panel="Advanced"),
+    adaptive_concurrency: bool = typer.Option(False, "--adaptive-concurrency", help="Adapt the number of concurrent model calls (up to the number of workers) to rate limits and latency of the endpoint (openai_compatible models)", rich_help_panel="Advanced"),
+    executor_type: str = typer.Option("thread", "--executor", help="Run workers as 'thread's or as 'process'es (scales beyond the GIL with many workers)", rich_help_panel="Advanced"),
 ) -> None:
     # fmt: on
     output_path = Path(output)
@@ -245,9 +246,12 @@ def main(
                 progress_manager.on_uncaught_exception(instance_id, e)
 
     with Live(progress_manager.render_group, refresh_per_second=4):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        GLOBAL_SESSION_POOL.configure(pool_size=workers)
+        if adaptive_concurrency:
+            GLOBAL_CONCURRENCY_LIMITER.configure(max_limit=workers)
+        with get_executor(executor_type, workers, progress_manager) as (executor, worker_progress_manager):
             futures = {
-                executor.submit(process_instance, instance, output_path, config, progress_manager): instance[
+                executor.submit(process_instance, instance, output_path, config, worker_progress_manager): instance[
                     "instance_id"
                 ]
                 for instance in instances
@@ -260,6 +264,7 @@ def main(
                     if not future.running() and not future.done():
                         future.cancel()
                 process_futures(futures)
+    GLOBAL_SESSION_POOL.log_stats()
 
 
 if __name__ == "__main__":
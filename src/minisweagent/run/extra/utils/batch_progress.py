@@ -56,7 +56,7 @@ class RunBatchProgressManager:
         self._instances_by_exit_status = collections.defaultdict(list)
         self._main_progress_bar = Progress(
             SpinnerColumn(spinner_name="dots2"),
-            TextColumn("[progress.description]{task.description} (${task.fields[total_cost]})"),
+            TextColumn("[progress.description]{task.description} ({task.fields[model_stats]})"),
             BarColumn(),
             MofNCompleteColumn(),
             TaskProgressColumn(),
@@ -76,7 +76,7 @@ class RunBatchProgressManager:
         """
 
         self._main_task_id = self._main_progress_bar.add_task(
-            "[cyan]Overall Progress", total=num_instances, total_cost="0.00", eta=""
+            "[cyan]Overall Progress", total=num_instances, model_stats="0 calls", eta=""
         )
 
         self.render_group = Group(Table(), self._task_progress_bar, self._main_progress_bar)
@@ -114,13 +114,22 @@ class RunBatchProgressManager:
         assert self.render_group is not None
         self.render_group.renderables[0] = t
 
+    def _get_model_stats_text(self) -> str:
+        """Model calls, token throughput and latency percentiles of all workers."""
+        total = minisweagent.models.GLOBAL_MODEL_STATS.get_total()
+        text = f"{total.n_calls} calls"
+        if tokens := total.prompt_tokens + total.completion_tokens:
+            text += f", {tokens / max(time.time() - self._start_time, 1e-6):.0f} tok/s"
+        if (p50 := total.get_latency_percentile(50)) is not None:
+            text += f", p50 {p50:.1f}s, p95 {total.get_latency_percentile(95):.1f}s"
+        if total.cached_tokens:
+            text += f", cache {total.cache_hit_rate:.0%}"
+        return text
+
     def _update_total_costs(self) -> None:
+        model_stats = self._get_model_stats_text()
         with self._lock:
-            self._main_progress_bar.update(
-                self._main_task_id,
-                total_cost=f"{minisweagent.models.GLOBAL_MODEL_STATS.n_calls}",
-                eta=self._get_eta_text(),
-            )
+            self._main_progress_bar.update(self._main_task_id, model_stats=model_stats, eta=self._get_eta_text())
 
     def update_instance_status(self, instance_id: str, message: str):
         assert self._task_progress_bar is not None
@@ -155,6 +164,14 @@ class RunBatchProgressManager:
         if self._yaml_report_path is not None:
             self._save_overview_data_yaml(self._yaml_report_path)
 
+    def on_instance_requeued(self, instance_id: str) -> None:
+        """The instance will be run again later, so it is not counted as completed."""
+        with self._lock:
+            try:
+                self._task_progress_bar.remove_task(self._spinner_tasks.pop(instance_id))
+            except KeyError:
+                pass
+
     def on_uncaught_exception(self, instance_id: str, exception: Exception) -> None:
         self.on_instance_end(instance_id, f"Uncaught {type(exception).__name__}")
 
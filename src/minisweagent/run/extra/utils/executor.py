@@ -0,0 +1,109 @@
+"""Executors that run the instances of a batch in threads or in separate processes.
+
+Threads are cheap, but template rendering, (de)serialization of the message history and progress updates
+all hold the GIL, so runs with many workers become CPU bound in a single core. With the process executor,
+every worker is its own interpreter. Progress updates are sent back to the progress manager of the
+parent process over a queue, and writes to shared result files are serialized by a lock that is shared
+with all workers. Workers are started from a fork server (or spawned where there is none), because forking
+the parent would copy the locks held by its threads (e.g., the refresh thread of the progress display).
+"""
+
+import concurrent.futures
+import multiprocessing
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import minisweagent.models
+from minisweagent.models.utils.stats import ModelCounters, subtract_counters
+from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+
+EXECUTORS = ("thread", "process")
+
+_output_file_lock = threading.Lock()
+_progress_queue = None
+_counters_reported: dict[str, ModelCounters] = {}
+
+
+def get_output_file_lock():
+    """Lock that guards read-modify-write cycles of result files that are shared by all workers."""
+    return _output_file_lock
+
+
+class QueueProgressManager:
+    """Stand-in for `RunBatchProgressManager` in worker processes that forwards all updates to the parent.
+
+    The stats of the model calls of the worker process are forwarded as well, so that the progress bar
+    of the parent shows the calls, tokens and latencies of all workers.
+    """
+
+    def _forward(self, method: str, *args) -> None:
+        global _counters_reported
+        counters = minisweagent.models.GLOBAL_MODEL_STATS.get_counters()
+        _progress_queue.put((method, args, subtract_counters(counters, _counters_reported)))
+        _counters_reported = counters
+
+    def on_instance_start(self, instance_id: str) -> None:
+        self._forward("on_instance_start", instance_id)
+
+    def update_instance_status(self, instance_id: str, message: str) -> None:
+        self._forward("update_instance_status", instance_id, message)
+
+    def on_instance_end(self, instance_id: str, exit_status: str | None) -> None:
+        self._forward("on_instance_end", instance_id, exit_status)
+
+    def on_instance_requeued(self, instance_id: str) -> None:
+        self._forward("on_instance_requeued", instance_id)
+
+    def on_uncaught_exception(self, instance_id: str, exception: Exception) -> None:
+        # Exceptions are not necessarily picklable
+        self._forward("on_instance_end", instance_id, f"Uncaught {type(exception).__name__}")
+
+
+def _init_worker(progress_queue, output_file_lock) -> None:
+    global _progress_queue, _output_file_lock
+    _progress_queue = progress_queue
+    _output_file_lock = output_file_lock
+
+
+def _forward_progress(progress_queue, progress_manager: RunBatchProgressManager) -> None:
+    while (update := progress_queue.get()) is not None:
+        method, args, counters = update
+        minisweagent.models.GLOBAL_MODEL_STATS.merge(counters)
+        getattr(progress_manager, method)(*args)
+
+
+@contextmanager
+def get_executor(
+    executor: str, max_workers: int, progress_manager: RunBatchProgressManager
+) -> Iterator[tuple[concurrent.futures.Executor, RunBatchProgressManager | QueueProgressManager]]:
+    """Yields an executor and the progress manager that needs to be passed to the jobs.
+
+    Args:
+        executor: 'thread' or 'process'
+        max_workers: Number of workers
+        progress_manager: Progress manager of this (the parent) process
+    """
+    if executor == "thread":
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            yield pool, progress_manager
+        return
+    if executor != "process":
+        msg = f"Unknown executor: {executor}. Supported: {', '.join(EXECUTORS)}"
+        raise ValueError(msg)
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(start_method)
+    progress_queue = context.Queue()
+    forwarder = threading.Thread(target=_forward_progress, args=(progress_queue, progress_manager), daemon=True)
+    forwarder.start()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(progress_queue, context.Lock()),
+        ) as pool:
+            yield pool, QueueProgressManager()
+    finally:
+        progress_queue.put(None)
+        forwarder.join()
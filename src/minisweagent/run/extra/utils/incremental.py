@@ -0,0 +1,113 @@
+"""Compare a new defect report with the one of a previous run, so that only new or regressed defects are fixed."""
+
+import hashlib
+import re
+from collections.abc import Callable, Hashable
+from pathlib import Path
+
+from minisweagent.run.extra.openharmony_single import get_issue_files
+from minisweagent.run.extra.utils.journal import RunJournal, get_issue_key
+from minisweagent.run.extra.utils.scheduler import get_file_key
+
+
+def hash_file(path: Path) -> str | None:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def get_file_hashes(root: Path, instance: dict) -> dict[str, str | None]:
+    """Content hashes of the files that an (optionally merged) instance edits."""
+    return {file: hash_file(Path(root) / file) for file in get_issue_files(instance)}
+
+
+def get_defect_signature(instance: dict) -> tuple[str, str, str]:
+    """Identifies a defect across exports in which its 缺陷id changed: file, rule and code snippet
+    (ignoring whitespace, so that reformatting does not turn a known defect into a new one).
+    """
+    snippet = re.sub(r"\s+", "", str(instance.get("code_content") or ""))
+    return get_file_key(instance), str(instance.get("rule_id", "")), snippet
+
+
+def _get_field(instance: dict, key: str) -> str:
+    value = instance.get(key)
+    return str(value).strip() if value is not None and value == value else ""  # value != value for NaN
+
+
+def _get_id_key(instance: dict) -> tuple | None:
+    if not (defect_id := _get_field(instance, "defect_id")):
+        return None
+    file_key, _, snippet = get_defect_signature(instance)
+    return defect_id, file_key, snippet
+
+
+def _get_id_and_file_key(instance: dict) -> tuple | None:
+    return (defect_id, get_file_key(instance)) if (defect_id := _get_field(instance, "defect_id")) else None
+
+
+# From the most to the least specific. 缺陷id alone is not unique: defects in different files can share it.
+_MATCH_KEYS: list[Callable[[dict], Hashable | None]] = [
+    lambda instance: _get_field(instance, "problem_number") or None,
+    _get_id_key,
+    get_defect_signature,
+    _get_id_and_file_key,  # the code of the defect changed
+]
+
+
+def diff_defects(old: list[dict], new: list[dict]) -> tuple[list[tuple[dict, dict]], list[dict], list[dict]]:
+    """Match the defects of two reports by 问题编号, then by 缺陷id, file and code snippet, then by
+    file, rule and code snippet, and finally by 缺陷id and file. Every old defect is matched at most once.
+
+    Returns pairs of (old, new) instances of known defects, new defects and resolved (old) defects.
+    """
+    unmatched = dict(enumerate(old))
+    previous_by_index: dict[int, dict] = {}
+    for get_key in _MATCH_KEYS:
+        candidates: dict[Hashable, list[int]] = {}
+        for i, instance in unmatched.items():
+            if (key := get_key(instance)) is not None:
+                candidates.setdefault(key, []).append(i)
+        for j, instance in enumerate(new):
+            if j not in previous_by_index and (key := get_key(instance)) is not None and candidates.get(key):
+                previous_by_index[j] = unmatched.pop(candidates[key].pop(0))
+    matched = [(previous_by_index[j], instance) for j, instance in enumerate(new) if j in previous_by_index]
+    added = [instance for j, instance in enumerate(new) if j not in previous_by_index]
+    return matched, added, list(unmatched.values())
+
+
+def _get_final_hashes(file_hashes: dict | None, final_hashes: dict[str, str | None]) -> dict | None:
+    if file_hashes is None:
+        return None
+    return {file: final_hashes.get(file, file_hash) for file, file_hash in file_hashes.items()}
+
+
+def select_changed_defects(
+    instances: list[dict], previous_instances: list[dict], previous_journal: RunJournal, root: Path
+) -> tuple[list[dict], dict[str, list[str]]]:
+    """Drop defects that were fixed in the previous run and whose files did not change since.
+
+    Returns the instances to run and a report that lists the instance IDs of every category:
+    `new`, `regressed` (fixed before, but the file changed since), `unfixed` (not fixed in the previous run),
+    `skipped` (fixed, file unchanged) and `resolved` (only in the previous report).
+    """
+    completed, _ = previous_journal.get_status()
+    # Later issues of the previous run can have edited a file after an issue on it was fixed, so the
+    # hashes of the end of the run are used where available (the ones at the end of the issue otherwise)
+    final_hashes = previous_journal.get_file_hashes()
+    matched, added, resolved = diff_defects(previous_instances, instances)
+    report = {"new": [instance["instance_id"] for instance in added], "regressed": [], "unfixed": [], "skipped": []}
+    to_run = list(added)
+    for previous, instance in matched:
+        entry = completed.get(get_issue_key(previous))
+        if entry is None or entry["exit_status"] != "Submitted":
+            report["unfixed"].append(instance["instance_id"])
+            to_run.append(instance)
+        elif _get_final_hashes(entry.get("file_hashes"), final_hashes) != get_file_hashes(root, instance):
+            report["regressed"].append(instance["instance_id"])
+            to_run.append(instance)
+        else:
+            report["skipped"].append(instance["instance_id"])
+    report["resolved"] = [instance["instance_id"] for instance in resolved]
+    order = {id(instance): i for i, instance in enumerate(instances)}
+    return sorted(to_run, key=lambda instance: order[id(instance)]), report
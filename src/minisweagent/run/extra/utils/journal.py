@@ -0,0 +1,112 @@
+"""Append-only journal of a batch run, used to resume interrupted runs."""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+FINAL_EXIT_STATUSES = ("Submitted", "LimitsExceeded")
+"""Exit statuses with which the agent itself ended an instance. Everything else (exceptions, interrupted
+instances) is re-run when resuming."""
+
+
+def _is_set(value) -> bool:
+    return value is not None and value == value and str(value).strip() != ""  # value != value for NaN
+
+
+def get_issue_key(issue: dict) -> str:
+    """Key of an issue that is stable across exports of the defect report (缺陷id and 问题编号)."""
+    parts = [str(issue.get(key)).strip() for key in ("defect_id", "problem_number") if _is_set(issue.get(key))]
+    return "|".join(parts) if parts else issue["instance_id"]
+
+
+def get_issue_keys(instance: dict) -> list[str]:
+    """Keys of all issues of an (optionally merged) instance."""
+    return [get_issue_key(issue) for issue in instance.get("issues", [instance])]
+
+
+class RunJournal:
+    def __init__(self, path: Path):
+        """Append-only JSON lines log of the instances that were started and finished in a run.
+
+        Every entry is flushed and synced to disk right away, so that the journal survives crashes.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Worker processes get their own lock, every entry is appended with a single write
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"])
+
+    def _append(self, entry: dict) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as f:
+                f.write(json.dumps(entry | {"time": time.time()}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+        entries = []
+        for line in self.path.read_text().splitlines():
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass  # last line can be truncated if we crashed while writing it
+        return entries
+
+    def write_header(self, **info) -> None:
+        self._append({"event": "run", **info})
+
+    def get_header(self) -> dict:
+        return next((entry for entry in self.read() if entry["event"] == "run"), {})
+
+    def on_instance_start(self, instance: dict) -> None:
+        self._append({"event": "start", "instance_id": instance["instance_id"], "keys": get_issue_keys(instance)})
+
+    def on_instance_end(self, instance: dict, exit_status: str | None, **info) -> None:
+        self._append(
+            {
+                "event": "end",
+                "instance_id": instance["instance_id"],
+                "keys": get_issue_keys(instance),
+                "exit_status": exit_status,
+                **info,
+            }
+        )
+
+    def write_snapshot(self, file_hashes: dict[str, str | None]) -> None:
+        """Record the content hashes of files that will not be edited again in this run."""
+        self._append({"event": "snapshot", "file_hashes": file_hashes})
+
+    def get_file_hashes(self) -> dict[str, str | None]:
+        """Latest snapshotted content hash of every file."""
+        file_hashes = {}
+        for entry in self.read():
+            if entry["event"] == "snapshot":
+                file_hashes |= entry["file_hashes"]
+        return file_hashes
+
+    def get_status(self) -> tuple[dict[str, dict], set[str]]:
+        """Returns the last end entry of every completed issue and the keys of issues that are in flight
+        (started but never finished) or need to be redone.
+        """
+        completed: dict[str, dict] = {}
+        pending: set[str] = set()
+        for entry in self.read():
+            if entry["event"] == "start":
+                pending.update(entry["keys"])
+            elif entry["event"] == "end":
+                for key in entry["keys"]:
+                    if entry["exit_status"] in FINAL_EXIT_STATUSES:
+                        completed[key] = entry
+                        pending.discard(key)
+                    else:
+                        completed.pop(key, None)
+        return completed, pending
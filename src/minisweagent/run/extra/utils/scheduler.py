@@ -0,0 +1,114 @@
+"""Helpers that decide how batch instances are handed to worker threads."""
+
+import concurrent.futures
+import importlib
+import json
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from minisweagent.utils.log import logger
+
+SEVERITY_ORDER = ["致命", "严重", "一般", "建议", "提示"]
+"""Values of 问题级别, most severe first. Unknown levels are scheduled last."""
+
+
+def get_file_key(instance: dict) -> str:
+    """Normalized path of the file an instance edits (falls back to the instance ID if there is none)."""
+    if issue_file := str(instance.get("issue_file") or "").strip():
+        return Path(issue_file).as_posix()
+    return instance["instance_id"]
+
+
+def shard_by_file(instances: list[dict], *, largest_first: bool = True) -> list[list[dict]]:
+    """Group instances into shards so that every file is owned by exactly one shard.
+
+    Instances keep their relative order within a shard. By default, shards are returned largest first,
+    so that files with many issues are started early and small files fill up idle workers at the end.
+    Otherwise, shards are ordered by their first instance, which preserves the order of a scheduler.
+    """
+    shards: dict[str, list[dict]] = {}
+    for instance in instances:
+        shards.setdefault(get_file_key(instance), []).append(instance)
+    if not largest_first:
+        return list(shards.values())
+    return sorted(shards.values(), key=len, reverse=True)
+
+
+def estimate_rule_costs(traj_dirs: list[Path]) -> dict[str, float]:
+    """Average number of model calls per issue of every rule, based on the trajectories in `traj_dirs`."""
+    steps = defaultdict(list)
+    for traj_dir in traj_dirs:
+        for traj_path in Path(traj_dir).rglob("*.traj.json"):
+            try:
+                traj = json.loads(traj_path.read_text())
+            except (OSError, json.JSONDecodeError):
+                continue
+            if rules := traj.get("issue_rules"):
+                for rule_id in rules:
+                    steps[rule_id].append(traj["info"]["model_stats"]["api_calls"] / len(rules))
+    return {rule_id: sum(values) / len(values) for rule_id, values in steps.items()}
+
+
+class FifoScheduler:
+    def __init__(self, **kwargs):
+        """Keeps instances in list order."""
+
+    def order(self, instances: list[dict]) -> list[dict]:
+        return instances
+
+
+class PriorityScheduler:
+    def __init__(self, *, rule_costs: dict[str, float] | None = None, history: list[Path] | None = None):
+        """Schedules the most severe issues (问题级别) first, and the cheapest issues first within a severity.
+
+        The cost of an issue is estimated as the average number of steps of its rule, either given as
+        `rule_costs` or estimated from the trajectories of previous runs in `history`.
+        Rules without history are assumed to cost as much as the average rule.
+        """
+        self.rule_costs = rule_costs if rule_costs is not None else estimate_rule_costs(history or [])
+        self._default_cost = sum(self.rule_costs.values()) / len(self.rule_costs) if self.rule_costs else 0.0
+
+    def get_severity(self, instance: dict) -> int:
+        levels = [str(issue.get("error_level", "")).strip() for issue in instance.get("issues", [instance])]
+        return min(SEVERITY_ORDER.index(level) if level in SEVERITY_ORDER else len(SEVERITY_ORDER) for level in levels)
+
+    def get_cost(self, instance: dict) -> float:
+        issues = instance.get("issues", [instance])
+        return sum(self.rule_costs.get(issue["rule_id"], self._default_cost) for issue in issues)
+
+    def order(self, instances: list[dict]) -> list[dict]:
+        return sorted(instances, key=lambda instance: (self.get_severity(instance), self.get_cost(instance)))
+
+
+_SCHEDULER_MAPPING = {
+    "fifo": "minisweagent.run.extra.utils.scheduler.FifoScheduler",
+    "priority": "minisweagent.run.extra.utils.scheduler.PriorityScheduler",
+}
+
+
+def get_scheduler(spec: str, **kwargs):
+    """Get a scheduler by its short name or full import path. It needs to implement `order(instances)`."""
+    full_path = _SCHEDULER_MAPPING.get(spec, spec)
+    try:
+        module_name, class_name = full_path.rsplit(".", 1)
+        scheduler_class = getattr(importlib.import_module(module_name), class_name)
+    except (ValueError, ImportError, AttributeError):
+        msg = f"Unknown scheduler: {spec} (resolved to {full_path}, available: {_SCHEDULER_MAPPING})"
+        raise ValueError(msg)
+    return scheduler_class(**kwargs)
+
+
+def cancel_after(futures: list[concurrent.futures.Future], seconds: float) -> threading.Timer:
+    """Cancel all futures that have not started after `seconds`, so that a time-capped run only works
+    on the head of the queue. Futures that are already running are not interrupted.
+    """
+
+    def cancel():
+        n_cancelled = sum(future.cancel() for future in futures)
+        logger.warning(f"Time limit of {seconds}s reached, cancelled {n_cancelled} pending job(s)")
+
+    timer = threading.Timer(seconds, cancel)
+    timer.daemon = True
+    timer.start()
+    return timer
@@ -0,0 +1,200 @@
+"""Work queue in a SQLite file, so that several processes or hosts can share the instances of a batch run.
+
+Workers lease an item for a limited time and keep extending the lease while they work on it.
+If a worker dies, its lease expires and the item is handed to the next worker.
+Items of the same group (e.g., project) are leased by a single owner (e.g., host) at a time, so that
+all edits of a project end up in the working copy of one host.
+SQLite relies on file locks, so if the queue lives on a network file system, that file system needs
+to support them (e.g., NFSv4 with locking enabled).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from minisweagent.utils.log import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    exit_status TEXT,
+    result TEXT,
+    item_group TEXT
+)
+"""
+
+_GROUPS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS item_groups (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL
+)
+"""
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        path: Path,
+        *,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3,
+        group_key: str | None = "project_name",
+    ):
+        """Queue of instances, keyed by instance ID.
+
+        Args:
+            path: SQLite database file (created if it does not exist)
+            lease_seconds: How long a worker may hold an item without a heartbeat
+            max_attempts: Items whose lease expired this many times are marked as failed
+                instead of being handed out again
+            group_key: Instance field whose values group the items, see `lease`
+        """
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.group_key = group_key
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute(_GROUPS_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One connection per operation, so that the queue can be used from any thread
+        with closing(sqlite3.connect(self.path, timeout=60, isolation_level=None)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def put(self, instances: list[dict]) -> int:
+        """Enqueue instances in the given order. Instances that are already queued are skipped.
+        Returns the number of new items.
+        """
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO items (id, payload, item_group) VALUES (?, ?, ?)",
+                [
+                    (
+                        instance["instance_id"],
+                        json.dumps(instance, ensure_ascii=False),
+                        instance.get(self.group_key) if self.group_key else None,
+                    )
+                    for instance in instances
+                ],
+            )
+            return cursor.rowcount
+
+    def lease(self, worker: str, *, owner: str | None = None) -> dict | None:
+        """Lease the next pending item (or an item whose lease expired). Returns None if there is none.
+
+        With an `owner`, items of groups that another owner holds are skipped and items of the groups
+        of this owner come first. An owner holds a group as long as it keeps working on its items
+        (plus `lease_seconds`).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE items SET status = 'failed', exit_status = 'LeaseExpired' "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, payload, worker, item_group FROM items "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_until < :now)) AND (:owner IS NULL "
+                "OR item_group IS NULL OR item_group NOT IN "
+                "(SELECT name FROM item_groups WHERE owner != :owner AND lease_until >= :now)) "
+                "ORDER BY item_group IN "
+                "(SELECT name FROM item_groups WHERE owner = :owner AND lease_until >= :now) DESC, rowid LIMIT 1",
+                {"now": now, "owner": owner},
+            ).fetchone()
+            if row is None:
+                return None
+            item_id, payload, previous_worker, item_group = row
+            if owner is not None and item_group is not None:
+                conn.execute(
+                    "INSERT INTO item_groups (name, owner, lease_until) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, lease_until = excluded.lease_until",
+                    (item_group, owner, now + self.lease_seconds),
+                )
+            if previous_worker is not None:
+                logger.warning(f"Lease of {item_id} by {previous_worker} expired, handing it to {worker}")
+            conn.execute(
+                "UPDATE items SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now + self.lease_seconds, item_id),
+            )
+        return json.loads(payload)
+
+    def heartbeat(self, item_id: str, worker: str) -> bool:
+        """Extend the lease of an item. Returns False if the worker lost the lease."""
+        with self._connect() as conn:
+            lease_until = time.time() + self.lease_seconds
+            cursor = conn.execute(
+                "UPDATE items SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (lease_until, item_id, worker),
+            )
+            if cursor.rowcount == 0:
+                return False
+            conn.execute(
+                "UPDATE item_groups SET lease_until = MAX(lease_until, ?) "
+                "WHERE name = (SELECT item_group FROM items WHERE id = ?)",
+                (lease_until, item_id),
+            )
+            return True
+
+    def complete(self, item_id: str, worker: str, exit_status: str | None, result: str) -> None:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET status = 'done', exit_status = ?, result = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ?",
+                (exit_status, result, item_id, worker),
+            )
+            if cursor.rowcount == 0:
+                logger.warning(f"{worker} finished {item_id}, but its lease was taken over by another worker")
+
+    def release(self, item_id: str, worker: str) -> None:
+        """Hand an item back to the queue without result (e.g., if the worker could not start it).
+        Items that were leased `max_attempts` times are marked as failed instead.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, item_id, worker),
+            )
+
+    def get_counts(self) -> dict[str, int]:
+        """Number of items by status (pending, leased, done, failed)."""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall())
+
+    @contextmanager
+    def keep_alive(self, item_id: str, worker: str) -> Iterator[None]:
+        """Send heartbeats for an item in the background while the block runs."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.heartbeat(item_id, worker):
+                    logger.warning(f"{worker} lost the lease of {item_id}")
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,432 @@
+"""Isolated per-worker workspaces for batch runs that edit one shared working directory.
+
+Workspaces come in three kinds (see `WorkspacePool`):
+
+- `overlay`: An overlay file system with the working directory as (read-only) lower layer. Nothing is
+  copied up front, a file is only copied into the workspace when it is first written to. Every command
+  runs in its own (unprivileged) mount namespace in which the overlay is mounted, so commands have to be
+  run through the environment of the workspace (`Workspace.get_environment`).
+- `reflink`: A copy-on-write copy of the working directory, on file systems that support reflinks.
+- `copy`: A full copy of the working directory, if neither of the above is available.
+
+Workspaces are reused across instances. Copies are only made once per worker; afterwards only the
+files that changed in the working directory are copied again. In copies, edits are detected by file
+size and modification time, so both replaced files (`sed -i`, `mv`) and in-place writes (`>>`,
+`cat > file`) are found. After an instance finished, its edits are merged back into the working
+directory as a patch. If it failed, its edits are discarded. If the merge conflicts, the caller is
+expected to requeue the instance behind the others.
+"""
+
+import difflib
+import os
+import shlex
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from minisweagent.environments.local import LocalEnvironment
+from minisweagent.utils.log import logger
+
+WORKSPACE_KINDS = ("auto", "overlay", "reflink", "copy")
+MAX_MERGE_ATTEMPTS = 3
+"""How often an instance is run before a merge conflict is recorded as its exit status"""
+
+
+class MergeConflict(Exception):
+    """Raised when the edits of a workspace cannot be merged back cleanly."""
+
+
+def _copy(src: Path, dst: Path) -> None:
+    if src.is_symlink():
+        dst.symlink_to(src.readlink())
+    else:
+        shutil.copy2(src, dst)
+
+
+def _copy_tree(src: Path, dst: Path, *, reflink: bool) -> None:
+    """Copy a directory, with copy-on-write reflinks if requested (GNU cp)."""
+    dst.mkdir(parents=True, exist_ok=True)
+    if reflink:
+        subprocess.run(["cp", "-a", "--reflink=always", f"{src}/.", str(dst)], check=True, capture_output=True)
+    else:
+        shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
+
+def _supports_reflink(directory: Path) -> bool:
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        (Path(tmp) / "probe").write_bytes(b"probe")
+        try:
+            result = subprocess.run(["cp", "--reflink=always", "probe", "copy"], cwd=tmp, capture_output=True)
+        except OSError:
+            return False
+    return result.returncode == 0
+
+
+_OVERLAY_SCRIPT = (
+    'mount -t overlay overlay -o "userxattr,lowerdir=$1,upperdir=$2,workdir=$3" "$4" && cd "$4" && exec sh -c "$5"'
+)
+
+
+def _wrap_overlay_command(command: str, lower: Path, upper: Path, work: Path, merged: Path) -> str:
+    """Run `command` in the overlay, mounted in a new user and mount namespace (Linux >= 5.11)."""
+    args = ["unshare", "--user", "--map-root-user", "--mount", "sh", "-c", _OVERLAY_SCRIPT, "sh"]
+    return shlex.join([*args, str(lower), str(upper), str(work), str(merged), command])
+
+
+def _supports_overlay(directory: Path) -> bool:
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        lower, upper, work, merged = (Path(tmp) / name for name in ("lower", "upper", "work", "merged"))
+        for path in (lower, upper, work, merged):
+            path.mkdir()
+        (lower / "probe").write_text("lower")
+        command = _wrap_overlay_command("echo upper > probe", lower, upper, work, merged)
+        try:
+            subprocess.run(command, shell=True, capture_output=True, timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return (lower / "probe").read_text() == "lower" and (upper / "probe").is_file()
+
+
+def _get_kind(kind: str, directory: Path) -> str:
+    if kind not in WORKSPACE_KINDS:
+        raise ValueError(f"Unknown workspace kind: {kind}. Supported: {', '.join(WORKSPACE_KINDS)}")
+    if kind != "auto":
+        return kind
+    if _supports_overlay(directory):
+        return "overlay"
+    if _supports_reflink(directory):
+        return "reflink"
+    logger.warning("Neither overlays nor reflinks are supported, every workspace is a full copy")
+    return "copy"
+
+
+def _get_signature(path: Path) -> tuple[int, int, int] | None:
+    """Changes whenever the file is replaced or written to."""
+    try:
+        stat = path.lstat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _diff(rel: str, old: bytes | None, new: bytes | None) -> str:
+    if b"\0" in (old or b"") + (new or b""):
+        return f"Binary files a/{rel} and b/{rel} differ\n"
+    return "".join(
+        difflib.unified_diff(
+            (old or b"").decode(errors="replace").splitlines(keepends=True),
+            (new or b"").decode(errors="replace").splitlines(keepends=True),
+            fromfile=f"a/{rel}" if old is not None else "/dev/null",
+            tofile=f"b/{rel}" if new is not None else "/dev/null",
+        )
+    )
+
+
+def _merge3(current: bytes, base: bytes, new: bytes) -> bytes | None:
+    """Three-way merge with `git merge-file`. Returns None on conflicts."""
+    if shutil.which("git") is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for name, content in [("current", current), ("base", base), ("new", new)]:
+            (path := Path(tmp) / name).write_bytes(content)
+            paths.append(str(path))
+        result = subprocess.run(["git", "merge-file", "-p", "--quiet", *paths], capture_output=True)
+    return result.stdout if result.returncode == 0 else None
+
+
+class Workspace:
+    def __init__(self, source: Path, path: Path, version: int, *, reflink: bool = False):
+        """Copy of `source` at `path`. Use `WorkspacePool` to create workspaces."""
+        self.source = source
+        self.path = path
+        self.version = version
+        """Index into the change log of the pool up to which this workspace is in sync with `source`"""
+        _copy_tree(source, path, reflink=reflink)
+        self._signatures: dict[str, tuple[tuple[int, int, int] | None, tuple[int, int, int] | None]] = {}
+        """Signatures of every synced file in the workspace and in the source directory"""
+        for file in path.rglob("*"):
+            if not file.is_dir() or file.is_symlink():
+                rel = str(file.relative_to(path))
+                self._signatures[rel] = (_get_signature(file), _get_signature(source / rel))
+        self._bases: dict[str, bytes] = {}
+        """Original content of the files whose edits are merged three-way"""
+
+    def sync(self, merged: set[str]) -> None:
+        """Copy the files that were merged into the source directory since the workspace was last synced."""
+        for rel in merged:
+            self.resync(rel)
+
+    def track(self, files: list[str]) -> None:
+        """Remember the content of `files`, so that edits to them can be merged with concurrent edits."""
+        for rel in files:
+            if (file := self.path / rel).is_file() and not file.is_symlink() and rel not in self._bases:
+                self._bases[rel] = file.read_bytes()
+
+    def resync(self, rel: str) -> None:
+        """Replace `rel` with the current version of the file in the source directory."""
+        self._bases.pop(rel, None)
+        self._signatures.pop(rel, None)
+        (file := self.path / rel).unlink(missing_ok=True)
+        if (src := self.source / rel).exists() or src.is_symlink():
+            file.parent.mkdir(parents=True, exist_ok=True)
+            _copy(src, file)
+            self._signatures[rel] = (_get_signature(file), _get_signature(src))
+
+    def reset(self) -> None:
+        """Discard all edits."""
+        for rel in self.get_changes():
+            self.resync(rel)
+
+    def get_changes(self) -> dict[str, bytes | None]:
+        """Files that were created, modified (new content) or deleted (None) in this workspace."""
+        changes: dict[str, bytes | None] = {}
+        seen = set()
+        for file in self.path.rglob("*"):
+            if file.is_dir() or file.is_symlink():
+                continue
+            seen.add(rel := str(file.relative_to(self.path)))
+            if rel in self._bases:
+                if (content := file.read_bytes()) != self._bases[rel]:
+                    changes[rel] = content
+            elif rel not in self._signatures or self._signatures[rel][0] != _get_signature(file):
+                changes[rel] = file.read_bytes()
+        changes |= {rel: None for rel in self._signatures.keys() - seen if not (self.path / rel).is_symlink()}
+        return changes
+
+    def get_environment(self, **kwargs) -> LocalEnvironment:
+        """Environment that runs commands in this workspace."""
+        return LocalEnvironment(**kwargs | {"cwd": str(self.path)})
+
+    def is_unchanged_in_source(self, rel: str, merged_since: set[str]) -> bool:
+        """Whether `rel` is still the same in the source directory as when this workspace was last synced.
+        `merged_since` are the files that the pool merged since then.
+        """
+        src = self.source / rel
+        if rel in self._bases:
+            return src.is_file() and src.read_bytes() == self._bases[rel]
+        if rel not in self._signatures:
+            return not src.exists()
+        return _get_signature(src) == self._signatures[rel][1]
+
+    def get_private_base(self, rel: str) -> bytes | None:
+        return self._bases.get(rel)
+
+
+class _OverlayEnvironment(LocalEnvironment):
+    def __init__(self, workspace: "OverlayWorkspace", **kwargs):
+        super().__init__(**kwargs)
+        self.workspace = workspace
+
+    def execute(self, command: str, cwd: str = "", *, timeout: int | None = None):
+        return super().execute(self.workspace.wrap_command(command), cwd, timeout=timeout)
+
+    async def aexecute(self, command: str, cwd: str = "", *, timeout: int | None = None):
+        return await super().aexecute(self.workspace.wrap_command(command), cwd, timeout=timeout)
+
+
+class OverlayWorkspace:
+    def __init__(self, source: Path, path: Path, version: int):
+        """Overlay of `source`, whose edits are kept in `path`. Use `WorkspacePool` to create workspaces.
+
+        The source directory is the live lower layer: files that were not written to in the workspace
+        always show their current content, so nothing needs to be synced.
+        """
+        self.source = source
+        self.root = path
+        self.upper, self.work, self.path = path / "upper", path / "work", path / "merged"
+        """`path` is the mount point, the workspace is only visible there to commands of its environment"""
+        for directory in (self.upper, self.work, self.path):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self._bases: dict[str, bytes] = {}
+
+    def wrap_command(self, command: str) -> str:
+        return _wrap_overlay_command(command, self.source, self.upper, self.work, self.path)
+
+    def get_environment(self, **kwargs) -> LocalEnvironment:
+        """Environment that runs commands in this workspace."""
+        return _OverlayEnvironment(self, **kwargs | {"cwd": str(self.path)})
+
+    def sync(self, merged: set[str]) -> None:
+        """Discard the leftovers of the previous instance (the source directory always shows through)."""
+        self.reset()
+
+    def track(self, files: list[str]) -> None:
+        """Remember the content of `files`, so that edits to them can be merged with concurrent edits."""
+        for rel in files:
+            if (file := self.source / rel).is_file() and not file.is_symlink() and rel not in self._bases:
+                self._bases[rel] = file.read_bytes()
+
+    def resync(self, rel: str) -> None:
+        """Drop the edits of `rel`, so that the file in the source directory shows through."""
+        self._bases.pop(rel, None)
+        if (file := self.upper / rel).is_dir() and not file.is_symlink():
+            shutil.rmtree(file)
+        else:
+            file.unlink(missing_ok=True)
+
+    def reset(self) -> None:
+        """Discard all edits."""
+        self._bases = {}
+        # The work directory is cleaned up by the kernel on every mount
+        shutil.rmtree(self.upper)
+        self.upper.mkdir()
+
+    def _get_source_files(self, rel: str) -> list[str]:
+        if (src := self.source / rel).is_dir() and not src.is_symlink():
+            return [str(file.relative_to(self.source)) for file in src.rglob("*") if not file.is_dir()]
+        return [rel] if src.exists() or src.is_symlink() else []
+
+    def get_changes(self) -> dict[str, bytes | None]:
+        """Files that were created, modified (new content) or deleted (None) in this workspace."""
+        changes: dict[str, bytes | None] = {}
+        for dirpath, dirnames, filenames in os.walk(self.upper):
+            for name in dirnames + filenames:
+                file = Path(dirpath) / name
+                rel = str(file.relative_to(self.upper))
+                mode = file.lstat().st_mode
+                if stat.S_ISDIR(mode) and _get_opaque_xattr(file) != b"y":
+                    continue
+                # Whiteouts (deleted), opaque directories (replaced) and files that replaced a directory hide
+                # what is in the source directory. Files within opaque directories are visited afterwards.
+                changes |= dict.fromkeys(self._get_source_files(rel))
+                if stat.S_ISREG(mode):
+                    changes[rel] = file.read_bytes()
+        return changes
+
+    def is_unchanged_in_source(self, rel: str, merged_since: set[str]) -> bool:
+        """Whether `rel` is still the same in the source directory as when this workspace was acquired.
+        `merged_since` are the files that the pool merged since then.
+        """
+        if rel in self._bases:
+            return (src := self.source / rel).is_file() and src.read_bytes() == self._bases[rel]
+        return rel not in merged_since
+
+    def get_private_base(self, rel: str) -> bytes | None:
+        return self._bases.get(rel)
+
+
+def _get_opaque_xattr(path: Path) -> bytes | None:
+    try:
+        return os.getxattr(path, "user.overlay.opaque", follow_symlinks=False)
+    except OSError:
+        return None
+
+
+class WorkspacePool:
+    def __init__(self, source: Path | str, root: Path | None = None, kind: str = "auto"):
+        """Hands out isolated workspaces of `source` and merges their edits back.
+
+        `kind` is one of `WORKSPACE_KINDS` (see the module docstring), `auto` picks the cheapest that is
+        supported. Workspaces are reused across instances: When a copy is acquired again, only the files
+        that were changed by merges since it was last synced are copied again.
+        """
+        self.source = Path(source).resolve()
+        self.root = root or self.source.parent / f".{self.source.name}.workspaces"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.kind = _get_kind(kind, self.root)
+        self._idle: list[Workspace | OverlayWorkspace] = []
+        self._changelog: list[str] = []
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+
+    def _create(self, version: int) -> Workspace | OverlayWorkspace:
+        path = Path(tempfile.mkdtemp(dir=self.root))
+        if self.kind == "overlay":
+            return OverlayWorkspace(self.source, path, version)
+        return Workspace(self.source, path, version, reflink=self.kind == "reflink")
+
+    @contextmanager
+    def acquire(self, private_files: list[str] | None = None) -> Iterator[Workspace | OverlayWorkspace]:
+        with self._lock:
+            workspace = self._idle.pop() if self._idle else None
+            version = len(self._changelog)
+        if workspace is None:
+            workspace = self._create(version)
+        else:
+            workspace.sync(set(self._changelog[workspace.version : version]))
+            workspace.version = version
+        workspace.track(private_files or [])
+        try:
+            yield workspace
+        except BaseException:
+            # The edits of a failed instance must not leak into the next instance that uses the workspace
+            try:
+                workspace.reset()
+            except OSError as e:
+                logger.warning(f"Discarding workspace {workspace.path} that could not be reset: {e}")
+                shutil.rmtree(getattr(workspace, "root", workspace.path), ignore_errors=True)
+                raise
+            self._release(workspace)
+            raise
+        self._release(workspace)
+
+    def _release(self, workspace: Workspace | OverlayWorkspace) -> None:
+        with self._lock:
+            self._idle.append(workspace)
+
+    def merge(self, workspace: Workspace | OverlayWorkspace) -> str:
+        """Apply the edits of `workspace` to the source directory. Returns the applied patch.
+
+        Either all or none of the edits are applied. Raises `MergeConflict` if a file was changed in
+        the source directory since the workspace was synced and the changes cannot be combined.
+        """
+        changes = workspace.get_changes()
+        with self._merge_lock:
+            merged_since = set(self._changelog[workspace.version :])
+            merged: dict[str, bytes | None] = {}
+            for rel, new in changes.items():
+                src = self.source / rel
+                current = src.read_bytes() if src.is_file() else None
+                if current == new:
+                    continue
+                if workspace.is_unchanged_in_source(rel, merged_since):
+                    merged[rel] = new
+                elif (
+                    (base := workspace.get_private_base(rel)) is not None
+                    and current is not None
+                    and new is not None
+                    and (content := _merge3(current, base, new)) is not None
+                ):
+                    merged[rel] = content
+                else:
+                    for changed in changes:
+                        workspace.resync(changed)
+                    raise MergeConflict(f"Edits to {rel} conflict with changes merged by another worker")
+            patch = []
+            for rel, content in sorted(merged.items()):
+                src = self.source / rel
+                patch.append(_diff(rel, src.read_bytes() if src.is_file() else None, content))
+                if content is None:
+                    src.unlink(missing_ok=True)
+                    continue
+                src.parent.mkdir(parents=True, exist_ok=True)
+                (tmp := src.with_name(f".{src.name}.merge")).write_bytes(content)
+                if src.exists():
+                    shutil.copymode(src, tmp)
+                tmp.replace(src)
+            with self._lock:
+                self._changelog.extend(merged)
+            for rel in changes:
+                workspace.resync(rel)
+        return "".join(patch)
+
+    def run(self, fct: Callable[[Workspace | OverlayWorkspace], Any], *, private_files: list[str] | None = None):
+        """Call `fct` with a workspace and merge its edits back. Returns `(fct(...), patch)`.
+
+        Raises `MergeConflict` if the edits cannot be merged. The caller should then requeue the instance
+        behind the others, so that it is run again on top of the edits of the conflicting instances.
+        """
+        with self.acquire(private_files) as workspace:
+            result = fct(workspace)
+            return result, self.merge(workspace)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
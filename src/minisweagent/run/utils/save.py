@@ -56,6 +56,8 @@ def save_traj(
     } | kwargs
     if agent is not None:
         data["info"]["model_stats"]["api_calls"] = agent.model.n_calls
+        if get_stats := getattr(agent.model, "get_stats", None):
+            data["info"]["model_stats"] |= get_stats()
         data["messages"] = agent.messages
         data["info"]["config"] = {
             "agent": _asdict(agent.config),
@@ -0,0 +1,62 @@
+import asyncio
+
+from minisweagent.agents.async_default import AsyncDefaultAgent
+from minisweagent.environments.local import LocalEnvironment
+from minisweagent.models.test_models import DeterministicModel
+
+
+def _agent(outputs: list[str], **kwargs) -> AsyncDefaultAgent:
+    return AsyncDefaultAgent(model=DeterministicModel(outputs=outputs), env=LocalEnvironment(), **kwargs)
+
+
+async def test_successful_completion():
+    agent = _agent(
+        [
+            "I'll echo a message\n```bash\necho 'hello world'\n```",
+            "No action",
+            "Now finishing\n```bash\necho 'COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT'\necho 'done'\n```",
+        ]
+    )
+    exit_status, result = await agent.run("Echo hello world then finish")
+    assert (exit_status, result) == ("Submitted", "done\n")
+    assert "hello world" in agent.messages[3]["content"]
+    assert agent.messages[5]["content"] == "Please always provide EXACTLY ONE action in triple backticks."
+    assert len(agent.messages) == 8
+
+
+async def test_timeout_and_step_limit():
+    agent = _agent(["```bash\nsleep 5\n```", "```bash\necho 'step2'\n```"], step_limit=1)
+    agent.env.config.timeout = 1
+    exit_status, _ = await agent.run("Sleep")
+    assert exit_status == "LimitsExceeded"
+    assert "timed out" in agent.messages[3]["content"]
+
+
+async def test_agents_run_concurrently():
+    agents = [
+        _agent(["```bash\nsleep 0.5\n```", "```bash\necho COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT\n```"])
+        for _ in range(20)
+    ]
+    start = asyncio.get_running_loop().time()
+    results = await asyncio.gather(*(agent.run("Sleep then finish") for agent in agents))
+    assert results == [("Submitted", "")] * 20
+    assert asyncio.get_running_loop().time() - start < 5
+
+
+async def test_multiple_actions():
+    agent = _agent(
+        ["```bash\necho one\n```\n```bash\nexit 3\n```\n```bash\necho two\n```"], max_actions=3, step_limit=1
+    )
+    exit_status, _ = await agent.run("Run several actions")
+    assert exit_status == "LimitsExceeded"
+    assert "[Action 2 of 3, returncode 3]" in agent.messages[3]["content"]
+    assert "two" not in agent.messages[3]["content"].replace("echo two", "")
+
+
+async def test_timeout_keeps_outputs_of_earlier_actions():
+    agent = _agent(["```bash\necho one\n```\n```bash\nsleep 5\n```"], max_actions=2, step_limit=1)
+    agent.env.config.timeout = 1
+    exit_status, _ = await agent.run("Run several actions")
+    assert exit_status == "LimitsExceeded"
+    assert "[Action 1 of 2, returncode 0]\n$ echo one\none\n" in agent.messages[3]["content"]
+    assert "[Action 2 of 2, timed out]" in agent.messages[3]["content"]
@@ -1,7 +1,9 @@
 import pytest
+from jinja2 import UndefinedError
 
-from minisweagent.agents.default import DefaultAgent, NonTerminatingException
+from minisweagent.agents.default import DefaultAgent, NonTerminatingException, compile_template
 from minisweagent.environments.local import LocalEnvironment
+from minisweagent.models.openai_compatible_model import OpenAICompatibleModel
 from minisweagent.models.test_models import DeterministicModel
 
 
@@ -248,3 +250,87 @@ def test_render_template_model_stats():
     result = agent.render_template(template)
 
     assert result == "Calls: 2, Cost: 2.0"
+
+
+class CountingEnvironment(LocalEnvironment):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.n_template_var_calls = 0
+
+    def get_template_vars(self):
+        self.n_template_var_calls += 1
+        return super().get_template_vars()
+
+
+def test_render_template_compiles_once():
+    template = "Output: {{output}}"
+    assert compile_template(template) is compile_template(template)
+    assert compile_template(template)[1] == {"output"}
+
+
+def test_render_template_collects_vars_only_if_needed():
+    env = CountingEnvironment()
+    agent = DefaultAgent(model=DeterministicModel(outputs=[]), env=env)
+    assert agent.render_template("Output: {{output}}", output="hi") == "Output: hi"
+    assert env.n_template_var_calls == 0
+    assert (
+        agent.render_template("{{output}} on {{system}}", output="hi") == f"hi on {env.get_template_vars()['system']}"
+    )
+    assert env.n_template_var_calls == 2
+
+
+def test_render_template_undefined_variable():
+    agent = DefaultAgent(model=DeterministicModel(outputs=[]), env=LocalEnvironment())
+    with pytest.raises(UndefinedError):
+        agent.render_template("{{does_not_exist}}")
+
+
+def test_multiple_actions():
+    agent = DefaultAgent(
+        model=DeterministicModel(
+            outputs=[
+                "```bash\necho one\n```\n```bash\necho two\n```",
+                "```bash\necho three\n```\n```bash\nfalse\n```\n```bash\necho never\n```",
+                "```bash\necho four\n```\n```bash\necho COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT\necho done\n```",
+            ]
+        ),
+        env=LocalEnvironment(),
+        max_actions=3,
+        action_observation_template="{{output.output}}",
+    )
+    assert agent.run("Run several actions") == ("Submitted", "done\n")
+    assert (
+        "[Action 1 of 2, returncode 0]\n$ echo one\none\n\n[Action 2 of 2, returncode 0]\n$ echo two\ntwo\n"
+        in (agent.messages[3]["content"])
+    )
+    assert "[Action 2 of 3, returncode 1]" in agent.messages[5]["content"]
+    assert "[Action 2 failed, the remaining 1 action(s) were not run]" in agent.messages[5]["content"]
+    assert "never" not in agent.messages[5]["content"].replace("echo never", "")
+
+
+def test_timeout_keeps_outputs_of_earlier_actions():
+    agent = DefaultAgent(
+        model=DeterministicModel(outputs=["```bash\necho one\n```\n```bash\nsleep 5\n```\n```bash\necho two\n```"]),
+        env=LocalEnvironment(timeout=1),
+        max_actions=3,
+        step_limit=1,
+    )
+    assert agent.run("Run several actions")[0] == "LimitsExceeded"
+    observation = agent.messages[3]["content"]
+    assert "[Action 1 of 3, returncode 0]\n$ echo one\none\n" in observation
+    assert "[Action 2 of 3, timed out]\n$ sleep 5\n" in observation
+    assert "the remaining 1 action(s) were not run" in observation
+
+
+def test_multiple_actions_are_rejected_by_default():
+    agent = DefaultAgent(model=DeterministicModel(outputs=[]), env=LocalEnvironment())
+    with pytest.raises(NonTerminatingException):
+        agent.parse_action({"content": "```bash\necho one\n```\n```bash\necho two\n```"})
+
+
+def test_multiple_actions_need_the_whole_stream():
+    model = OpenAICompatibleModel(model_name="m", api_base="http://localhost", api_key="key", stream=True)
+    with pytest.raises(ValueError, match="stream_stop_pattern"):
+        DefaultAgent(model=model, env=LocalEnvironment(), max_actions=3)
+    model.config.stream_stop_pattern = ""
+    DefaultAgent(model=model, env=LocalEnvironment(), max_actions=3)
@@ -0,0 +1,64 @@
+import pytest
+
+from minisweagent.agents.default import DefaultAgent
+from minisweagent.agents.history import CompactingHistory, get_history_processor
+from minisweagent.environments.local import LocalEnvironment
+from minisweagent.models.test_models import DeterministicModel
+
+
+def make_messages(n_turns: int, observation: str) -> list[dict]:
+    messages = [{"role": "system", "content": "system"}, {"role": "user", "content": "task"}]
+    for i in range(n_turns):
+        messages.append({"role": "assistant", "content": f"step {i}"})
+        messages.append({"role": "user", "content": observation})
+    return messages
+
+
+def test_short_history_is_unchanged():
+    messages = make_messages(3, "x" * 10_000)
+    assert CompactingHistory(keep_last_turns=3)(messages) is messages
+
+
+def test_stale_observations_are_shortened():
+    messages = make_messages(5, "a" * 100 + "b" * 5_000 + "c" * 100)
+    result = CompactingHistory(keep_last_turns=2, max_observation_chars=1000, head_chars=100, tail_chars=100)(messages)
+    assert result[:2] == messages[:2]
+    assert result[-4:] == messages[-4:]
+    for message in result[3:-4:2]:
+        assert message["content"] == "a" * 100 + "\n[... 5000 characters elided ...]\n" + "c" * 100
+    assert [m["content"] for m in result[2:-4:2]] == ["step 0", "step 1", "step 2"]
+    assert messages[3]["content"] == "a" * 100 + "b" * 5_000 + "c" * 100  # full history is kept
+
+
+def test_token_budget_elides_oldest_messages_first():
+    messages = make_messages(10, "x" * 1_000)
+    processor = CompactingHistory(keep_last_turns=2, max_observation_chars=10_000, max_tokens=1_000)
+    result = processor(messages)
+    assert result[2]["content"].startswith("[Earlier message elided")
+    assert result[-4:] == messages[-4:]
+    assert sum(len(str(m["content"])) for m in result) < 4 * 1_000
+    assert processor(messages) == result
+
+
+def test_get_history_processor():
+    assert get_history_processor({}) is None
+    assert isinstance(get_history_processor({"history_class": "compact", "keep_last_turns": 1}), CompactingHistory)
+    with pytest.raises(ValueError, match="Unknown history class"):
+        get_history_processor({"history_class": "does.not.Exist"})
+
+
+def test_agent_queries_compacted_history():
+    agent = DefaultAgent(
+        model=DeterministicModel(
+            outputs=["```bash\nprintf '%.0sx' $(seq 3000)\n```" for _ in range(3)]
+            + ["```bash\necho 'COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT'\n```"]
+        ),
+        env=LocalEnvironment(),
+        history_processor={"keep_last_turns": 1, "max_observation_chars": 1000},
+    )
+    sent = []
+    query = agent.model.query
+    agent.model.query = lambda messages, **kwargs: sent.append(messages) or query(messages, **kwargs)
+    assert agent.run("task")[0] == "Submitted"
+    assert "characters elided" in sent[-1][3]["content"]
+    assert "characters elided" not in agent.messages[3]["content"]
@@ -0,0 +1,61 @@
+import yaml
+
+from minisweagent.agents.default import DefaultAgent
+from minisweagent.agents.observations import ObservationStore
+from minisweagent.config import get_config_path
+from minisweagent.environments.local import LocalEnvironment
+from minisweagent.models.test_models import DeterministicModel
+
+OUTPUT = "".join(f"line {i}\n" for i in range(1, 1001))
+
+
+def test_page_command():
+    store = ObservationStore()
+    handle = store.put(OUTPUT)
+    assert store.execute(f"show_output {handle} 10 12") == {
+        "output": f"Lines 10-12 of 1000 of {handle}:\nline 10\nline 11\nline 12\n",
+        "returncode": 0,
+    }
+    assert store.execute(f"show_output {handle} 999")["output"].endswith("line 999\nline 1000\n")
+    assert store.execute("show_output missing 1 2")["returncode"] == 1
+    assert store.execute("cat file.txt") is None
+
+
+def test_page_is_truncated():
+    store = ObservationStore(max_page_chars=100)
+    output = store.execute(f"show_output {store.put(OUTPUT)}")["output"]
+    assert len(output) == 100
+    assert output.endswith("[Page truncated, please request fewer lines]\n")
+
+
+def test_agent_pages_through_large_output():
+    config = yaml.safe_load(get_config_path("openharmony.yaml").read_text())["agent"]
+    agent = DefaultAgent(
+        model=DeterministicModel(
+            outputs=[
+                "```bash\nseq 1 5000\n```",
+                "```bash\nshow_output out1 2500 2502\n```",
+                "```bash\necho 'COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT'\n```",
+            ]
+        ),
+        env=LocalEnvironment(),
+        **config,
+    )
+    assert agent.run("task")[0] == "Submitted"
+    assert "show_output out1 100 200" in agent.messages[3]["content"]
+    assert len(agent.messages[3]["content"]) < 6000
+    assert "Lines 2500-2502 of 5000 of out1:\n2500\n2501\n2502" in agent.messages[5]["content"]
+
+
+def test_page_command_is_passed_to_the_observation_template():
+    agent = DefaultAgent(
+        model=DeterministicModel(
+            outputs=["```bash\necho hi\n```", "```bash\necho 'COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT'\n```"]
+        ),
+        env=LocalEnvironment(),
+        page_command="page",
+        action_observation_template="{{ page_command }}",
+    )
+    agent.get_template_vars = lambda: {}  # the page command must not depend on the full template variables
+    assert agent.run("task")[0] == "Submitted"
+    assert agent.messages[3]["content"] == "page"
@@ -19,12 +19,10 @@ def reset_global_stats():
     """
     with _global_stats_lock:
         # Reset at start
-        GLOBAL_MODEL_STATS._cost = 0.0  # noqa: protected-access
-        GLOBAL_MODEL_STATS._n_calls = 0  # noqa: protected-access
+        GLOBAL_MODEL_STATS.reset()
         yield
         # Reset at end to clean up
-        GLOBAL_MODEL_STATS._cost = 0.0  # noqa: protected-access
-        GLOBAL_MODEL_STATS._n_calls = 0  # noqa: protected-access
+        GLOBAL_MODEL_STATS.reset()
 
 
 def get_test_data(trajectory_name: str) -> dict[str, list[str]]:
@@ -199,3 +199,12 @@ def test_local_environment_shell_features():
     result = env.execute("echo $(echo 'nested')")
     assert result["returncode"] == 0
     assert "nested" in result["output"]
+
+
+async def test_local_environment_aexecute(tmp_path):
+    """Test that commands can be awaited and time out like blocking ones."""
+    env = LocalEnvironment(cwd=str(tmp_path), env={"GREETING": "hello"})
+    result = await env.aexecute("echo $GREETING; pwd; exit 3")
+    assert result == {"output": f"hello\n{tmp_path}\n", "returncode": 3}
+    with pytest.raises(subprocess.TimeoutExpired):
+        await env.aexecute("sleep 5", timeout=1)
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from minisweagent.models import query_async
+from minisweagent.models.extra.cache import CachedModel
+from minisweagent.models.extra.roulette import InterleavingModel
+from minisweagent.models.openai_compatible_model import OpenAICompatibleModel
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status, body = 200, {"choices": [{"message": {"content": f"echo {payload['messages'][-1]['content']}"}}]}
+        if payload["model"] == "missing":
+            status, body = 404, {"error": "model not found"}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_openai_compatible_aquery(api_base):
+    model = OpenAICompatibleModel(model_name="m", api_base=api_base, api_key="key", rate_limit={"rpm": 600})
+
+    async def run():
+        return await asyncio.gather(*(model.aquery([{"role": "user", "content": str(i)}]) for i in range(5)))
+
+    responses = asyncio.run(run())
+    assert [response["content"] for response in responses] == [f"echo {i}" for i in range(5)]
+    assert model.n_calls == 5
+
+
+def test_openai_compatible_aquery_does_not_retry_client_errors(api_base):
+    model = OpenAICompatibleModel(model_name="missing", api_base=api_base, api_key="key")
+    with pytest.raises(requests.HTTPError):
+        asyncio.run(model.aquery([{"role": "user", "content": "x"}]))
+
+
+def test_interleaving_model_aquery():
+    model = InterleavingModel(
+        model_kwargs=[
+            {"model_class": "deterministic", "model_name": "a", "outputs": ["a1", "a2"]},
+            {"model_class": "deterministic", "model_name": "b", "outputs": ["b1"]},
+        ]
+    )
+
+    async def run():
+        return [await model.aquery([]) for _ in range(3)]
+
+    responses = asyncio.run(run())
+    assert [(r["content"], r["model_name"]) for r in responses] == [("a1", "a"), ("b1", "b"), ("a2", "a")]
+    assert model.n_calls == 3
+
+
+def test_cached_model_aquery(tmp_path):
+    config = {"model_class": "deterministic", "model_name": "d", "outputs": ["first", "second"]}
+    model = CachedModel(model_kwargs=config, cache_dir=str(tmp_path))
+    messages = [{"role": "user", "content": "hi"}]
+    assert asyncio.run(model.aquery(messages))["content"] == "first"
+    assert asyncio.run(model.aquery(messages))["content"] == "first"
+    assert model.n_hits == 1
+
+
+def test_query_async_falls_back_to_thread():
+    class SyncOnlyModel:
+        def query(self, messages: list[dict], **kwargs) -> dict:
+            return {"content": "out", "thread": threading.current_thread()}
+
+    response = asyncio.run(query_async(SyncOnlyModel(), []))
+    assert response["content"] == "out"
+    assert response["thread"] is not threading.main_thread()
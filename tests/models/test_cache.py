@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+from minisweagent.models.extra.cache import CachedModel, CacheMiss
+
+
+def _model(tmp_path, outputs: list[str], **kwargs) -> CachedModel:
+    return CachedModel(
+        model_kwargs={"model_class": "deterministic", "model_name": "det", "outputs": outputs},
+        cache_dir=str(tmp_path),
+        **kwargs,
+    )
+
+
+def test_read_through_then_replay(tmp_path):
+    messages = [{"role": "user", "content": "hi"}]
+    model = _model(tmp_path, ["first", "second"])
+    assert model.query(messages)["content"] == "first"
+    assert model.query(messages)["content"] == "first"
+    assert model.query(messages + [{"role": "user", "content": "again"}])["content"] == "second"
+    assert (model.n_calls, model.n_hits, model.model.n_calls) == (3, 1, 2)
+
+    replay = _model(tmp_path, [], mode="replay")
+    assert replay.query(messages)["content"] == "first"
+    with pytest.raises(CacheMiss):
+        replay.query([{"role": "user", "content": "new"}])
+
+    record = _model(tmp_path, ["overwritten"], mode="record")
+    assert record.query(messages)["content"] == "overwritten"
+    assert replay.query(messages)["content"] == "overwritten"
+
+
+def test_key_depends_on_model_and_kwargs(tmp_path):
+    messages = [{"role": "user", "content": "hi"}]
+    model = _model(tmp_path, [])
+    other = CachedModel(
+        model_kwargs={"model_class": "deterministic", "model_name": "other", "outputs": []}, cache_dir=str(tmp_path)
+    )
+    assert model.get_key(messages) != other.get_key(messages)
+    assert model.get_key(messages) != model.get_key(messages, temperature=0)
+    assert model.get_key(messages) == _model(tmp_path, ["x"]).get_key([{"content": "hi", "role": "user"}])
+
+
+def test_eviction_by_age_and_size(tmp_path):
+    model = _model(tmp_path, ["a" * 1000, "b" * 1000, "c" * 1000])
+    paths = []
+    for i in range(3):
+        model.query([{"role": "user", "content": str(i)}])
+        paths.append(model._get_path(model.get_key([{"role": "user", "content": str(i)}])))
+    os.utime(paths[0], (time.time() - 40 * 86400,) * 2)
+    os.utime(paths[1], (time.time() - 60,) * 2)
+    model.evict()
+    assert [path.exists() for path in paths] == [False, True, True]
+    model.config.max_size_mb = 1500 / 1024 / 1024
+    model.evict()
+    assert [path.exists() for path in paths] == [False, False, True]
+
+
+def test_cache_is_evicted_once_per_process_and_every_n_writes(tmp_path, monkeypatch):
+    evictions = []
+    monkeypatch.setattr(CachedModel, "evict", lambda self: evictions.append(self))
+    monkeypatch.setattr("minisweagent.models.extra.cache._EVICTION_INTERVAL", 2)
+    models = [_model(tmp_path, [str(i)]) for i in range(3)]
+    assert len(evictions) == 1
+    for i, model in enumerate(models):
+        model.query([{"role": "user", "content": str(i)}])
+    assert len(evictions) == 2  # the writes of all models count
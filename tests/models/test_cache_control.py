@@ -1,4 +1,4 @@
-from minisweagent.models.utils.cache_control import set_cache_control
+from minisweagent.models.utils.cache_control import get_prefix_stable_messages, set_cache_control
 
 
 def test_set_cache_control_basic():
@@ -58,3 +58,27 @@ def test_set_cache_control_offset_deprecated():
 
     assert result_with_offset == expected_output
     assert result_without_offset == expected_output
+
+
+def test_set_cache_control_does_not_modify_input():
+    marked = set_cache_control([{"role": "user", "content": "First"}, {"role": "user", "content": "Second"}])
+    input_messages = [*marked, {"role": "assistant", "content": "Third"}]
+    result = set_cache_control(input_messages)
+    assert "cache_control" in input_messages[1]["content"][0]
+    assert result[1] == {"role": "user", "content": [{"type": "text", "text": "Second"}]}
+    assert result[0] is input_messages[0]
+    assert result[2]["content"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_get_prefix_stable_messages():
+    messages = [
+        {"content": "system", "role": "system"},
+        {"role": "user", "content": [{"type": "text", "text": "task", "cache_control": {"type": "ephemeral"}}]},
+        {"role": "assistant", "content": "step", "timestamp": 123.4},
+    ]
+    assert get_prefix_stable_messages(messages) == [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": "task"},
+        {"role": "assistant", "content": "step"},
+    ]
+    assert list(get_prefix_stable_messages(messages)[0]) == ["role", "content"]
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from minisweagent.models.utils.concurrency import AdaptiveConcurrencyLimiter
+
+
+def _call(limiter: AdaptiveConcurrencyLimiter, status_code: int = 200, duration: float = 0.0):
+    with limiter.slot() as call:
+        time.sleep(duration)
+        call.status_code = status_code
+
+
+def test_disabled_limiter_does_not_track_calls():
+    limiter = AdaptiveConcurrencyLimiter()
+    _call(limiter)
+    assert not limiter.enabled
+    assert limiter.in_flight == 0 and limiter.latency_ewma is None
+
+
+def test_limit_grows_additively_and_halves_on_throttling():
+    limiter = AdaptiveConcurrencyLimiter(8, latency_tolerance=float("inf"))
+    assert limiter.limit == 4
+    for _ in range(4):
+        _call(limiter)
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+    for _ in range(100):
+        _call(limiter)
+    assert limiter.limit == 8
+    _call(limiter, 429)
+    assert limiter.limit == 4 and limiter.n_throttled == 1
+    with pytest.raises(ConnectionError):
+        with limiter.slot():
+            raise ConnectionError
+    assert limiter.limit >= 1 and limiter.in_flight == 0
+
+
+def test_slot_blocks_at_limit():
+    limiter = AdaptiveConcurrencyLimiter(1)
+    max_in_flight = 0
+
+    def worker():
+        nonlocal max_in_flight
+        with limiter.slot() as call:
+            max_in_flight = max(max_in_flight, limiter.in_flight)
+            time.sleep(0.01)
+            call.status_code = 200
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max_in_flight == 1 and limiter.in_flight == 0
+
+
+async def test_cancelled_calls_release_their_slot():
+    limiter = AdaptiveConcurrencyLimiter(4)
+    limit = limiter.limit
+
+    async def call():
+        async with limiter.aslot():
+            await asyncio.sleep(10)
+
+    for _ in range(3):
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert limiter.in_flight == 0 and limiter.limit == limit
+    with pytest.raises(KeyboardInterrupt):
+        with limiter.slot():
+            raise KeyboardInterrupt
+    assert limiter.in_flight == 0 and limiter.limit == limit
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from minisweagent.agents.default import DefaultAgent
+from minisweagent.environments.local import LocalEnvironment
+from minisweagent.models.extra.hedge import HedgedModel, LatencyTracker
+from minisweagent.models.utils.cancel import raise_if_cancelled
+from minisweagent.run.utils.save import save_traj
+
+
+def _hedged_model(name: str, primary_outputs: list[str], hedge_outputs: list[str], **kwargs) -> HedgedModel:
+    return HedgedModel(
+        model_kwargs={"model_class": "deterministic", "model_name": name, "outputs": primary_outputs},
+        hedge_model_kwargs={"model_class": "deterministic", "model_name": f"{name}-alt", "outputs": hedge_outputs},
+        **kwargs,
+    )
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(50) is None
+    for latency in range(1, 101):
+        tracker.add(float(latency))
+    assert tracker.percentile(50) == 51
+    assert tracker.percentile(95) == 96
+    assert tracker.percentile(100) == 100
+    assert tracker.percentile(95, min_samples=200) is None
+
+
+def test_fast_primary_is_not_hedged():
+    model = _hedged_model("hedge-fast", ["primary"], ["hedge"], initial_delay=5)
+    response = model.query([])
+    assert response["content"] == "primary"
+    assert not response["hedged"]
+    assert model.get_stats()["hedge"] == pytest.approx(
+        {"n_queries": 1, "n_hedged": 0, "n_hedge_wins": 0, "hedge_rate": 0.0, "n_abandoned": 0, "delay": 5}
+    )
+
+
+def test_slow_primary_is_hedged():
+    model = _hedged_model("hedge-slow", ["/sleep0.5", "primary"], ["hedge"], initial_delay=0.05, min_delay=0)
+    response = model.query([])
+    assert response["content"] == "hedge"
+    assert response["hedged"] and response["hedge_winner"] == "hedge"
+    assert model.n_hedge_wins == 1 and model.get_stats()["hedge"]["hedge_rate"] == 1.0
+    time.sleep(0.6)  # the primary request finishes in the background and reports its own latency
+    assert model.latencies.percentile(100) >= 0.5
+
+
+def test_query_cancels_loser():
+    model = _hedged_model("hedge-cancel", ["unused"], ["hedge"], initial_delay=0.05, min_delay=0)
+    stopped = threading.Event()
+
+    def read_stream(messages, **kwargs):
+        try:
+            for _ in range(100):  # chunks of a slow streamed response
+                raise_if_cancelled()
+                time.sleep(0.05)
+        finally:
+            stopped.set()
+        return {"content": "primary"}
+
+    model.model.query = read_stream
+    response = model.query([])
+    assert response["content"] == "hedge"
+    assert stopped.wait(1)
+    assert model.get_stats()["hedge"]["n_abandoned"] == 1
+
+
+def test_running_loser_does_not_share_its_model():
+    model = _hedged_model("hedge-busy", ["/sleep0.3", "primary"], ["hedge", "hedge2"], initial_delay=0.05, min_delay=0)
+    assert model.query([])["content"] == "hedge"
+    # The first primary request is still running, the second one gets its own model instance (and is slow again)
+    assert model.query([])["content"] == "hedge2"
+
+
+def test_hedge_falls_back_to_other_request_on_error():
+    model = _hedged_model("hedge-error", ["/sleep0.2", "primary"], [], initial_delay=0.05, min_delay=0)
+    response = model.query([])  # the hedge request fails (no outputs left), the primary one still succeeds
+    assert response["content"] == "primary" and response["hedged"]
+
+
+def test_aquery_cancels_loser():
+    model = _hedged_model("hedge-async", ["/sleep0.3", "primary"], ["hedge"], initial_delay=0.05, min_delay=0)
+    response = asyncio.run(model.aquery([]))
+    assert response["content"] == "hedge" and response["hedged"]
+    assert model.latencies.percentile(100) >= 0.05  # the cancelled primary was at least as slow as the delay
+
+
+def test_hedge_stats_are_saved_in_trajectory(tmp_path):
+    model = _hedged_model("hedge-traj", ["primary"], ["hedge"])
+    model.query([])
+    agent = DefaultAgent(model, LocalEnvironment())
+    save_traj(agent, tmp_path / "traj.json", print_path=False)
+    model_stats = json.loads((tmp_path / "traj.json").read_text())["info"]["model_stats"]
+    assert model_stats["api_calls"] == 1
+    assert model_stats["hedge"]["n_queries"] == 1
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from minisweagent.models.openai_compatible_model import OpenAICompatibleModel
+from minisweagent.models.utils import http
+from minisweagent.models.utils.http import SessionPool
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status, body = 200, {"choices": [{"message": {"content": f"echo {payload['messages'][-1]['content']}"}}]}
+        if payload["model"] == "missing":
+            status, body = 404, {"error": "model not found"}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_session_pool_reuses_connections(api_base):
+    pool = SessionPool(pool_size=2)
+    for _ in range(5):
+        response = pool.post(
+            api_base,
+            f"{api_base}/chat/completions",
+            data=json.dumps({"model": "m", "messages": [{"content": "hi"}]}),
+            timeout=5,
+        )
+        assert response.json()["choices"][0]["message"]["content"] == "echo hi"
+    assert pool.get_stats() == {api_base: {"requests": 5, "connections": 1}}
+    pool.close()
+    assert pool.get_stats() == {}
+
+
+def test_openai_compatible_model_uses_shared_session(api_base):
+    model = OpenAICompatibleModel(model_name="m", api_base=api_base, api_key="key")
+    assert model.query([{"role": "user", "content": "hello"}])["content"] == "echo hello"
+    with pytest.raises(requests.HTTPError):
+        OpenAICompatibleModel(model_name="missing", api_base=api_base, api_key="key").query(
+            [{"role": "user", "content": "x"}]
+        )
+
+
+def _chat_data(content: str) -> str:
+    return json.dumps({"model": "m", "messages": [{"content": content}]})
+
+
+def test_http2_session(api_base):
+    pytest.importorskip("h2")
+    pool = SessionPool()
+    response = pool.post(
+        api_base, f"{api_base}/chat/completions", http2=True, headers={}, data=_chat_data("hi"), timeout=5
+    )
+    assert response.json()["choices"][0]["message"]["content"] == "echo hi"
+    assert pool.get_stats() == {api_base: {"requests": 1, "connections": None}}
+    pool.close()
+
+
+def test_async_post_uses_one_client_per_event_loop(api_base):
+    pytest.importorskip("httpx")
+    pool = SessionPool()
+
+    async def post(close: bool):
+        response = await pool.apost(
+            api_base, f"{api_base}/chat/completions", headers={}, data=_chat_data("hi"), timeout=5
+        )
+        if close:
+            await pool.aclose()
+        return response.json()["choices"][0]["message"]["content"]
+
+    assert asyncio.run(post(close=False)) == "echo hi"
+    assert len(pool._async_clients) == 1
+    # The client of the first (closed) loop is not reused, but dropped
+    assert asyncio.run(post(close=True)) == "echo hi"
+    assert pool._async_clients == {}
+    assert pool.get_stats() == {api_base: {"requests": 2, "connections": None}}
+
+
+async def test_async_post_without_httpx(api_base, monkeypatch):
+    monkeypatch.setattr(http, "httpx", None)
+    pool = SessionPool()
+    response = await pool.apost(api_base, f"{api_base}/chat/completions", headers={}, data=_chat_data("hi"), timeout=5)
+    assert response.json()["choices"][0]["message"]["content"] == "echo hi"
+    assert pool.get_stats() == {api_base: {"requests": 1, "connections": 1}}
+
+
+def test_session_stats_are_logged(api_base, caplog):
+    pool = SessionPool()
+    pool.post(api_base, f"{api_base}/chat/completions", data=_chat_data("hi"), timeout=5)
+    with caplog.at_level("INFO", logger="minisweagent"):
+        pool.log_stats()
+    assert f"HTTP session {api_base}: 1 request(s) over 1 connection(s)" in caplog.text
@@ -0,0 +1,80 @@
+import dataclasses
+import os
+
+import pytest
+
+from minisweagent.models.model_config_loader import GLOBAL_MODEL_REGISTRY, ModelRegistry, load_model_config
+
+MODELS_YAML = """
+models:
+  chat:
+    api_base: "https://example.com/v1"
+    api_key_env: "TEST_MODELS_KEY"
+    model_name: "chat-v1"
+    model_kwargs:
+      temperature: 0.0
+    rate_limit:
+      rpm: 60
+"""
+
+
+@pytest.fixture
+def models_file(tmp_path, monkeypatch):
+    path = tmp_path / "models.yaml"
+    path.write_text(MODELS_YAML)
+    monkeypatch.setenv("MSWEA_MODELS_FILE", str(path))
+    monkeypatch.setenv("TEST_MODELS_KEY", "secret")
+    return path
+
+
+def test_registry_parses_once(models_file):
+    registry = ModelRegistry()
+    entry = registry.get("chat")
+    assert entry.model_name == "chat-v1" and entry.api_base == "https://example.com/v1"
+    assert registry.get("chat") is entry
+    assert registry.list_models() == ["chat"]
+    with pytest.raises(ValueError, match="not found"):
+        registry.get("missing")
+
+
+def test_registry_reloads_changed_file(models_file):
+    registry = ModelRegistry()
+    registry.get("chat")
+    models_file.write_text(MODELS_YAML.replace("chat-v1", "chat-v2"))
+    stat = models_file.stat()
+    os.utime(models_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert registry.get("chat").model_name == "chat-v2"
+
+
+def test_entries_are_frozen(models_file):
+    entry = ModelRegistry().get("chat")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        entry.api_base = "https://other.com"  # type: ignore[misc]
+    with pytest.raises(TypeError):
+        entry.model_kwargs["temperature"] = 1.0  # type: ignore[index]
+
+
+def test_load_model_config_returns_copies(models_file):
+    config = load_model_config("chat")
+    assert config == {
+        "model_name": "chat-v1",
+        "api_base": "https://example.com/v1",
+        "api_key": "secret",
+        "model_kwargs": {"temperature": 0.0},
+        "api_key_env": "TEST_MODELS_KEY",
+        "rate_limit": {"rpm": 60},
+    }
+    config["model_kwargs"]["temperature"] = 1.0
+    assert GLOBAL_MODEL_REGISTRY.get("chat").model_kwargs["temperature"] == 0.0
+
+
+def test_load_model_config_requires_api_key(models_file, monkeypatch):
+    monkeypatch.delenv("TEST_MODELS_KEY")
+    with pytest.raises(ValueError, match="TEST_MODELS_KEY"):
+        load_model_config("chat")
+
+
+def test_missing_models_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("MSWEA_MODELS_FILE", str(tmp_path / "missing.yaml"))
+    with pytest.raises(FileNotFoundError):
+        ModelRegistry().get("chat")
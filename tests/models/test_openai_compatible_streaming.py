@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from minisweagent.models.openai_compatible_model import OpenAICompatibleModel
+
+CHUNKS = ["THOUGHT: 修复", " it\n```bash\necho", " hi\n```", "\nMore text that we do not want to wait for"]
+
+
+class _StreamingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert payload["stream"] is True
+        assert payload["stream_options"] == {"include_usage": True}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._send_chunk(b": keep-alive\n\n")
+            for i, chunk in enumerate(CHUNKS if payload["model"] == "m" else CHUNKS[:2]):
+                if i == 3:
+                    time.sleep(2)
+                delta = {"content": chunk, "reasoning_content": "think" if i == 0 else None}
+                event = {"id": "c1", "model": payload["model"], "choices": [{"index": 0, "delta": delta}]}
+                self._send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            self._send_chunk(b'data: {"id": "c1", "choices": [], "usage": {"total_tokens": 3}}\n\ndata: [DONE]\n\n')
+            self._send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_stream_stops_after_complete_action(api_base):
+    model = OpenAICompatibleModel(model_name="m", api_base=api_base, api_key="key", stream=True)
+    start = time.time()
+    output = model.query([{"role": "user", "content": "hi"}])
+    assert time.time() - start < 1.5
+    assert output["content"] == "THOUGHT: 修复 it\n```bash\necho hi\n```"
+    message = output["extra"]["response"]["choices"][0]
+    assert message["finish_reason"] == "action_complete"
+    assert message["message"]["reasoning_content"] == "think"
+    usage = output["extra"]["response"]["usage"]
+    assert usage["estimated"] and usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+    assert model.get_stats()["prompt_tokens"] == usage["prompt_tokens"]
+
+
+def test_stream_without_action_is_read_to_the_end(api_base):
+    model = OpenAICompatibleModel(model_name="incomplete", api_base=api_base, api_key="key", stream=True)
+    output = model.query([{"role": "user", "content": "hi"}])
+    assert output["content"] == "THOUGHT: 修复 it\n```bash\necho"
+    assert output["extra"]["response"]["usage"] == {"total_tokens": 3}
+
+
+def test_stream_without_stop_pattern_is_read_to_the_end(api_base):
+    model = OpenAICompatibleModel(model_name="m", api_base=api_base, api_key="key", stream=True, stream_stop_pattern="")
+    assert model.query([{"role": "user", "content": "hi"}])["content"] == "".join(CHUNKS)
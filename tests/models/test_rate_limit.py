@@ -0,0 +1,55 @@
+import threading
+import time
+
+from minisweagent.models.utils.rate_limit import RateLimiter, TokenBucket, estimate_tokens, get_rate_limiter
+
+
+def test_token_bucket_allows_burst_then_blocks():
+    bucket = TokenBucket(per_minute=120)  # 2 per second
+    assert all(bucket.reserve(1) == 0 for _ in range(120))
+    assert 0.4 < bucket.reserve(1) <= 0.5
+
+
+def test_rate_limiter_blocks_just_long_enough():
+    limiter = RateLimiter(rpm=600)  # 10 per second
+    limiter.requests.tokens = 0
+    start = time.monotonic()
+    wait = limiter.acquire(0)
+    assert 0 < wait <= 0.1
+    assert time.monotonic() - start >= wait
+
+
+def test_rate_limiter_is_shared_across_threads():
+    limiter = RateLimiter(rpm=120)  # 2 per second after the burst
+    waits = []
+    for _ in range(118):
+        limiter.acquire(0)
+    threads = [threading.Thread(target=lambda: waits.append(limiter.acquire(0))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(waits)[:2] == [0.0, 0.0]
+    assert sorted(waits)[2] > 0.3
+    assert sorted(waits)[3] > sorted(waits)[2] + 0.3
+
+
+def test_record_usage_corrects_token_estimate():
+    limiter = RateLimiter(tpm=6000)
+    assert limiter.acquire(6000) == 0
+    limiter.record_usage(6000, 100)
+    assert limiter.acquire(5000) == 0
+    assert limiter.tokens.reserve(1000) > 0.5
+
+
+def test_estimate_tokens():
+    assert estimate_tokens([{"role": "user", "content": "a" * 400}]) > 100
+    assert estimate_tokens([{"role": "user", "content": "修" * 400}]) > 300
+
+
+def test_get_rate_limiter_is_keyed_by_api_base_and_key():
+    a = get_rate_limiter("https://example.com/v1/", "KEY_A", rpm=10)
+    assert get_rate_limiter("https://example.com/v1", "KEY_A", rpm=20) is a
+    assert get_rate_limiter("https://example.com/v1", "KEY_B", rpm=10) is not a
+    assert a.requests.capacity == 10
+    assert a.tokens is None
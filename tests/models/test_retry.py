@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from minisweagent.models.utils.cancel import CallCancelled
+from minisweagent.models.utils.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_circuit_breaker,
+    get_retry_after,
+    get_status_code,
+    is_retryable,
+    retry_model_call,
+)
+
+
+def _http_error(status_code: int, headers: dict | None = None) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"HTTP {status_code}", response=response)
+
+
+@pytest.mark.parametrize(
+    ("exc", "expected"),
+    [
+        (_http_error(429), True),
+        (_http_error(503), True),
+        (_http_error(400), False),
+        (_http_error(401), False),
+        (requests.Timeout(), True),
+        (requests.ConnectionError(), True),
+        (ValueError("API key not found"), False),
+        (RuntimeError(), True),
+        (KeyboardInterrupt(), False),
+        (CallCancelled(), False),
+    ],
+)
+def test_is_retryable(exc, expected):
+    assert is_retryable(exc) is expected
+
+
+def test_classification_follows_causes():
+    exc = RuntimeError("API error")
+    exc.__cause__ = _http_error(502)
+    assert get_status_code(exc) == 502
+    assert is_retryable(exc)
+    assert not is_retryable(exc, non_retryable=(RuntimeError,))
+
+
+def test_get_retry_after():
+    assert get_retry_after(_http_error(429, {"Retry-After": "7"})) == 7
+    date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+    assert 25 < get_retry_after(_http_error(503, {"Retry-After": date})) <= 30
+    assert get_retry_after(_http_error(503)) is None
+
+
+class _FlakyModel:
+    def __init__(self, errors: list[BaseException]):
+        self.errors = errors
+        self.n_attempts = 0
+
+    @retry_model_call(lambda self: f"flaky-{id(self)}", min_wait=0.01, max_wait=0.01, max_attempts=3)
+    def _query(self) -> str:
+        self.n_attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retries_transient_errors():
+    model = _FlakyModel([_http_error(503), requests.Timeout()])
+    assert model._query() == "ok"
+    assert model.n_attempts == 3
+
+
+def test_does_not_retry_client_errors():
+    model = _FlakyModel([_http_error(400)])
+    with pytest.raises(requests.HTTPError):
+        model._query()
+    assert model.n_attempts == 1
+
+
+def test_honors_retry_after():
+    model = _FlakyModel([_http_error(429, {"Retry-After": "0.3"})])
+    start = time.monotonic()
+    assert model._query() == "ok"
+    assert time.monotonic() - start >= 0.3
+
+
+def test_retry_policy_of_instance():
+    model = _FlakyModel([_http_error(503), _http_error(503)])
+    model.retry_policy = RetryPolicy(max_attempts=1, fail_fast=True)
+    with pytest.raises(requests.HTTPError):
+        model._query()
+    assert model.n_attempts == 1
+    breaker = get_circuit_breaker(f"flaky-{id(model)}")
+    breaker.open_until = time.monotonic() + 60
+    with pytest.raises(CircuitOpenError):
+        model._query()
+    assert model.n_attempts == 1
+
+
+def test_circuit_breaker_pauses_callers_until_probe_succeeds():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    breaker.record(failed=True)
+    assert not breaker.is_open
+    breaker.record(failed=True)
+    assert breaker.is_open and breaker.n_opened == 1
+
+    waited = []
+    threads = [threading.Thread(target=lambda: waited.append(breaker.wait())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.4)
+    # One caller probes the endpoint, the other one waits for its result
+    assert len(waited) == 1 and waited[0] >= 0.15
+    breaker.record(failed=False)
+    for thread in threads:
+        thread.join()
+    assert len(waited) == 2 and not breaker.is_open
+
+
+def test_circuit_breaker_backs_off_after_failed_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record(failed=True)
+    breaker.wait()
+    breaker.record(failed=True)
+    assert breaker.is_open and breaker.n_opened == 2
+    assert breaker.reset_timeout == pytest.approx(0.2)
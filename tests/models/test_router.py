@@ -0,0 +1,91 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from minisweagent.models.extra.router import EndpointStats, RouterModel
+
+
+def _router(name: str, outputs: dict[str, list[str]], **kwargs) -> RouterModel:
+    return RouterModel(
+        model_kwargs=[
+            {"model_class": "deterministic", "model_name": f"{name}-{endpoint}", "outputs": endpoint_outputs}
+            for endpoint, endpoint_outputs in outputs.items()
+        ],
+        **kwargs,
+    )
+
+
+def test_endpoint_stats_score():
+    stats = EndpointStats(ewma_alpha=0.5)
+    assert stats.get_score() == 0.0
+    with stats.track():
+        pass
+    assert stats.latency_ewma is not None and stats.error_rate == 0.0
+    with pytest.raises(RuntimeError), stats.track():
+        raise RuntimeError
+    assert stats.error_rate == 0.5 and stats.n_errors == 1 and stats.in_flight == 0
+    stats.latency_ewma = 1.0
+    assert stats.get_score() == pytest.approx(2.0)
+    stats.in_flight = 1
+    assert stats.get_score() == pytest.approx(4.0)
+
+
+def test_routes_to_fastest_endpoint():
+    router = _router("route", {"slow": ["s"] * 10, "fast": ["f"] * 10})
+    slow, fast = router.endpoint_stats
+    slow.latency_ewma, fast.latency_ewma = 10.0, 1.0
+    assert [router.query([])["model_name"] for _ in range(3)] == ["route-fast"] * 3
+    # Calls in flight make an endpoint less attractive
+    fast.in_flight = 20
+    assert router.query([])["model_name"] == "route-slow"
+
+
+def test_fails_over_to_next_endpoint():
+    router = _router("failover", {"broken": [], "ok": ["ok"]})
+    broken, ok = router.endpoint_stats
+    broken.latency_ewma, ok.latency_ewma = 1.0, 2.0
+    response = router.query([])
+    assert response["content"] == "ok" and response["model_name"] == "failover-ok"
+    assert broken.n_errors == 1 and broken.error_rate > 0
+    assert router.get_stats()["router"]["#failover-ok"]["n_calls"] == 1
+
+
+def test_raises_if_all_endpoints_fail():
+    router = _router("all-broken", {"a": [], "b": []}, round_wait=0.01)
+    with pytest.raises(IndexError):
+        router.query([])
+    assert [stats.n_errors for stats in router.endpoint_stats] == [3, 3]  # one per round
+
+
+def test_aquery():
+    router = _router("async", {"a": ["a"], "b": ["b"]})
+    router.endpoint_stats[0].latency_ewma, router.endpoint_stats[1].latency_ewma = 1.0, 2.0
+    assert asyncio.run(router.aquery([]))["model_name"] == "async-a"
+    assert router.n_calls == 1
+
+
+def test_dead_endpoint_fails_over_promptly():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead_api_base = f"http://127.0.0.1:{sock.getsockname()[1]}/v1"
+    router = RouterModel(
+        model_kwargs=[
+            {
+                "model_class": "minisweagent.models.openai_compatible_model.OpenAICompatibleModel",
+                "model_name": "dead",
+                "api_base": dead_api_base,
+                "api_key": "key",
+            },
+            {"model_class": "deterministic", "model_name": "alive", "outputs": ["ok"] * 10},
+        ]
+    )
+    dead, alive = router.endpoint_stats
+    dead.latency_ewma, alive.latency_ewma = 0.1, 0.2
+    router.rank_models = lambda: list(zip(router.models, router.endpoint_stats))  # always try the dead one first
+    start = time.monotonic()
+    for _ in range(10):  # also after the circuit breaker of the dead endpoint opened
+        assert router.query([{"role": "user", "content": "hi"}])["model_name"] == "alive"
+    assert time.monotonic() - start < 5
+    assert dead.n_errors == 10
@@ -0,0 +1,87 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from minisweagent.models.openai_compatible_model import OpenAICompatibleModel
+from minisweagent.models.utils.stats import GlobalModelStats, ModelCounters, parse_usage, subtract_counters
+
+
+@pytest.mark.parametrize(
+    ("usage", "expected"),
+    [
+        (None, (0, 0, 0)),
+        ({"prompt_tokens": 100, "completion_tokens": 20}, (100, 20, 0)),
+        (
+            {"prompt_tokens": 100, "completion_tokens": 20, "prompt_tokens_details": {"cached_tokens": 64}},
+            (100, 20, 64),
+        ),
+        ({"prompt_tokens": 100, "completion_tokens": 20, "prompt_cache_hit_tokens": 80}, (100, 20, 80)),
+        (SimpleNamespace(prompt_tokens=5, completion_tokens=1, prompt_tokens_details=None), (5, 1, 0)),
+    ],
+)
+def test_parse_usage(usage, expected):
+    assert parse_usage(usage) == expected
+
+
+def test_add_from_many_threads():
+    stats = GlobalModelStats()
+
+    def work(model_name: str):
+        for _ in range(1000):
+            stats.add(0.5, model_name=model_name, usage={"prompt_tokens": 10, "completion_tokens": 2}, latency=1.0)
+
+    threads = [threading.Thread(target=work, args=(f"model-{i % 2}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.n_calls == 8000
+    assert stats.cost == 4000
+    summary = stats.get_summary()
+    assert summary["prompt_tokens"] == 80_000 and summary["completion_tokens"] == 16_000
+    assert summary["models"]["model-0"]["n_calls"] == 4000
+    stats.reset()
+    assert stats.n_calls == 0 and stats.get_summary()["models"] == {}
+
+
+def test_latency_percentiles():
+    stats = GlobalModelStats()
+    assert stats.get_total().get_latency_percentile(50) is None
+    for _ in range(90):
+        stats.add(latency=1.0)
+    for _ in range(10):
+        stats.add(latency=20.0)
+    total = stats.get_total()
+    assert 1.0 <= total.get_latency_percentile(50) < 1.2
+    assert 1.0 <= total.get_latency_percentile(90) < 1.2
+    assert 20.0 <= total.get_latency_percentile(95) < 24.0
+
+
+def test_subtract_and_merge_counters():
+    worker, parent = GlobalModelStats(), GlobalModelStats()
+    worker.add(model_name="a", usage={"prompt_tokens": 3})
+    reported = worker.get_counters()
+    parent.merge(reported)
+    worker.add(model_name="a", usage={"prompt_tokens": 4}, latency=2.0)
+    worker.add(model_name="b")
+    delta = subtract_counters(worker.get_counters(), reported)
+    assert delta["a"].n_calls == 1 and delta["a"].prompt_tokens == 4 and delta["b"].n_calls == 1
+    assert subtract_counters(worker.get_counters(), worker.get_counters()) == {}
+    parent.merge(delta)
+    assert parent.get_counters() == worker.get_counters()
+    assert isinstance(parent.get_total(), ModelCounters)
+
+
+def test_cache_hit_rate_in_trajectory_stats():
+    model = OpenAICompatibleModel(model_name="m", api_base="http://localhost", api_key="key")
+    assert model.get_stats()["cache_hit_rate"] is None
+    for cached in (0, 90):
+        usage = {"prompt_tokens": 100, "completion_tokens": 5, "prompt_cache_hit_tokens": cached}
+        model._parse_response({"choices": [{"message": {"content": "hi"}}], "usage": usage})
+    assert model.get_stats() == {
+        "prompt_tokens": 200,
+        "completion_tokens": 10,
+        "cached_tokens": 90,
+        "cache_hit_rate": 0.45,
+    }
@@ -1,6 +1,7 @@
 import pytest
 import yaml
 
+import minisweagent.models
 from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager, _shorten_str
 
 
@@ -134,3 +135,11 @@ def test_concurrent_operations(manager):
 
     assert manager.n_completed == 10
     assert sum(len(instances) for instances in manager._instances_by_exit_status.values()) == 10
+
+
+def test_model_stats_text(manager, reset_global_stats):
+    assert manager._get_model_stats_text() == "0 calls"
+    minisweagent.models.GLOBAL_MODEL_STATS.add(usage={"prompt_tokens": 100, "completion_tokens": 10}, latency=2.0)
+    text = manager._get_model_stats_text()
+    assert text.startswith("1 calls, ")
+    assert "tok/s" in text and "p50 2.3s, p95 2.3s" in text
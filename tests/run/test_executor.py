@@ -0,0 +1,56 @@
+import json
+import threading
+
+import pytest
+
+from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.executor import get_executor, get_output_file_lock
+
+
+def _job(instance_id: str, progress_manager, output_path) -> None:
+    progress_manager.on_instance_start(instance_id)
+    progress_manager.update_instance_status(instance_id, "Step 1")
+    with get_output_file_lock():
+        data = json.loads(output_path.read_text()) if output_path.exists() else {}
+        output_path.write_text(json.dumps(data | {instance_id: "done"}))
+    progress_manager.on_instance_end(instance_id, "Submitted")
+
+
+_held_lock = threading.Lock()
+
+
+def _acquire_held_lock() -> bool:
+    return _held_lock.acquire(timeout=1)
+
+
+@pytest.mark.parametrize("executor_type", ["thread", "process"])
+def test_executor_reports_progress_to_parent(tmp_path, executor_type):
+    progress_manager = RunBatchProgressManager(8)
+    output_path = tmp_path / "results.json"
+    with get_executor(executor_type, 4, progress_manager) as (executor, worker_progress_manager):
+        futures = [executor.submit(_job, f"i-{i}", worker_progress_manager, output_path) for i in range(8)]
+        for future in futures:
+            future.result()
+    assert progress_manager.n_completed == 8
+    assert sorted(json.loads(output_path.read_text())) == sorted(f"i-{i}" for i in range(8))
+
+
+def test_workers_do_not_inherit_locks_of_the_parent():
+    with _held_lock, get_executor("process", 1, RunBatchProgressManager(1)) as (executor, _):
+        assert executor.submit(_acquire_held_lock).result()
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError, match="Unknown executor"):
+        with get_executor("fiber", 1, RunBatchProgressManager(0)):
+            pass
+
+
+def test_process_executor_rejects_adaptive_concurrency():
+    from typer.testing import CliRunner
+
+    from minisweagent.run.extra.openharmony_batch import app
+
+    result = CliRunner().invoke(app, ["--executor", "process", "--adaptive-concurrency"])
+    assert isinstance(result.exception, ValueError)
+    assert "thread executor" in str(result.exception)
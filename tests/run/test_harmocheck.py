@@ -0,0 +1,93 @@
+import json
+import time
+
+from minisweagent.run.extra.harmocheck import process_shard
+from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+from minisweagent.run.extra.utils.journal import RunJournal
+from minisweagent.run.extra.utils.workspace import MergeConflict, WorkspacePool
+
+
+def _instance(i: int) -> dict:
+    return {
+        "instance_id": f"harmocheck__proj-{i}",
+        "project_name": "proj",
+        "list_index": i,
+        "issue_index": i,
+        "issue_file": "app.c",
+        "rule_id": "G.AST.01",
+        "description": f"description {i}",
+        "line_number": i,
+        "code_content": f"code {i}",
+        "error_level": "严重",
+    }
+
+
+def test_no_new_issues_are_started_after_the_deadline(tmp_path):
+    (tmp_path / "app.c").write_text("int a;\n")
+    config = {
+        "model": {
+            "model_name": "deterministic",
+            "model_class": "deterministic",
+            "outputs": ["```bash\nsleep 0.3\n```", "```bash\necho COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT\n```"],
+        }
+    }
+    journal = RunJournal(tmp_path / "traj" / "journal.jsonl")
+    shard = [_instance(0), _instance(1)]
+    deadline = time.time() + 0.1
+    process_shard(shard, config, RunBatchProgressManager(2), tmp_path, tmp_path / "traj", None, journal, deadline)
+    assert [entry["instance_id"] for entry in journal.read() if entry["event"] == "start"] == ["harmocheck__proj-0"]
+    assert journal.get_file_hashes().keys() == {"app.c"}
+
+
+def test_unknown_grouping_is_rejected_before_the_backup(tmp_path, monkeypatch):
+    from typer.testing import CliRunner
+
+    from minisweagent.run.extra.harmocheck import app
+
+    monkeypatch.setattr("pathlib.Path.home", lambda: tmp_path / "home")
+    (tmp_path / "src").mkdir()
+    issue = {"缺陷描述": "Use ASSERT", "规范": "G.AST.01", "代码行数": 1, "文件路径": "app.c", "问题级别": "严重"}
+    (tmp_path / "ISSUE_DESP.js").write_text(json.dumps([issue]))
+    args = ["-i", str(tmp_path / "src"), "-d", str(tmp_path / "ISSUE_DESP.js"), "--group-by", "project"]
+    result = CliRunner().invoke(app, args)
+    assert result.exception is None
+    assert not (tmp_path / "home").exists()
+
+
+def test_conflicting_issues_are_requeued(tmp_path, monkeypatch):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.c").write_text("int a;\n")
+    config = {
+        "model": {
+            "model_name": "deterministic",
+            "model_class": "deterministic",
+            "outputs": ["```bash\necho COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT\n```"],
+        }
+    }
+    workspaces = WorkspacePool(tmp_path / "src", kind="copy")
+    merge = workspaces.merge
+
+    def conflict_once(workspace):
+        if not requeued:
+            raise MergeConflict("Edits to app.c conflict with changes merged by another worker")
+        return merge(workspace)
+
+    monkeypatch.setattr(workspaces, "merge", conflict_once)
+    requeued = []
+    journal = RunJournal(tmp_path / "traj" / "journal.jsonl")
+    progress_manager = RunBatchProgressManager(2)
+    shard = [_instance(0), _instance(1)]
+    process_shard(
+        shard,
+        config,
+        progress_manager,
+        tmp_path / "src",
+        tmp_path / "traj",
+        workspaces,
+        journal,
+        requeue=lambda instance: requeued.append(instance) or True,
+    )
+    assert requeued == [shard[0]]
+    assert progress_manager.n_completed == 1
+    assert [entry["instance_id"] for entry in journal.read() if entry["event"] == "end"] == ["harmocheck__proj-1"]
+    assert not (tmp_path / "traj" / "harmocheck__proj-0.traj.json").exists()
@@ -0,0 +1,89 @@
+from minisweagent.run.extra.utils.incremental import diff_defects, get_file_hashes, select_changed_defects
+from minisweagent.run.extra.utils.journal import RunJournal
+
+
+def _instance(i: int, issue_file: str, code: str, defect_id: str = "", problem_number: str = "") -> dict:
+    return {
+        "instance_id": f"harmocheck__proj-{i}",
+        "issue_file": issue_file,
+        "rule_id": "G.AST.01",
+        "code_content": code,
+        "defect_id": defect_id,
+        "problem_number": problem_number,
+    }
+
+
+def test_diff_defects_matches_by_id_then_snippet():
+    old = [_instance(0, "a.c", "int a;", "d0"), _instance(1, "a.c", "int b;"), _instance(2, "b.c", "int c;")]
+    new = [_instance(0, "b.c", "int  c;"), _instance(1, "a.c", "long a;", "d0"), _instance(2, "a.c", "int z;")]
+    matched, added, resolved = diff_defects(old, new)
+    assert [(previous["instance_id"], instance["instance_id"]) for previous, instance in matched] == [
+        ("harmocheck__proj-2", "harmocheck__proj-0"),
+        ("harmocheck__proj-0", "harmocheck__proj-1"),
+    ]
+    assert [instance["instance_id"] for instance in added] == ["harmocheck__proj-2"]
+    assert [instance["instance_id"] for instance in resolved] == ["harmocheck__proj-1"]
+
+
+def test_diff_defects_with_duplicate_ids_across_files():
+    old = [_instance(i, f"{i % 3}.c", f"int x{i // 3};", f"d{i // 3}", f"p-{i}") for i in range(6)]
+    matched, added, resolved = diff_defects(old, old)
+    assert [(previous["instance_id"], instance["instance_id"]) for previous, instance in matched] == [
+        (instance["instance_id"], instance["instance_id"]) for instance in old
+    ]
+    assert added == [] and resolved == []
+    # A new export renumbers the defects: 缺陷id, file and snippet tell the defects apart
+    new = [instance | {"problem_number": f"q-{5 - i}"} for i, instance in enumerate(old)][::-1]
+    matched, added, resolved = diff_defects(old, new)
+    assert [(previous["instance_id"], instance["instance_id"]) for previous, instance in matched] == [
+        (instance["instance_id"], instance["instance_id"]) for instance in new
+    ]
+    assert added == [] and resolved == []
+
+
+def test_unfixed_defect_with_shared_id_is_not_skipped(tmp_path):
+    old = [_instance(0, "a.c", "x", "d0", "p-0"), _instance(1, "b.c", "x", "d0", "p-1")]
+    journal = RunJournal(tmp_path / "journal.jsonl")
+    journal.on_instance_end(old[0], "Submitted", file_hashes=get_file_hashes(tmp_path, old[0]))
+    journal.on_instance_end(old[1], "LimitsExceeded", file_hashes=get_file_hashes(tmp_path, old[1]))
+    to_run, report = select_changed_defects(old, old, journal, tmp_path)
+    assert [instance["instance_id"] for instance in to_run] == ["harmocheck__proj-1"]
+    assert report["unfixed"] == ["harmocheck__proj-1"] and report["skipped"] == ["harmocheck__proj-0"]
+
+
+def test_only_new_and_changed_defects_are_selected(tmp_path):
+    for name in ["a.c", "b.c", "c.c"]:
+        (tmp_path / name).write_text(f"{name}\n")
+    old = [_instance(0, "a.c", "x", "d0"), _instance(1, "b.c", "y", "d1"), _instance(2, "c.c", "z", "d2")]
+    journal = RunJournal(tmp_path / "journal.jsonl")
+    for instance, exit_status in zip(old, ["Submitted", "Submitted", "LimitsExceeded"]):
+        journal.on_instance_end(instance, exit_status, file_hashes=get_file_hashes(tmp_path, instance))
+    (tmp_path / "b.c").write_text("changed\n")
+    new = [_instance(i, instance["issue_file"], "", instance["defect_id"]) for i, instance in enumerate(old)]
+    new.append(_instance(3, "d.c", "w", "d3"))
+    to_run, report = select_changed_defects(new, old, journal, tmp_path)
+    assert [instance["instance_id"] for instance in to_run] == [f"harmocheck__proj-{i}" for i in (1, 2, 3)]
+    assert report == {
+        "new": ["harmocheck__proj-3"],
+        "regressed": ["harmocheck__proj-1"],
+        "unfixed": ["harmocheck__proj-2"],
+        "skipped": ["harmocheck__proj-0"],
+        "resolved": [],
+    }
+
+
+def test_later_edits_of_the_same_run_are_not_regressions(tmp_path):
+    (tmp_path / "a.c").write_text("original\n")
+    old = [_instance(0, "a.c", "x", "d0"), _instance(1, "a.c", "y", "d1")]
+    journal = RunJournal(tmp_path / "journal.jsonl")
+    for i, instance in enumerate(old):
+        (tmp_path / "a.c").write_text(f"fixed {i}\n")
+        journal.on_instance_end(instance, "Submitted", file_hashes=get_file_hashes(tmp_path, instance))
+    journal.write_snapshot(get_file_hashes(tmp_path, old[0]))
+    to_run, report = select_changed_defects(old, old, journal, tmp_path)
+    assert to_run == [] and report["skipped"] == ["harmocheck__proj-0", "harmocheck__proj-1"]
+    (tmp_path / "a.c").write_text("edited by hand\n")
+    assert select_changed_defects(old, old, journal, tmp_path)[1]["regressed"] == [
+        "harmocheck__proj-0",
+        "harmocheck__proj-1",
+    ]
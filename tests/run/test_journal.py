@@ -0,0 +1,44 @@
+import pytest
+
+from minisweagent.run.extra.utils.journal import RunJournal, get_issue_key, get_issue_keys
+
+
+@pytest.mark.parametrize(
+    ("issue", "expected"),
+    [
+        ({"instance_id": "i-0", "defect_id": "d1", "problem_number": "42"}, "d1|42"),
+        ({"instance_id": "i-0", "defect_id": "d1", "problem_number": float("nan")}, "d1"),
+        ({"instance_id": "i-0", "defect_id": "", "problem_number": None}, "i-0"),
+        ({"instance_id": "i-0"}, "i-0"),
+    ],
+)
+def test_get_issue_key(issue, expected):
+    assert get_issue_key(issue) == expected
+
+
+def test_journal_status(tmp_path):
+    journal = RunJournal(tmp_path / "run" / "journal.jsonl")
+    assert journal.get_header() == {}
+    journal.write_header(input_dir="/src", backup_path="/backup")
+    issues = [{"instance_id": f"i-{i}", "defect_id": f"d{i}", "problem_number": i} for i in range(4)]
+    grouped = issues[2] | {"instance_id": "i-2+1", "issues": issues[2:]}
+    assert get_issue_keys(grouped) == ["d2|2", "d3|3"]
+    for instance in [issues[0], issues[1], grouped]:
+        journal.on_instance_start(instance)
+    journal.on_instance_end(issues[0], "Submitted")
+    journal.on_instance_end(grouped, "HTTPError")
+    with journal.path.open("a") as f:
+        f.write('{"event": "end", "keys": ["d1|1"]')  # truncated by a crash
+    completed, pending = journal.get_status()
+    assert list(completed) == ["d0|0"]
+    assert pending == {"d1|1", "d2|2", "d3|3"}
+    assert journal.get_header()["backup_path"] == "/backup"
+    journal.on_instance_start(grouped)
+    journal.on_instance_end(grouped, "LimitsExceeded")
+    completed, pending = RunJournal(journal.path).get_status()
+    assert {key: entry["exit_status"] for key, entry in completed.items()} == {
+        "d0|0": "Submitted",
+        "d2|2": "LimitsExceeded",
+        "d3|3": "LimitsExceeded",
+    }
+    assert pending == {"d1|1"}
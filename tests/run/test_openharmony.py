@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pytest
+
+from minisweagent.run.extra.openharmony_single import format_openharmony_issue, group_openharmony_instances
+
+
+def _instance(i: int, issue_file: str, rule_id: str, line_number: int) -> dict:
+    return {
+        "instance_id": f"openharmony__proj-{i}",
+        "project_name": "proj",
+        "list_index": i,
+        "issue_index": i,
+        "issue_file": issue_file,
+        "rule_id": rule_id,
+        "description": f"description {i}",
+        "line_number": line_number,
+        "code_content": f"code {i}",
+        "error_level": "严重",
+    }
+
+
+@pytest.fixture
+def instances():
+    return [
+        _instance(0, "app.c", "G.AST.01", 30),
+        _instance(1, "app.c", "G.AST.01", 10),
+        _instance(2, "main.c", "G.AST.01", 5),
+        _instance(3, "./app.c", "G.FMT.02", 20),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("group_by", "expected_ids"),
+    [
+        ("none", ["openharmony__proj-0", "openharmony__proj-1", "openharmony__proj-2", "openharmony__proj-3"]),
+        ("file", ["openharmony__proj-0+2", "openharmony__proj-2"]),
+        ("rule", ["openharmony__proj-0+1", "openharmony__proj-2", "openharmony__proj-3"]),
+    ],
+)
+def test_group_openharmony_instances(instances, group_by, expected_ids):
+    assert [inst["instance_id"] for inst in group_openharmony_instances(instances, group_by)] == expected_ids
+
+
+def test_group_openharmony_instances_rejects_unknown_grouping(instances):
+    with pytest.raises(ValueError, match="Unknown grouping"):
+        group_openharmony_instances(instances, "project")
+
+
+def test_format_grouped_issue_with_irregular_line_numbers(instances):
+    for instance, line_number in zip(instances, [float("nan"), "12-14", "", 7.0]):
+        instance["line_number"] = line_number
+    task = format_openharmony_issue(group_openharmony_instances(instances, "file")[0])
+    assert task.index("Line nan") < task.index("Line 7.0") < task.index("Line 12-14")
+
+
+def test_format_grouped_issue_lists_all_lines(instances):
+    group = group_openharmony_instances(instances, "file")[0]
+    task = format_openharmony_issue(group)
+    assert "3 issues in one file" in task
+    assert task.index("Line 10 [G.AST.01]") < task.index("Line 20 [G.FMT.02]") < task.index("Line 30 [G.AST.01]")
+    assert "G.AST.01\nG.FMT.02" in task
+    assert "List Index: 3" in task
+    task = format_openharmony_issue(group_openharmony_instances(instances, "rule")[0])
+    assert "Line 10 (Severity" in task and "[G.AST.01]" not in task
+
+
+async def test_async_instances_of_the_same_file_are_serialized(tmp_path, instances):
+    from minisweagent.run.extra.openharmony_async import process_instances
+    from minisweagent.run.extra.utils.batch_progress import RunBatchProgressManager
+
+    action = "echo start $PPID >> log && sleep 0.2 && echo end $PPID >> log"
+    config = {
+        "model": {
+            "model_name": "deterministic",
+            "model_class": "deterministic",
+            "outputs": [f"```bash\n{action}\n```", "```bash\necho COMPLETE_TASK_AND_SUBMIT_FINAL_OUTPUT\n```"],
+        }
+    }
+    app_instances = [instances[0], instances[1], instances[3]]
+    progress_manager = RunBatchProgressManager(len(app_instances))
+    await process_instances(app_instances, tmp_path, config, progress_manager, str(tmp_path), concurrency=10)
+    log = (tmp_path / "log").read_text().split("\n")[:-1]
+    assert [line.split()[0] for line in log] == ["start", "end"] * 3
+
+
+def test_queue_workers_of_a_host_share_one_working_directory(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from minisweagent.run.extra.openharmony import prepare_queue_working_directory
+    from minisweagent.run.extra.utils.work_queue import WorkQueue
+
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.c").write_text("int main() {}\n")
+    instance = {"project_name": "proj", "project_path": str(tmp_path / "src")}
+    work_queue = WorkQueue(tmp_path / "queue.sqlite")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        paths = set(
+            executor.map(lambda _: prepare_queue_working_directory(instance, work_queue, str(tmp_path)), range(8))
+        )
+    assert len(paths) == 1
+    (path,) = paths
+    assert (Path(path) / "main.c").read_text() == "int main() {}\n"
+    assert [p.name for p in (tmp_path / "proj").iterdir() if p.is_dir()] == [Path(path).name]
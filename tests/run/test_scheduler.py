@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from minisweagent.run.extra.utils.scheduler import estimate_rule_costs, get_file_key, get_scheduler, shard_by_file
+
+
+def _instance(i: int, issue_file: str) -> dict:
+    return {"instance_id": f"harmocheck__proj-{i}", "issue_file": issue_file}
+
+
+def test_get_file_key_normalizes_paths():
+    assert get_file_key(_instance(0, "./ble_demo/app.c")) == get_file_key(_instance(1, "ble_demo/app.c"))
+    assert get_file_key(_instance(2, "")) == "harmocheck__proj-2"
+
+
+def test_shard_by_file_gives_each_file_one_owner():
+    instances = [
+        _instance(0, "a.c"),
+        _instance(1, "b.c"),
+        _instance(2, "./a.c"),
+        _instance(3, ""),
+        _instance(4, "a.c"),
+        _instance(5, ""),
+    ]
+    shards = shard_by_file(instances)
+    assert [[inst["instance_id"].rsplit("-", 1)[1] for inst in shard] for shard in shards] == [
+        ["0", "2", "4"],
+        ["1"],
+        ["3"],
+        ["5"],
+    ]
+    assert sorted(inst["instance_id"] for shard in shards for inst in shard) == sorted(
+        inst["instance_id"] for inst in instances
+    )
+
+
+def test_shard_by_file_can_keep_scheduler_order():
+    instances = [_instance(0, "a.c"), _instance(1, "b.c"), _instance(2, "b.c")]
+    assert [shard[0]["instance_id"] for shard in shard_by_file(instances, largest_first=False)] == [
+        "harmocheck__proj-0",
+        "harmocheck__proj-1",
+    ]
+
+
+def _traj(tmp_path, name: str, rules: list[str] | None, api_calls: int):
+    (tmp_path / f"{name}.traj.json").write_text(
+        json.dumps({"info": {"model_stats": {"api_calls": api_calls}}} | ({"issue_rules": rules} if rules else {}))
+    )
+
+
+def test_priority_scheduler_orders_by_severity_then_cost(tmp_path):
+    _traj(tmp_path, "a", ["G.AST.01"], 30)
+    _traj(tmp_path, "b", ["G.AST.01"], 10)
+    _traj(tmp_path, "c", ["G.FMT.02", "G.FMT.02"], 8)
+    _traj(tmp_path, "d", None, 100)
+    (tmp_path / "broken.traj.json").write_text("{")
+    assert estimate_rule_costs([tmp_path]) == {"G.AST.01": 20.0, "G.FMT.02": 4.0}
+    instances = [
+        {"instance_id": "i-0", "error_level": "建议", "rule_id": "G.FMT.02"},
+        {"instance_id": "i-1", "error_level": "严重", "rule_id": "G.AST.01"},
+        {"instance_id": "i-2", "error_level": "一般", "rule_id": "G.AST.01"},
+        {"instance_id": "i-3", "error_level": "严重", "rule_id": "G.FMT.02"},
+        {"instance_id": "i-4", "error_level": "?", "rule_id": "G.FMT.02"},
+        {"instance_id": "i-5", "error_level": "一般", "rule_id": "G.NEW.03"},
+    ]
+    scheduler = get_scheduler("priority", history=[tmp_path])
+    assert [inst["instance_id"] for inst in scheduler.order(instances)] == ["i-3", "i-1", "i-5", "i-2", "i-0", "i-4"]
+    grouped = {"instance_id": "g", "issues": instances[:2], "rule_id": "G.FMT.02", "error_level": "建议"}
+    assert (scheduler.get_severity(grouped), scheduler.get_cost(grouped)) == (1, 24.0)
+    assert get_scheduler("fifo").order(instances) == instances
+    with pytest.raises(ValueError, match="Unknown scheduler"):
+        get_scheduler("lifo")
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from minisweagent.run.extra.utils.work_queue import WorkQueue
+
+
+def _instances(n: int) -> list[dict]:
+    return [{"instance_id": f"openharmony__proj-{i}", "project_name": "proj"} for i in range(n)]
+
+
+def test_items_are_leased_once_in_order(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    assert queue.put(_instances(3)) == 3
+    assert queue.put(_instances(4)) == 1
+    first = queue.lease("a")
+    assert first["instance_id"] == "openharmony__proj-0"
+    assert queue.lease("b")["instance_id"] == "openharmony__proj-1"
+    queue.complete(first["instance_id"], "a", "Submitted", "")
+    assert queue.get_counts() == {"done": 1, "leased": 1, "pending": 2}
+
+
+def test_concurrent_workers_drain_queue(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.put(_instances(40))
+    leased = []
+
+    def work(worker):
+        while (instance := queue.lease(worker)) is not None:
+            leased.append(instance["instance_id"])
+            queue.complete(instance["instance_id"], worker, "Submitted", "")
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(leased) == sorted(instance["instance_id"] for instance in _instances(40))
+    assert WorkQueue(tmp_path / "queue.sqlite").get_counts() == {"done": 40}
+
+
+def test_expired_leases_are_rerun_then_failed(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0.1, max_attempts=2)
+    queue.put(_instances(1))
+    assert queue.lease("dead") is not None
+    assert queue.lease("alive") is None
+    time.sleep(0.15)
+    assert queue.lease("alive")["instance_id"] == "openharmony__proj-0"
+    assert not queue.heartbeat("openharmony__proj-0", "dead")
+    assert queue.heartbeat("openharmony__proj-0", "alive")
+    queue.complete("openharmony__proj-0", "dead", "Submitted", "")
+    assert queue.get_counts() == {"leased": 1}
+    time.sleep(0.15)
+    assert queue.lease("other") is None
+    assert queue.get_counts() == {"failed": 1}
+
+
+def test_keep_alive_extends_lease(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0.3)
+    queue.put(_instances(1))
+    queue.lease("a")
+    with queue.keep_alive("openharmony__proj-0", "a"):
+        time.sleep(0.5)
+        assert queue.lease("b") is None
+
+
+def test_released_items_are_leased_again_then_failed(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts=2)
+    queue.put(_instances(1))
+    queue.release(queue.lease("a")["instance_id"], "a")
+    assert queue.get_counts() == {"pending": 1}
+    queue.release(queue.lease("b")["instance_id"], "b")
+    assert queue.get_counts() == {"failed": 1}
+
+
+def test_groups_are_leased_by_one_owner(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0.2)
+    queue.put([{"instance_id": f"{project}-{i}", "project_name": project} for i in range(2) for project in "abc"])
+    leases = [("host1", "a-0"), ("host1", "a-1"), ("host2", "b-0"), ("host3", "c-0"), ("host2", "b-1"), ("host4", None)]
+    for owner, instance_id in leases:
+        instance = queue.lease(f"{owner}:0", owner=owner)
+        assert (instance and instance["instance_id"]) == instance_id
+    # Groups of owners that stopped working on them are handed over
+    time.sleep(0.25)
+    assert queue.lease("host4:0", owner="host4")["instance_id"] == "a-0"
@@ -0,0 +1,113 @@
+import shutil
+
+import pytest
+
+from minisweagent.run.extra.utils.workspace import (
+    MergeConflict,
+    WorkspacePool,
+    _supports_overlay,
+    _supports_reflink,
+)
+
+
+@pytest.fixture(params=["copy", "reflink", "overlay"])
+def pool(tmp_path, request):
+    if request.param == "overlay" and not _supports_overlay(tmp_path):
+        pytest.skip("Unprivileged overlay mounts are not supported")
+    if request.param == "reflink" and not _supports_reflink(tmp_path):
+        pytest.skip("Reflinks are not supported")
+    source = tmp_path / "project"
+    (source / "src").mkdir(parents=True)
+    (source / "src" / "app.c").write_text("int a;\nint b;\nint c;\nint d;\nint e;\n")
+    (source / "src" / "util.h").write_text("#define X 1\n")
+    (source / "README").write_text("readme\n")
+    return WorkspacePool(source, kind=request.param)
+
+
+def sh(workspace, command: str) -> str:
+    output = workspace.get_environment().execute(command)
+    assert output["returncode"] == 0, output["output"]
+    return output["output"]
+
+
+def test_workspace_is_isolated_and_merged_back(pool):
+    with pool.acquire(["src/app.c"]) as workspace:
+        sh(workspace, "sed -i 's/X 1/X 2/' src/util.h && echo 'int z;' >> src/app.c && rm README")
+        sh(workspace, "echo new > new.c")
+        assert (pool.source / "src" / "util.h").read_text() == "#define X 1\n"
+        assert (pool.source / "src" / "app.c").read_text().count("\n") == 5
+        patch = pool.merge(workspace)
+    assert (pool.source / "src" / "util.h").read_text() == "#define X 2\n"
+    assert (pool.source / "src" / "app.c").read_text().endswith("int e;\nint z;\n")
+    assert not (pool.source / "README").exists()
+    assert (pool.source / "new.c").read_text() == "new\n"
+    assert "+int z;" in patch and "-#define X 1" in patch and "+++ /dev/null" in patch and "--- /dev/null" in patch
+
+
+def test_reused_workspace_sees_merged_changes(pool):
+    with pool.acquire() as first, pool.acquire() as second:
+        assert first.path != second.path
+        sh(first, "rm src/util.h && echo '#define X 3' > src/util.h")
+        pool.merge(first)
+    with pool.acquire() as workspace:
+        assert sh(workspace, "cat src/util.h") == "#define X 3\n"
+        assert pool.merge(workspace) == ""
+
+
+def test_deleted_and_replaced_directories_are_merged(pool):
+    with pool.acquire() as workspace:
+        sh(workspace, "rm -r src && mkdir src && echo 'int b;' > src/b.c")
+        pool.merge(workspace)
+    assert sorted(path.name for path in (pool.source / "src").iterdir()) == ["b.c"]
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+def test_private_files_are_merged_three_way(pool):
+    with pool.acquire(["src/app.c"]) as first, pool.acquire(["src/app.c"]) as second:
+        sh(first, "sed -i 's/int a;/int a = 0;/' src/app.c")
+        sh(second, "sed -i 's/int e;/int e = 0;/' src/app.c")
+        pool.merge(first)
+        pool.merge(second)
+    assert (pool.source / "src" / "app.c").read_text() == "int a = 0;\nint b;\nint c;\nint d;\nint e = 0;\n"
+
+
+def test_conflicting_edits_raise_and_are_discarded(pool):
+    def edit(workspace):
+        with pool.acquire() as other:
+            sh(other, "echo other > README")
+            pool.merge(other)
+        sh(workspace, "echo edited > README && echo new > new.c")
+
+    with pytest.raises(MergeConflict):
+        pool.run(edit)
+    assert (pool.source / "README").read_text() == "other\n"
+    assert not (pool.source / "new.c").exists()
+    # A requeued instance sees the edits of the other instance
+    assert pool.run(lambda workspace: sh(workspace, "cat README"))[0] == "other\n"
+
+
+def test_in_place_writes_are_isolated(pool):
+    with pool.acquire() as first:
+        sh(first, "rm src/util.h && echo '#define X 2' > src/util.h")
+        pool.merge(first)
+    with pool.acquire() as workspace, pool.acquire() as other:
+        sh(workspace, "echo '#define Y 1' >> src/util.h && echo more >> README")
+        assert (pool.source / "src" / "util.h").read_text() == "#define X 2\n"
+        assert sh(other, "cat README") == "readme\n"
+        patch = pool.merge(workspace)
+    assert "+#define Y 1" in patch and "+more" in patch
+    assert (pool.source / "src" / "util.h").read_text() == "#define X 2\n#define Y 1\n"
+
+
+def test_failed_instance_is_discarded(pool):
+    def fail(workspace):
+        sh(workspace, "echo BROKEN > src/app.c && echo new > new.c")
+        raise RuntimeError("model error")
+
+    with pytest.raises(RuntimeError):
+        pool.run(fail, private_files=["src/app.c"])
+    assert (pool.source / "src" / "app.c").read_text().startswith("int a;")
+
+    _, patch = pool.run(lambda workspace: sh(workspace, "echo edited > README"))
+    assert "BROKEN" not in patch and "new.c" not in patch
+    assert not (pool.source / "new.c").exists()